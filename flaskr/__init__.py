@@ -23,9 +23,31 @@ def create_app(test_config=None):
     # utilizar um valor em String, em implatanção, use valor aleatório sendo convertido em bytes.
     # O 'DATABASE', usa o método .join() que une um ou mais componentes de caminho forma inteligente,
     # logo, este caminho a ser configurado é onde o arquivo de banco de dados SQLite será salvo.
+    # O 'POSTS_PER_PAGE', define quantas postagens são exibidas em cada página do índice principal.
+    # O 'USER_CACHE_SIZE' e 'USER_CACHE_TTL' (segundos), limitam o Cache de usuários conectados.
+    # O 'PAGE_CACHE', ativa o Cache de páginas renderizadas, guardado no 'PAGE_CACHE_BACKEND',
+    # ou quando None, em memória com no máximo 'PAGE_CACHE_SIZE' páginas, válidas por 'PAGE_CACHE_TTL' segundos.
+    # O 'PASSWORD_HASH_METHOD' e 'PASSWORD_SALT_LENGTH', definem o método e o custo dos hashes de senha,
+    # calculados em 'PASSWORD_HASH_WORKERS' processos (0 calcula na própria thread), com no máximo
+    # 'PASSWORD_HASH_QUEUE' hashes aguardando por até 'PASSWORD_HASH_TIMEOUT' segundos.
+    # O 'LOGIN_RATE_LIMIT', é o número de logins com falha permitidos por IP a cada 'LOGIN_RATE_WINDOW' segundos.
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path, 'flaskr.sqlite'),
+        POSTS_PER_PAGE=10,
+        USER_CACHE_SIZE=1024,
+        USER_CACHE_TTL=60,
+        PAGE_CACHE=True,
+        PAGE_CACHE_BACKEND=None,
+        PAGE_CACHE_SIZE=512,
+        PAGE_CACHE_TTL=300,
+        PASSWORD_HASH_METHOD='pbkdf2:sha256:260000',
+        PASSWORD_SALT_LENGTH=16,
+        PASSWORD_HASH_WORKERS=2,
+        PASSWORD_HASH_QUEUE=32,
+        PASSWORD_HASH_TIMEOUT=10,
+        LOGIN_RATE_LIMIT=10,
+        LOGIN_RATE_WINDOW=300,
     )
 
     # Nessa condição, se o parâmetro [test_config] houver definido para sí, o seu valor None (Nenhum),
@@ -54,12 +76,59 @@ def create_app(test_config=None):
     def hello():
         return "Hello, World!"
 
+    # Registrando a compressão das respostas, registrada primeiro, para ser executada por último
+    # (as funções 'after_request' são executadas na ordem inversa do registro).
+    from . import compress
+    compress.init_app(app)
+
+    # Registrando a instrumentação (tempo das solicitações, consultas SQL e Templates, e a URL /metrics,
+    # protegida pelo 'METRICS_TOKEN'),
+    # antes do Banco de Dados, para que os Pools de Conexões recebam o observador de consultas.
+    from . import metrics
+    metrics.init_app(app)
+
+    # Os arquivos estáticos com o hash no nome, o manifesto é carregado uma única vez aqui
+    from . import assets
+    assets.init_app(app)
+
     # Importando o nosso db da raíz do pacote flaskr, e, chamando a função de registro de funções para o aplicativo
     from . import db
     db.init_app(app)
 
-    # Importando o Blueprint 'auth' da raíz do pacote flaskr
+    # Registrando o acesso assíncrono ao Banco de Dados, usado pelas visualizações 'async def'
+    from . import aiodb
+    aiodb.init_app(app)
+
+    # As visualizações das postagens, somadas na memória e gravadas em lotes periódicos
+    from . import counters
+    counters.init_app(app)
+
+    # A fila de tarefas em segundo plano, enfileiradas pelas visualizações e executadas pelo 'flask worker'
+    from . import jobs
+    jobs.init_app(app)
+
+    # O corpo das postagens em Markdown, convertido para HTML ao gravar a postagem, e o comando 'render-posts'
+    from . import render
+    render.init_app(app)
+
+    # Os cabeçalhos de Cache HTTP para proxies e CDNs, e a remoção das páginas alteradas pelas chaves das etiquetas
+    from . import edge
+    edge.init_app(app)
+
+    # Adicionando os comandos usados somente na linha de comando, 'migrate' (atualiza o esquema de um Banco de Dados
+    # existente), 'export' e 'import' (copiam usuários e postagens em massa) e 'bench' (mede a vazão e a latência
+    # das principais URLs), os seus módulos são importados apenas quando executados, e o 'profile-startup'
+    from . import startup
+    startup.init_app(app)
+
+    # As sessões guardadas no servidor, opcionais ('SESSION_STORE'), o Cookie leva apenas o identificador da sessão
+    from . import sessions
+    sessions.init_app(app)
+
+    # Importando o Blueprint 'auth' da raíz do pacote flaskr,
+    # o objeto 'g' passa a carregar o usuário conectado somente quando for acessado.
     from . import auth
+    app.app_ctx_globals_class = auth.AppGlobals
     app.register_blueprint(auth.bp)
 
     # Importando o Blueprint 'blog' da raíz do pacote flaskr
@@ -71,4 +140,13 @@ def create_app(test_config=None):
     # com o url_for('blog.index'). Logo, o 'index' visualização será um índice principal (" / ") - Sem parênteses.
     app.add_url_rule('/', endpoint='index')
 
+    # Importando o Blueprint 'api', a API JSON das postagens em '/api/v1'
+    from . import api
+    api.init_app(app)
+
+    # O Cache de bytecode dos Templates e o comando 'compile-templates', registrado depois dos Blueprints,
+    # com o 'TEMPLATE_PRELOAD' todos os Templates são carregados aqui, antes da primeira solicitação
+    from . import templating
+    templating.init_app(app)
+
     return app
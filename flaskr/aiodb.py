@@ -0,0 +1,157 @@
+# 07 - Acesso assíncrono ao Banco de Dados, para as visualizações definidas com 'async def'
+'''
+1º - Importando o módulo aiosqlite - Cada conexão do sqlite3 é executada em uma thread própria, e as consultas
+são aguardadas (await), sem bloquear o laço de eventos. Importado somente ao criar a primeira conexão, pois este
+módulo é importado em toda Fábrica de Aplicativos (flaskr.blog, flaskr.auth)
+2º - As conexões são criadas pela função 'connect' do 'ConnectionPool' (flaskr.db), com os mesmos PRAGMAs,
+e guardadas por um Pool próprio, pois não pertencem a uma thread da solicitação
+'''
+
+import os
+import sqlite3
+import time
+
+from flask import current_app, g
+
+from flaskr.db import ConnectionPool, get_shards, pool_options
+
+# A classe 'AsyncConnection', envolve uma conexão do aiosqlite, e devolve a conexão ao Pool ao ser fechada.
+# Uma mesma conexão é usada por uma solicitação de cada vez.
+class AsyncConnection(object):
+    def __init__(self, pool, conn, created):
+        self._pool = pool
+        self._conn = conn
+        self._created = created
+
+    # Executa a consulta e lê as linhas. A duração é medida aqui, no Contexto da solicitação,
+    # para o observador do Pool, incluindo a espera pela thread da conexão.
+    async def _fetch(self, sql, parameters, fetch):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+
+        start = time.perf_counter()
+        try:
+            async with self._conn.execute(sql, parameters) as cursor:
+                return await fetch(cursor)
+        finally:
+            if self._pool.observer is not None:
+                self._pool.observer(sql, time.perf_counter() - start)
+
+    async def fetchone(self, sql, parameters=()):
+        return await self._fetch(sql, parameters, lambda cursor: cursor.fetchone())
+
+    async def fetchall(self, sql, parameters=()):
+        return await self._fetch(sql, parameters, lambda cursor: cursor.fetchall())
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, self._created)
+
+# O Pool de Conexões assíncronas, guarda até 'ASYNC_POOL_SIZE' conexões ociosas, sem vínculo com uma thread da
+# solicitação, pois cada conexão do aiosqlite tem a sua thread. As conexões são abertas em modo somente leitura
+# (as escritas usam o escritor único). As conexões descartadas são encerradas com 'stop', que não precisa ser
+# aguardado, pois a devolução acontece no fim do Contexto de Aplicativo, fora do laço de eventos.
+class AsyncConnectionPool(ConnectionPool):
+    def __init__(self, database, **kwargs):
+        super().__init__(database, **kwargs)
+        self._free = []
+
+    # Depois de um fork, as threads das conexões herdadas não existem no processo filho.
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            super()._check_pid()
+            self._free = []
+
+    async def _is_healthy_async(self, conn, created):
+        if self.recycle is not None and time.monotonic() - created > self.recycle:
+            return False
+        try:
+            await conn.execute('SELECT 1')
+        except (sqlite3.Error, ValueError):
+            return False
+        return True
+
+    async def acquire(self):
+        self._check_pid()
+
+        with self._lock:
+            entry = self._free.pop() if self._free else None
+
+        if entry is not None:
+            if await self._is_healthy_async(*entry):
+                return AsyncConnection(self, *entry)
+
+            entry[0].stop()
+
+        import aiosqlite
+
+        conn = await aiosqlite.Connection(self.connect, 64)
+        return AsyncConnection(self, conn, time.monotonic())
+
+    def release(self, conn, created):
+        with self._lock:
+            if self.closed or len(self._free) >= self.size:
+                conn.stop()
+            else:
+                self._free.append((conn, created))
+
+    def close_all(self):
+        with self._lock:
+            self.closed = True
+            free, self._free = self._free, []
+
+        for conn, created in free:
+            conn.stop()
+
+def get_async_pool(database=None):
+    pools = current_app.extensions.setdefault('flaskr_db', {})
+
+    if database is None:
+        database = (
+            current_app.config['DATABASE_REPLICA']
+            or current_app.config['DATABASE']
+        )
+
+    key = (database, 'async')
+
+    if key not in pools:
+        name, options = pool_options(database, readonly=True)
+        pools[key] = AsyncConnectionPool(
+            name, size=current_app.config['ASYNC_POOL_SIZE'], **options
+        )
+
+    return pools[key]
+
+# Estabelecendo a conexão assíncrona de leitura, e, armazenando no objeto 'g', como a função 'get_db'.
+# Com [shard], a conexão de um dos shards das postagens ('DATABASE_SHARDS', flaskr.db).
+async def get_async_db(shard=0):
+    if shard:
+        if 'async_shard_dbs' not in g:
+            g.async_shard_dbs = {}
+
+        if shard not in g.async_shard_dbs:
+            pool = get_async_pool(get_shards()[shard])
+            g.async_shard_dbs[shard] = await pool.acquire()
+
+        return g.async_shard_dbs[shard]
+
+    if 'async_db' not in g:
+        g.async_db = await get_async_pool().acquire()
+
+    return g.async_db
+
+# Devolve as conexões assíncronas para o Pool no fim do Contexto de Aplicativo.
+def close_async_db(e=None):
+    db = g.pop('async_db', None)
+
+    if db is not None:
+        db.close()
+
+    for db in g.pop('async_shard_dbs', {}).values():
+        db.close()
+
+# Configurações padrão do acesso assíncrono, e a devolução da conexão ao fim de cada Contexto de Aplicativo.
+def init_app(app):
+    app.config.setdefault('ASYNC_POOL_SIZE', 8)
+    app.teardown_appcontext(close_async_db)
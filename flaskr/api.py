@@ -0,0 +1,273 @@
+# 16 - Criando o Blueprint da API JSON (/api/v1), para que outros serviços leiam e escrevam as postagens
+'''
+1º - Importando as funções do Blueprint 'blog' - A API usa as mesmas consultas, a mesma paginação por chave (keyset)
+e a mesma função 'get_post' das páginas HTML, apenas a resposta muda de HTML para JSON
+2º - Importando a classe HTTPException do módulo werkzeug - Os erros (400, 401, 403, 404...) da API também
+são respondidos em JSON
+3º - As respostas das leituras têm ETag, um cliente que envia o cabeçalho If-None-Match recebe 304 (sem corpo),
+quando os dados não mudaram
+'''
+
+import functools
+
+from flask import Blueprint, current_app, g, jsonify, request, url_for
+from werkzeug.exceptions import HTTPException, abort
+
+from flaskr.blog import get_post, get_posts_page, locate_post, parse_cursor
+from flaskr.cache import invalidate_pages
+from flaskr.db import shard_for_author, use_reader, write, write_many
+from flaskr.render import render_body
+
+# Criando o nome do Blueprint com 'api', com o prefixo da versão da API nas URLs.
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Os campos que podem ser pedidos com '?fields=id,title', e os campos padrão (todos).
+POST_FIELDS = ('id', 'title', 'body', 'created', 'author_id', 'author')
+
+# Os erros das visualizações da API são respondidos em JSON, com a mesma descrição das páginas HTML.
+@bp.errorhandler(HTTPException)
+def handle_error(e):
+    response = jsonify(error=e.name, message=e.description)
+    response.status_code = e.code
+    return response
+
+# O decorador 'api_login_required', como o 'login_required' do 'auth', mas responde 401 em JSON,
+# em vez de redirecionar para a página de login. A autenticação é a mesma sessão das páginas HTML.
+# As visualizações que escrevem são marcadas com 'use_reader', como as do 'blog', e só obtêm o escritor
+# na função 'write', assim as escritas da API também são agrupadas com o 'GROUP_COMMIT'.
+def api_login_required(view):
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        if g.user is None:
+            abort(401, 'Authentication required.')
+
+        return view(**kwargs)
+
+    return wrapped_view
+
+# Lê o parâmetro 'fields', retorna 400 para um campo desconhecido.
+def parse_fields():
+    value = request.args.get('fields')
+
+    if not value:
+        return POST_FIELDS
+
+    fields = tuple(field.strip() for field in value.split(','))
+    unknown = [field for field in fields if field not in POST_FIELDS]
+
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}.")
+
+    return fields
+
+# Converte uma linha da tabela post em dicionário, somente com os campos pedidos.
+def serialize_post(post, fields=POST_FIELDS):
+    values = {
+        'id': lambda: post['id'],
+        'title': lambda: post['title'],
+        'body': lambda: post['body'],
+        'created': lambda: post['created'].isoformat(),
+        'author_id': lambda: post['author_id'],
+        'author': lambda: post['username'],
+    }
+    return {field: values[field]() for field in fields}
+
+# Responde o JSON com ETag, e 304 quando o cliente já tem a mesma versão (If-None-Match).
+def conditional_json(data):
+    response = jsonify(data)
+    response.add_etag()
+    return response.make_conditional(request)
+
+# Lê o corpo JSON da solicitação, retorna 400 quando não é um objeto JSON.
+def get_json_object():
+    data = request.get_json(silent=True)
+
+    if not isinstance(data, dict):
+        abort(400, 'Expected a JSON object.')
+
+    return data
+
+# Valida os campos de uma postagem, como os formulários do 'blog': o título é obrigatório.
+# Com [partial=True] (PATCH), os campos ausentes mantêm os valores atuais.
+def validate_post(data, partial=False):
+    values = {}
+
+    for field in ('title', 'body'):
+        if field not in data:
+            if not partial:
+                values[field] = ''
+            continue
+
+        if not isinstance(data[field], str):
+            abort(400, f"'{field}' must be a string.")
+
+        values[field] = data[field]
+
+    if not partial or 'title' in values:
+        if not values.get('title'):
+            abort(400, 'Title is required.')
+
+    return values
+
+# Lista paginada das postagens, com os mesmos cursores 'before' e 'after' do índice principal,
+# e o tamanho da página em 'per_page' (até 'API_MAX_PER_PAGE'). Os cursores da próxima página
+# e da página anterior são retornados em 'next' e 'prev'.
+@bp.route('/posts')
+def list_posts():
+    fields = parse_fields()
+    before = request.args.get('before')
+    after = request.args.get('after')
+    per_page = request.args.get(
+        'per_page', current_app.config['POSTS_PER_PAGE'], type=int
+    )
+
+    if not 1 <= per_page <= current_app.config['API_MAX_PER_PAGE']:
+        abort(400, 'Invalid per_page.')
+
+    page = get_posts_page(
+        before=parse_cursor(before) if before else None,
+        after=parse_cursor(after) if after else None,
+        per_page=per_page,
+    )
+    posts = [serialize_post(post, fields) for post in page]
+
+    return conditional_json({
+        'posts': posts,
+        'next': page.next_cursor if page.has_next else None,
+        'prev': page.prev_cursor if page.has_prev else None,
+    })
+
+@bp.route('/posts/<int:id>')
+def get_post_json(id):
+    return conditional_json(serialize_post(get_post(id, check_author=False), parse_fields()))
+
+@bp.route('/posts', methods=('POST',))
+@use_reader
+@api_login_required
+def create_post():
+    values = validate_post(get_json_object())
+    id, rowcount = write(
+        "INSERT INTO post (title, body, body_html, body_version, author_id, author_name)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (values['title'], values['body'], *render_body(values['body']),
+         g.user['id'], g.user['username']),
+        shard=shard_for_author(g.user['id'])
+    )
+    invalidate_pages('posts:head', f"author:{g.user['id']}")
+
+    response = jsonify(serialize_post(get_post(id)))
+    response.status_code = 201
+    response.headers['Location'] = url_for('api.get_post_json', id=id)
+    return response
+
+# O PUT substitui o título e o corpo, o PATCH altera apenas os campos enviados.
+@bp.route('/posts/<int:id>', methods=('PUT', 'PATCH'))
+@use_reader
+@api_login_required
+def update_post(id):
+    shard, post = locate_post(id)
+    values = validate_post(get_json_object(), partial=request.method == 'PATCH')
+
+    if 'body' in values:
+        values['body_html'], values['body_version'] = render_body(values['body'])
+
+    if values:
+        write(
+            "UPDATE post SET {} WHERE id = ?".format(
+                ', '.join(f'{field} = ?' for field in values)
+            ),
+            (*values.values(), id), shard=shard
+        )
+        invalidate_pages(f'post:{id}')
+
+    return jsonify(serialize_post(get_post(id)))
+
+@bp.route('/posts/<int:id>', methods=('DELETE',))
+@use_reader
+@api_login_required
+def delete_post(id):
+    shard, post = locate_post(id)
+    write('DELETE FROM post WHERE id = ?', (id,), shard=shard)
+    invalidate_pages(f'post:{id}', f"author:{post['author_id']}")
+    return '', 204
+
+# Lê a lista [key] do corpo JSON, com no máximo 'API_BATCH_LIMIT' itens.
+def get_batch(key):
+    items = get_json_object().get(key)
+
+    if not isinstance(items, list) or not items:
+        abort(400, f"'{key}' must be a non-empty list.")
+
+    if len(items) > current_app.config['API_BATCH_LIMIT']:
+        abort(400, f"At most {current_app.config['API_BATCH_LIMIT']} items per batch.")
+
+    return items
+
+# Cria várias postagens em uma única transação, {"posts": [{"title": ..., "body": ...}, ...]},
+# se qualquer postagem for inválida, nenhuma é criada.
+@bp.route('/posts/batch', methods=('POST',))
+@use_reader
+@api_login_required
+def create_posts():
+    items = get_batch('posts')
+    rows = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            abort(400, 'Expected a list of JSON objects.')
+
+        values = validate_post(item)
+        rows.append((
+            values['title'], values['body'], *render_body(values['body']),
+            g.user['id'], g.user['username']
+        ))
+
+    # Todas as postagens são do mesmo autor, então ficam no mesmo shard.
+    results = write_many(
+        [
+            ("INSERT INTO post (title, body, body_html, body_version, author_id, author_name)"
+             " VALUES (?, ?, ?, ?, ?, ?)", row)
+            for row in rows
+        ],
+        shard=shard_for_author(g.user['id'])
+    )
+    ids = [id for id, rowcount in results]
+    invalidate_pages('posts:head', f"author:{g.user['id']}")
+
+    response = jsonify(ids=ids)
+    response.status_code = 201
+    return response
+
+# Exclui várias postagens em uma única transação, {"ids": [1, 2, ...]}, todas precisam existir
+# e pertencer ao usuário conectado, caso contrário nenhuma é excluída. As postagens precisam estar no mesmo shard
+# (as de um autor ficam no shard dele), pois uma transação não abrange vários arquivos de Banco de Dados,
+# e a falha no COMMIT de um shard deixaria as postagens dos outros shards já excluídas.
+@bp.route('/posts/batch-delete', methods=('POST',))
+@use_reader
+@api_login_required
+def delete_posts():
+    ids = get_batch('ids')
+
+    # 'True' e 'False' também são instâncias de int, e não são ids.
+    if not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+        abort(400, "'ids' must be a list of integers.")
+
+    ids = sorted(set(ids))
+    located = [locate_post(id) for id in ids]
+    shards = {shard for shard, post in located}
+
+    if len(shards) > 1:
+        abort(400, "Posts in a batch must be stored in the same shard.")
+
+    write_many([('DELETE FROM post WHERE id = ?', (id,)) for id in ids], shard=shards.pop())
+    invalidate_pages(
+        *(f'post:{id}' for id in ids),
+        *{f"author:{post['author_id']}" for shard, post in located}
+    )
+    return '', 204
+
+# Configurações padrão da API, o tamanho máximo de uma página e de um lote.
+def init_app(app):
+    app.config.setdefault('API_MAX_PER_PAGE', 100)
+    app.config.setdefault('API_BATCH_LIMIT', 100)
+    app.register_blueprint(bp)
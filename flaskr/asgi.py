@@ -0,0 +1,54 @@
+# 08 - Ponto de entrada ASGI do aplicativo flaskr
+'''
+1º - Importando as classes WsgiToAsgi e WsgiToAsgiInstance do módulo asgiref (Dependência do Flask com o extra
+'async') - Adapta o aplicativo WSGI do Flask para servidores ASGI, como uvicorn ou hypercorn
+2º - Importando a função sync_to_async do módulo asgiref - O adaptador padrão executa todas as solicitações na mesma
+thread (thread_sensitive=True), uma de cada vez, aqui cada solicitação é executada em uma das 'ASGI_THREADS' threads
+3º - Importando a classe ThreadPoolExecutor do módulo concurrent.futures - As threads das solicitações
+
+Exemplo: uvicorn --factory flaskr.asgi:create_asgi_app
+O servidor ASGI cuida da leitura e envio dos dados dos clientes lentos no laço de eventos, assim as threads
+do aplicativo ficam ocupadas somente enquanto a visualização é executada. As visualizações 'async def' são
+executadas no laço de eventos do servidor, enquanto a thread da solicitação aguarda.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from flaskr import create_app
+
+# A classe 'ThreadedWsgiToAsgiInstance', a solicitação do adaptador do asgiref, com o aplicativo WSGI executado
+# em uma thread do [executor], em vez da thread única compartilhada pelo processo.
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    def __init__(self, wsgi_application, executor, duplicate_header_limit=100):
+        super().__init__(wsgi_application, duplicate_header_limit)
+        self.executor = executor
+
+    # A função original, sem o decorador 'sync_to_async' da classe do asgiref.
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+    async def run_wsgi_app(self, body):
+        run = sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self.executor)
+        await run(body)
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(
+            self.wsgi_application, self.executor, self.duplicate_header_limit
+        )(scope, receive, send)
+
+# Fábrica de Aplicativos ASGI, recebe o mesmo parâmetro [test_config] da função 'create_app'.
+# 'ASGI_THREADS' é o número de solicitações executadas ao mesmo tempo pelo processo.
+def create_asgi_app(test_config=None):
+    app = create_app(test_config)
+    app.config.setdefault('ASGI_THREADS', 32)
+    executor = ThreadPoolExecutor(
+        max_workers=app.config['ASGI_THREADS'], thread_name_prefix='flaskr-asgi'
+    )
+    return ThreadedWsgiToAsgi(app, executor)
@@ -0,0 +1,187 @@
+# 13 - Arquivos estáticos com o hash do conteúdo no nome, pré-comprimidos, e guardados em Cache pelo navegador
+'''
+1º - Importando os módulos gzip, hashlib, json, mimetypes e os - Geram as cópias com o hash no nome,
+as versões comprimidas e o manifesto (manifest.json)
+2º - Importando o módulo brotli (opcional) - Quando instalado, também são geradas as versões '.br'
+3º - Com o hash no nome, o conteúdo de uma URL nunca muda, então o navegador pode guardar o arquivo por um ano
+('Cache-Control: immutable'), e uma nova versão do arquivo recebe uma nova URL
+
+Exemplo: flask build-assets
+'''
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# A pasta gerada dentro da pasta 'static', e os tipos de arquivo que valem a pena comprimir
+# (imagens e fontes já são comprimidas pelo próprio formato).
+OUTPUT_FOLDER = 'dist'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.xml', '.map')
+
+# As codificações pré-comprimidas, em ordem de preferência, com a extensão do arquivo de cada uma.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+# Nome com o hash antes da extensão, por exemplo 'style.css' -> 'style.3f2a9c1b7d4e.css'.
+def hashed_name(path, data):
+    root, ext = os.path.splitext(path)
+    return f'{root}.{fingerprint(data)}{ext}'
+
+# Gera as versões comprimidas que forem menores que o original, e retorna as codificações geradas.
+# O gzip é gerado com 'mtime=0', assim o mesmo conteúdo sempre produz os mesmos bytes.
+def compress_variants(target, data):
+    encodings = []
+
+    if not target.endswith(COMPRESSIBLE):
+        return encodings
+
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+
+    for encoding, suffix in ENCODINGS:
+        compressed = variants.get(encoding)
+
+        if compressed is not None and len(compressed) < len(data):
+            with open(target + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+
+    return encodings
+
+# Percorre a pasta [static_folder] (menos a própria pasta gerada), copia cada arquivo para 'dist' com o hash
+# no nome, gera as versões comprimidas, e escreve o manifesto. Os arquivos de versões anteriores são mantidos,
+# pois páginas já renderizadas (ou guardadas em Cache) ainda podem apontar para eles.
+# O manifesto associa o nome original ao nome com hash, e às codificações disponíveis:
+# {"style.css": {"path": "dist/style.3f2a9c1b7d4e.css", "encodings": ["gzip"]}}
+def build_assets(static_folder):
+    output = os.path.join(static_folder, OUTPUT_FOLDER)
+    os.makedirs(output, exist_ok=True)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder and OUTPUT_FOLDER in dirs:
+            dirs.remove(OUTPUT_FOLDER)
+
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            name = os.path.relpath(source, static_folder).replace(os.sep, '/')
+
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            path = f'{OUTPUT_FOLDER}/{hashed_name(name, data)}'
+            target = os.path.join(static_folder, *path.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            with open(target, 'wb') as f:
+                f.write(data)
+
+            manifest[name] = {
+                'path': path, 'encodings': compress_variants(target, data)
+            }
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+# A classe 'AssetManifest', carregada uma única vez na Fábrica de Aplicativos, as consultas são apenas
+# acessos a dicionários: 'urls' do nome original para o nome com hash, e 'files' do nome com hash
+# para as codificações pré-comprimidas disponíveis.
+class AssetManifest(object):
+    def __init__(self, entries=None):
+        entries = entries or {}
+        self.urls = {name: entry['path'] for name, entry in entries.items()}
+        self.files = {
+            entry['path']: tuple(entry['encodings']) for entry in entries.values()
+        }
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+def load_manifest(app):
+    path = app.config['ASSETS_MANIFEST'] or os.path.join(
+        app.static_folder, OUTPUT_FOLDER, 'manifest.json'
+    )
+    app.extensions['flaskr_assets'] = AssetManifest.load(path)
+    return app.extensions['flaskr_assets']
+
+# Utilizando o 'url_defaults', toda chamada url_for('static', filename='style.css') (por exemplo no base.html),
+# recebe o nome com hash, quando o arquivo estiver no manifesto. Sem o manifesto, a URL continua a original.
+def asset_url_defaults(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        urls = current_app.extensions['flaskr_assets'].urls
+        values['filename'] = urls.get(values['filename'], values['filename'])
+
+# Escolhe a melhor versão pré-comprimida aceita pelo cliente, ou None para o arquivo original.
+def choose_encoding(available):
+    accepted = request.accept_encodings
+
+    for encoding in available:
+        if accepted[encoding]:
+            return encoding
+
+    return None
+
+# Substitui a visualização 'static' do Flask. Os arquivos com hash recebem 'Cache-Control: immutable'
+# por 'ASSETS_MAX_AGE' segundos, e a versão comprimida quando disponível. Os demais arquivos continuam
+# com o comportamento padrão do Flask.
+def send_static(filename):
+    encodings = current_app.extensions['flaskr_assets'].files.get(filename)
+
+    if encodings is None:
+        return current_app.send_static_file(filename)
+
+    encoding = choose_encoding(encodings)
+    suffix = dict(ENCODINGS)[encoding] if encoding else ''
+    max_age = current_app.config['ASSETS_MAX_AGE']
+    response = send_from_directory(
+        current_app.static_folder, filename + suffix, max_age=max_age,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+    )
+
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# Utilizando a função 'command' estamos adicionando a linha de comando 'build-assets', que gera a pasta
+# 'static/dist' e o manifesto, e deve ser executada a cada implantação, antes de iniciar o servidor.
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    manifest = build_assets(current_app.static_folder)
+    load_manifest(current_app)
+    click.echo(f'Built {len(manifest)} assets.')
+
+def init_app(app):
+    app.config.setdefault('ASSETS_MANIFEST', None)
+    app.config.setdefault('ASSETS_MAX_AGE', 31536000)
+    load_manifest(app)
+    app.url_defaults(asset_url_defaults)
+    app.view_functions['static'] = send_static
+    app.cli.add_command(build_assets_command)
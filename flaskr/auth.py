@@ -2,17 +2,27 @@
 '''
 1º [Linha 07] - Importando o módulo functools - Fornece recursos como funções,
 para trabalhar em outras funções e objetos que podem ser chamados
+2º - Importando o módulo inspect - Identifica as visualizações assíncronas (async def) no decorador 'login_required'
 '''
 
 import functools
+import inspect
 
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, session, url_for
+    Blueprint, current_app, flash, g, has_request_context, redirect,
+    render_template, request, session, url_for
 )
+from flask.ctx import _AppCtxGlobals
 
-from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.exceptions import abort
 
-from flaskr.db import get_db
+from flaskr import sessions
+from flaskr.aiodb import get_async_db
+from flaskr.cache import TTLCache, invalidate_pages
+from flaskr.db import get_db, get_write_db, use_reader
+from flaskr.passwords import (
+    get_login_limiter, hash_password_async, needs_rehash, verify_password_async
+)
 
 # Criando o nome do Blueprint com 'auth', no segundo argumento, usamos __name__,
 # agora o Blueprint saberá onde está definido. Depois, o último argumento url_prefix,
@@ -22,8 +32,14 @@ bp = Blueprint('auth', __name__, url_prefix='/auth')
 # Aqui será a nossa primeira visualização a função 'register', o usuário poderá registrar no aplicativo flaskr,
 # para isso a URL especificada será um conjunto da url_prefix: '/auth' + o decorador route()
 # da Blueprint '/register'.
+# As visualizações 'register' e 'login' são assíncronas (async def), o hash da senha é calculado em outro
+# processo e aguardado (await). Observação: o Flask executa a visualização assíncrona em um laço de eventos
+# próprio, e a thread da solicitação aguarda o resultado, então a thread continua ocupada durante o hash.
+# As visualizações marcadas com 'use_reader' só obtêm o escritor único no momento da escrita ('get_write_db'),
+# depois que o hash da senha já foi calculado, o escritor nunca fica esperando pelos processos de hash.
 @bp.route('/register', methods=('GET', 'POST'))
-def register():
+@use_reader
+async def register():
     # Se o usuário preencheu os dados ao formulário e confirmou, o método 'POST',
     # encarrega-se de enviar os dados recebidos para o servidor.
     if request.method == 'POST':
@@ -32,8 +48,6 @@ def register():
         # podemos mapear os campos do formulário (chaves para dicionário)
         username = request.form['username']
         password = request.form['password']
-        # Chamando a função 'get_db', sendo aplicada na variável db
-        db = get_db()
         # Na variável error, estamos declarando o valor None
         error = None
 
@@ -47,15 +61,21 @@ def register():
         # os novos dados inseridos pelo usuário serão passados para o Banco de Dados.
         # Em db.execute(), o método .execute(), está enviando a sintaxe SQL com espaços reservados (?)
         # de qualquer entrada do usuário, será escapado os valores para não ocorrer uma ataque de injeção de SQL.
-        # Com o generate_password_hash(), podemos usar em questão de segurança nas senhas declaradas passando em hash,
+        # Com o hash_password_async(), podemos usar em questão de segurança nas senhas declaradas passando em hash,
         # nunca devemos armazená-las as senhas diretamente no banco de dados.
+        # O hash é calculado em um processo separado (flaskr.passwords), sem ocupar a CPU desta thread.
+        # A escrita usa a conexão do escritor único, obtida somente depois do hash,
+        # as escritas do SQLite acontecem uma de cada vez.
         # Toda modificação realizada ao Banco de dados  devemos usar o método .commit(), para salvar as alterações.
         # A exceção .IntegrityError, ocorrerá caso o nome do usuário (username) já existir.
         if error is None:
+            password_hash = await hash_password_async(password)
+            db = get_write_db()
+
             try:
                 db.execute(
                     "INSERT INTO user (username, password) VALUES (?, ?)",
-                    (username, generate_password_hash(password)),
+                    (username, password_hash),
                 )
                 db.commit()
             except db.IntegrityError:
@@ -74,61 +94,144 @@ def register():
 # Nossa próxima visualização a função 'login', onde o usuário consegue acessar o aplicativo flaskr.
 # A URL especificada será um conjunto da url_prefix: '/auth' + o decorador route() da Blueprint '/login'.
 @bp.route('/login', methods=('GET', 'POST'))
-def login():
+@use_reader
+async def login():
     if request.method == 'POST':
+        # Um endereço IP com muitas tentativas de login com falha recentes, é bloqueado antes de qualquer hash.
+        limiter = get_login_limiter()
+
+        if limiter.is_blocked(request.remote_addr):
+            abort(429, 'Too many failed login attempts, try again later.')
+
         # Iremos validar novamente as seguintes entradas preenchidas pelo usuário.
         username = request.form['username']
         password = request.form['password']
-        # Chamando a função 'get_db', sendo aplicada na variável db
-        db = get_db()
         # Na variável error, estamos declarando o valor None
         error = None
-        # Com o método .execute(), realizamos a consulta (query) através da sintaxe SQL.
+        # Com a conexão assíncrona de leitura, realizamos a consulta (query) através da sintaxe SQL.
         # O método .fetchone(), retorna uma única sequência de consulta ou None, quando não há dados disponíveis.
-        # O método .fetchall(), será usado, pois, retorna uma lista de todas as linhas (restantes)
-        # de um resultado de consulta (query).
-        user = db.execute(
+        adb = await get_async_db()
+        user = await adb.fetchone(
             "SELECT * FROM user WHERE username = ?", (username,)
-        ).fetchone()
+        )
 
         # Condições para username e password
         if user is None:
             error = 'Incorrect username.'
         # Validando a senha preenchida atualmente em Hashes, com o hash armazenado no Banco de Dados.
-        elif not check_password_hash(user['password'], password):
+        elif not await verify_password_async(user['password'], password):
             error = 'Incorrect password.'
 
         if error is None:
+            # Hashes gerados com um método ou custo desatualizados, são recalculados com a configuração atual,
+            # aproveitando que a senha em texto está disponível somente neste momento.
+            if needs_rehash(user['password']):
+                password_hash = await hash_password_async(password)
+                db = get_write_db()
+                db.execute(
+                    "UPDATE user SET password = ? WHERE id = ?",
+                    (password_hash, user['id'])
+                )
+                db.commit()
+                invalidate_user(user['id'])
+
             # O objeto da classe Flask, conhecido como 'Session',
             # é um dicionário [Dict] onde são armazenados os dados de solicitações.
             # Caso todas as validações sejam bem-sucedida, o user com seu ['id'] é armazenado em uma nova session,
             # essa session serão armazenados em um Cookie sendo enviado ao navegador,
             # onde envia de volta com solicitações subsequentes.
+            # Com as sessões no servidor (flaskr.sessions), a sessão também guarda a linha do usuário,
+            # e recebe um novo identificador, pois o usuário conectado mudou.
+            limiter.reset(request.remote_addr)
             session.clear()
             session['user_id'] = user['id']
+            remember_user(user)
             return redirect(url_for('index'))
 
+        limiter.add_failure(request.remote_addr)
         flash(error)
 
     return render_template('auth/login.html')
 
-# Com o user['id'] armazenado em um session, ele estará disponível nas solicitações subsequentes, vejamos essa função.
+# Cache dos usuários já consultados, com tamanho ('USER_CACHE_SIZE') e tempo de expiração ('USER_CACHE_TTL')
+# limitados, evita a consulta ao Banco de Dados em cada solicitação de um usuário conectado.
+def get_user_cache():
+    if 'flaskr_user_cache' not in current_app.extensions:
+        current_app.extensions['flaskr_user_cache'] = TTLCache(
+            maxsize=current_app.config['USER_CACHE_SIZE'],
+            ttl=current_app.config['USER_CACHE_TTL'],
+        )
+
+    return current_app.extensions['flaskr_user_cache']
+
+# Retorna o usuário pelo seu id, primeiro procurando no Cache, depois no Banco de Dados.
+def get_user(user_id):
+    cache = get_user_cache()
+    user = cache.get(user_id)
+
+    if user is None:
+        user = get_db().execute(
+            "SELECT * FROM user WHERE id = ?", (user_id,)
+        ).fetchone()
+
+        if user is not None:
+            cache.set(user_id, user)
+
+    return user
+
+# Toda alteração na linha de um usuário, deve remover a cópia guardada no Cache, a cópia guardada nas suas sessões,
+# e as páginas guardadas que exibem esse usuário.
+def invalidate_user(user_id):
+    get_user_cache().pop(user_id)
+    sessions.forget_user(user_id)
+    invalidate_pages(f'user:{user_id}')
+
+# Com o user['id'] armazenado em um session, ele estará disponível nas solicitações subsequentes.
+# A classe 'AppGlobals', substitui a classe do objeto 'g' (definida na Fábrica de Aplicativos), assim o
+# atributo user só é carregado quando uma visualização ou um Template o acessa pela primeira vez,
+# solicitações que não usam o usuário (arquivos estáticos, '/hello'), não consultam o Banco de Dados.
+# Se não houver um session armazenado com user['id'], o atributo user será None.
+class AppGlobals(_AppCtxGlobals):
+    def __getattr__(self, name):
+        if name == 'user':
+            self.user = load_user_from_session()
+            return self.user
+
+        return super().__getattr__(name)
+
+# Com as sessões no servidor, a linha do usuário chega junto com a sessão, sem consultar o Cache ou o Banco de Dados.
+# Uma sessão sem a linha (ou com a linha de outro usuário) recebe a linha consultada, gravada no fim da solicitação.
+def load_user_from_session():
+    user_id = session.get('user_id') if has_request_context() else None
+
+    if user_id is None:
+        return None
+
+    user = getattr(session, 'user', None)
+
+    if user is not None and user['id'] == user_id:
+        return user
+
+    user = get_user(user_id)
+
+    if user is not None:
+        remember_user(user)
+
+    return user
+
+# Guarda na sessão (quando ela está no servidor) apenas as colunas exibidas pelas páginas, nunca o hash da senha.
+def remember_user(user):
+    if hasattr(session, 'user'):
+        session.user = {'id': user['id'], 'username': user['username']}
+        session.modified = True
+
 # Nessa função 'load_logged_in_user', o Blueprint possui a função que é executada antes de uma função de visualização,
 # ou até fora do Blueprint, não importando qual foi a solicitação de uma URL.
-# O 'load_logged_in_user', receberá o user['id'] armazenado em uma session, atribui para uma variável user_id,
-# Se não houver um session armazenado com user['id'], o objeto 'g' será atribuído um valor None, caso contrário,
-# O método .execute(), realizará uma consulta desse usuário específico, posteriormente, armazenando em um objeto 'g',
-# com atributo user.
+# Ela apenas descarta um usuário carregado anteriormente no mesmo Contexto de Aplicativo,
+# para que o objeto 'g' carregue o usuário desta solicitação, somente quando for necessário.
 @bp.before_app_request
 def load_logged_in_user():
-    user_id = session.get('user_id')
-
-    if user_id is None:
-        g.user = None
-    else:
-        g.user = get_db().execute(
-            "SELECT * FROM user WHERE id = ?", (user_id,)
-        ).fetchone()
+    g.pop('user', None)
 
 # Nessa visualização a função 'logout', o usuário encerrará seu acesso ao aplicativo flaskr.
 # A URL especificada será um conjunto da url_prefix: '/auth' + o decorador route() da Blueprint '/logout'.
@@ -140,9 +243,34 @@ def logout():
 
     return redirect(url_for('index'))
 
-# Essa função 'login_required', será usada para exigir autenticação em outras visualizações.
+# Nessa visualização a função 'logout_everywhere', o usuário encerra todas as suas sessões, em todos os navegadores
+# e dispositivos, não apenas a atual (somente com as sessões guardadas no servidor, 'SESSION_STORE').
+@bp.route('/logout-everywhere')
+def logout_everywhere():
+    user_id = session.get('user_id')
+
+    if user_id is not None and hasattr(session, 'user'):
+        sessions.logout_everywhere(user_id)
+
+    session.clear()
+
+    return redirect(url_for('index'))
+
+# Essa função 'login_required', será usada para exigir autenticação em outras visualizações,
+# sejam elas síncronas (def) ou assíncronas (async def).
 def login_required(view):
     # Com o decorador, estamos chamando uma nova função de visualização, no primeiro momento será feito uma validação.
+    # Para uma visualização assíncrona, a nova função também precisa ser assíncrona, para que o Flask a aguarde.
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapped_async_view(**kwargs):
+            if g.user is None:
+                return redirect(url_for('auth.login'))
+
+            return await view(**kwargs)
+
+        return wrapped_async_view
+
     @functools.wraps(view)
     def wrapped_view(**kwargs):
         # Condição aqui é para validar se o usuário está logado, ou seja, através da função 'load_logged_in_user' pelo objeto 'g'
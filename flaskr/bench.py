@@ -0,0 +1,309 @@
+# 09 - Medindo o desempenho do aplicativo flaskr, com carga e latência das principais URLs
+'''
+1º - Importando os módulos json, os, random, tempfile, threading e time - Utilizados para gerar os dados de teste,
+medir o tempo de cada solicitação e salvar os resultados
+2º - Importando a classe ThreadPoolExecutor do módulo concurrent.futures - Simula vários clientes ao mesmo tempo
+3º - Importando os módulos urllib e http.cookiejar - Cliente HTTP para medir um servidor local de verdade
+4º - Importando a função make_server do módulo werkzeug - Inicia o servidor local em uma thread
+
+Exemplo: flask bench --users 100 --posts 1000 --output bench.json --baseline main.json
+'''
+
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+BENCH_PASSWORD = 'bench'
+
+# Percentil pelo método do posto mais próximo (nearest-rank), [values] precisa estar ordenado.
+def percentile(values, p):
+    if not values:
+        return None
+
+    rank = max(int(-(-p * len(values) // 100)), 1)
+    return values[rank - 1]
+
+# Preenche o Banco de Dados com [users] usuários e [posts] postagens por usuário.
+# Todos os usuários compartilham o mesmo hash de senha, calculado uma única vez.
+def seed(db, users, posts):
+    pwhash = generate_password_hash(
+        BENCH_PASSWORD, current_app.config['PASSWORD_HASH_METHOD'],
+        current_app.config['PASSWORD_SALT_LENGTH'],
+    )
+    db.executemany(
+        "INSERT INTO user (username, password) VALUES (?, ?)",
+        ((f'bench{i}', pwhash) for i in range(users)),
+    )
+    rand = random.Random(0)
+    db.executemany(
+        "INSERT INTO post (title, body, author_id, created)"
+        " VALUES (?, ?, ?, datetime('2020-01-01', ? || ' seconds'))",
+        (
+            (f'title {u}-{p}', 'body ' * 50, u + 1, rand.randrange(10 ** 8))
+            for u in range(users) for p in range(posts)
+        ),
+    )
+    db.commit()
+
+# Os clientes simulados, 'TestClientDriver' usa o cliente de teste do Flask (sem rede),
+# 'HTTPDriver' faz solicitações HTTP reais para um servidor, mantendo os Cookies da sessão.
+# Ambos retornam o código de status da resposta, após ler o corpo inteiro.
+class TestClientDriver(object):
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code
+
+class HTTPDriver(object):
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()),
+            NoRedirectHandler,
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+# Os redirecionamentos não são seguidos, cada medição corresponde a uma única solicitação.
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+# Cada cenário retorna o (método, caminho, dados) da próxima solicitação, ou None quando não há mais trabalho,
+# por exemplo, quando acabaram as postagens para excluir. O 'update' percorre as postagens em ciclo,
+# o 'delete' consome cada postagem uma única vez.
+def scenarios(post_ids):
+    login = {'username': 'bench0', 'password': BENCH_PASSWORD}
+    lock = threading.Lock()
+    cycle = itertools.cycle(list(post_ids))
+
+    def update():
+        with lock:
+            id = next(cycle, None)
+        if id is not None:
+            return 'POST', f'/{id}/update', {'title': 'updated', 'body': 'updated'}
+
+    def delete():
+        with lock:
+            id = post_ids.pop() if post_ids else None
+        if id is not None:
+            return 'POST', f'/{id}/delete', None
+
+    return {
+        'index': (False, lambda: ('GET', '/', None)),
+        'login': (False, lambda: ('POST', '/auth/login', login)),
+        'create': (True, lambda: ('POST', '/create', {'title': 'new', 'body': 'new'})),
+        'update': (True, update),
+        'delete': (True, delete),
+    }
+
+# O servidor local não registra cada solicitação no terminal.
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+# Executa [requests] solicitações de um cenário, distribuídas entre [concurrency] clientes simultâneos,
+# e calcula a vazão (solicitações por segundo) e os percentis de latência em milissegundos.
+# A vazão considera o intervalo entre o início da primeira e o fim da última solicitação medida,
+# sem o login inicial dos cenários autenticados.
+def run_scenario(make_driver, scenario, requests, concurrency):
+    authenticated, next_request = scenario
+    latencies = []
+    spans = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(count):
+        nonlocal errors
+        driver = make_driver()
+
+        if authenticated:
+            driver.request(
+                'POST', '/auth/login',
+                {'username': 'bench0', 'password': BENCH_PASSWORD},
+            )
+
+        for _ in range(count):
+            req = next_request()
+            if req is None:
+                break
+
+            start = time.perf_counter()
+            status = driver.request(*req)
+            end = time.perf_counter()
+
+            with lock:
+                latencies.append((end - start) * 1000)
+                spans.append((start, end))
+                if status >= 400:
+                    errors += 1
+
+    counts = [requests // concurrency] * concurrency
+    for i in range(requests % concurrency):
+        counts[i] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, counts))
+
+    wall = max(e for s, e in spans) - min(s for s, e in spans) if spans else 0
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+    }
+
+# Compara os resultados com uma execução anterior, um cenário regrediu quando o p95 aumentou,
+# ou a vazão diminuiu, mais do que [threshold] (0.2 = 20%). Retorna as mensagens das regressões.
+def compare(results, baseline, threshold):
+    regressions = []
+
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+
+        if not previous or not current['requests'] or not previous['requests']:
+            continue
+
+        if current['p95'] > previous['p95'] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {current['p95']:.2f}ms > {previous['p95']:.2f}ms"
+            )
+        if current['throughput'] < previous['throughput'] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {current['throughput']:.1f}/s"
+                f" < {previous['throughput']:.1f}/s"
+            )
+
+    return regressions
+
+# Executa todos os cenários ([endpoints]) sobre um Banco de Dados temporário, criado e preenchido para a medição,
+# sem tocar no Banco de Dados configurado. Com [server=True] as solicitações vão para um servidor HTTP local.
+def run_bench(users, posts, requests, concurrency, server=False, endpoints=None):
+    from flaskr import create_app
+    from flaskr.db import close_pool, get_db, init_db
+
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    config = dict(current_app.config, DATABASE=path, DATABASE_REPLICA=None, DATABASE_SHARDS=[])
+    app = create_app(config)
+    httpd = None
+
+    try:
+        with app.app_context():
+            init_db()
+            seed(get_db(), users, posts)
+            post_ids = [row[0] for row in get_db().execute(
+                "SELECT id FROM post WHERE author_id = 1"
+            )]
+
+        if server:
+            httpd = make_server(
+                '127.0.0.1', 0, app, threaded=True,
+                request_handler=QuietRequestHandler,
+            )
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{httpd.server_port}'
+            make_driver = lambda: HTTPDriver(base_url)
+        else:
+            make_driver = lambda: TestClientDriver(app)
+
+        # Uma solicitação de aquecimento (não medida), compila os Templates e abre as conexões.
+        make_driver().request('GET', '/')
+
+        results = {
+            'meta': {
+                'users': users, 'posts': posts, 'requests': requests,
+                'concurrency': concurrency,
+                'mode': 'server' if server else 'test-client',
+                'timestamp': time.time(),
+            },
+            'endpoints': {},
+        }
+
+        for name, scenario in scenarios(post_ids).items():
+            if endpoints and name not in endpoints:
+                continue
+            results['endpoints'][name] = run_scenario(
+                make_driver, scenario, requests, concurrency
+            )
+
+        return results
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+        with app.app_context():
+            close_pool()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+# Utilizando a função 'command' estamos adicionando a linha de comando 'bench', que mede os cenários,
+# exibe uma tabela com os resultados, salva em JSON ('--output'), e compara com uma execução anterior
+# ('--baseline'), terminando com erro quando houver regressões acima do limite ('--threshold').
+@click.command('bench')
+@click.option('--users', default=10, show_default=True, help='Number of seeded users.')
+@click.option('--posts', default=100, show_default=True, help='Posts per seeded user.')
+@click.option('--requests', default=200, show_default=True, help='Requests per endpoint.')
+@click.option('--concurrency', default=4, show_default=True, help='Simultaneous clients.')
+@click.option('--server', is_flag=True, help='Drive a local HTTP server instead of the test client.')
+@click.option('--endpoint', 'endpoints', multiple=True, help='Only run these scenarios.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Save results as JSON.')
+@click.option('--baseline', type=click.File('r'), help='Previous JSON results to compare with.')
+@click.option('--threshold', default=0.2, show_default=True, help='Allowed regression ratio.')
+@with_appcontext
+def bench_command(users, posts, requests, concurrency, server, endpoints,
+                  output, baseline, threshold):
+    results = run_bench(users, posts, requests, concurrency, server, endpoints)
+
+    click.echo(f"{'endpoint':<10}{'req':>6}{'err':>5}{'req/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, r in results['endpoints'].items():
+        if not r['requests']:
+            click.echo(f'{name:<10}{0:>6}')
+            continue
+        click.echo(
+            f"{name:<10}{r['requests']:>6}{r['errors']:>5}{r['throughput']:>10.1f}"
+            f"{r['p50']:>9.2f}{r['p95']:>9.2f}{r['p99']:>9.2f}"
+        )
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, json.load(baseline), threshold)
+
+        for message in regressions:
+            click.echo(f'Regression: {message}', err=True)
+
+        if regressions:
+            raise click.exceptions.Exit(1)
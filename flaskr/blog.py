@@ -5,36 +5,282 @@ abort, é uma exceção especial que retorna um código de status HTTP com uma m
 para mostrar qual foi o erro.
 '''
 
+import asyncio
+import heapq
+from itertools import islice
+
 from flask import (
-    Blueprint, flash, g, redirect, render_template, request, url_for
+    Blueprint, Response, current_app, flash, g, redirect, render_template,
+    request, session, stream_with_context, url_for
 )
+from flask.signals import before_render_template, template_rendered
+from jinja2.environment import TemplateStream
 
+from markupsafe import Markup, escape
 from werkzeug.exceptions import abort
 
+from flaskr.aiodb import get_async_db
 from flaskr.auth import login_required
-from flaskr.db import get_db
+from flaskr.cache import cached_response, invalidate_pages
+from flaskr.counters import record_view
+from flaskr.db import (
+    get_db, get_shard_db, get_shards, query_shards, shard_for_author, shards_for_post,
+    use_reader, write
+)
+from flaskr.edge import edge_private
+from flaskr.render import render_body
 
 # Criando o nome do Blueprint com 'blog',
 # marcando a sua localização com o segundo argumento, usamos __name__.
 bp = Blueprint('blog', __name__)
 
-# Nesta visualização de índice principal da página, será apresentado todas as postagens,
+# O cursor de paginação é o par (created, id) da última postagem exibida, serializado como texto,
+# por exemplo '2018-01-01 00:00:00,1'. Com ele a consulta continua exatamente de onde a página anterior parou.
+def format_cursor(post):
+    return f"{post['created']},{post['id']}"
+
+# O maior valor de um INTEGER do SQLite, os números maiores recebidos na URL levantariam OverflowError
+# ao serem enviados ao sqlite3 (um erro 500), então são recusados antes da consulta.
+MAX_INTEGER = 2 ** 63 - 1
+
+# Converte o texto do cursor recebido na URL para o par (created, id), caso esteja malformado, retorna 400.
+def parse_cursor(value):
+    created, _, id = value.rpartition(',')
+
+    if not created or not id.isdigit() or int(id) > MAX_INTEGER:
+        abort(400, f"Invalid cursor {value!r}.")
+
+    return created, int(id)
+
+# A classe 'PostPage', percorre as linhas do cursor do sqlite3 somente quando o Template itera sobre ela,
+# assim a página começa a ser enviada antes da última linha ser lida.
+# A consulta busca uma linha a mais do que o tamanho da página, se essa linha existir, há uma próxima página.
+# As postagens e autores lidos (incluindo a linha a mais), são registrados em 'tags' para o Cache de páginas.
+class PostPage(object):
+    def __init__(self, rows, per_page, has_prev=False, has_next=False, extra=None):
+        self._rows = rows
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.first = None
+        self.last = None
+        self.tags = set()
+
+        if extra is not None:
+            self._tag(extra)
+
+    def _tag(self, row):
+        self.tags.add(f"post:{row['id']}")
+        self.tags.add(f"user:{row['author_id']}")
+
+    def __iter__(self):
+        for i, row in enumerate(self._rows):
+            self._tag(row)
+
+            if i == self.per_page:
+                self.has_next = True
+                break
+
+            if self.first is None:
+                self.first = row
+            self.last = row
+            yield row
+
+        # Finaliza a consulta, para que a conexão volte ao Pool sem uma leitura pendente.
+        if hasattr(self._rows, 'close'):
+            self._rows.close()
+
+    @property
+    def prev_cursor(self):
+        return format_cursor(self.first) if self.first is not None else None
+
+    @property
+    def next_cursor(self):
+        return format_cursor(self.last) if self.last is not None else None
+
+# A ordem das postagens no índice principal, usada para combinar as postagens de cada shard.
+def post_order(post):
+    return post['created'], post['id']
+
+# Consulta paginada por chave (keyset), em vez de OFFSET, a condição (created, id) < (?, ?) usa o índice
+# 'post_created_id' definido no schema.sql, então o custo de cada página não cresce com o tamanho da tabela.
+# Com [author_id], somente as postagens do autor, pelo índice 'post_author_created' (migração 0001).
+# O nome do autor vem da coluna 'author_name' (migração 0002), sem o JOIN com a tabela user.
+# Com 'before' buscamos as postagens mais antigas que o cursor, com 'after' as mais recentes,
+# nesse caso a ordem é invertida na consulta e depois restaurada (a página é pequena, cabe em memória).
+# Com vários shards ('DATABASE_SHARDS'), cada shard retorna no máximo uma página, e as páginas são combinadas.
+def get_posts_page(before=None, after=None, per_page=None, author_id=None):
+    if per_page is None:
+        per_page = current_app.config['POSTS_PER_PAGE']
+
+    select = (
+        "SELECT p.id, title, body, body_html, body_version, created, author_id,"
+        " author_name AS username FROM post p"
+    )
+    conditions = []
+    parameters = []
+
+    if author_id is not None:
+        conditions.append("p.author_id = ?")
+        parameters.append(author_id)
+
+    def query(condition, cursor, order, reverse):
+        where = conditions + [condition] if condition else conditions
+        sql = select + (" WHERE " + " AND ".join(where) if where else "")
+        return query_shards(
+            sql + f" ORDER BY p.created {order}, p.id {order} LIMIT ?",
+            (*parameters, *cursor, per_page + 1), key=post_order, reverse=reverse
+        )
+
+    if after is not None:
+        rows = list(islice(
+            query("(p.created, p.id) > (?, ?)", after, 'ASC', False), per_page + 1
+        ))
+        # A linha extra (mais recente) indica que existe uma página anterior.
+        extra = rows[per_page] if len(rows) > per_page else None
+        rows = rows[:per_page]
+        rows.reverse()
+        return PostPage(
+            rows, per_page, has_prev=extra is not None, has_next=True, extra=extra
+        )
+
+    if before is not None:
+        rows = query("(p.created, p.id) < (?, ?)", before, 'DESC', True)
+    else:
+        rows = query(None, (), 'DESC', True)
+
+    return PostPage(rows, per_page, has_prev=before is not None)
+
+# Renderiza o Template em partes (stream), em vez de montar a página inteira numa String,
+# o Flask envia cada parte para o cliente à medida que o Jinja avança no Template.
+# Os sinais 'before_render_template' e 'template_rendered' são enviados como no 'render_template', o segundo
+# depois da última parte, assim o tempo do Template (flaskr.metrics) inclui o envio das partes ao cliente.
+def stream_template(template_name, **context):
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+
+    def generate():
+        before_render_template.send(app, template=template, context=context)
+        yield from template.generate(context)
+        template_rendered.send(app, template=template, context=context)
+
+    stream = TemplateStream(generate())
+    # Agrupa pequenas partes para não enviar muitos pedaços minúsculos.
+    stream.enable_buffering(5)
+    return stream
+
+# Nesta visualização de índice principal da página, será apresentado as postagens paginadas,
 # as mais recentes terão como destaque em primeiro.
+# Com o Cache de páginas ativo ('PAGE_CACHE'), a página renderizada é guardada com as etiquetas das postagens
+# e autores exibidos, as páginas sem o cursor 'before' também recebem a etiqueta 'posts:head',
+# pois uma nova postagem aparece nelas.
+# Sem o Cache, a página é enviada em partes com o 'stream_with_context', o Contexto de Solicitação
+# (e a conexão com o Banco de Dados), permanecem disponíveis até que o Template termine de ser enviado.
 @bp.route('/')
 def index():
-    db = get_db()
-    posts = db.execute(
-        "SELECT p.id, title, body, created, author_id, username"
-        " FROM post p JOIN user u ON p.author_id = u.id"
-        " ORDER BY created DESC"
-    ).fetchall()
-    return render_template('blog/index.html', posts=posts)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    posts = get_posts_page(
+        before=parse_cursor(before) if before else None,
+        after=parse_cursor(after) if after else None,
+    )
+
+    if not current_app.config['PAGE_CACHE']:
+        return Response(stream_with_context(
+            stream_template('blog/index.html', posts=posts)
+        ))
+
+    def render():
+        body = render_template('blog/index.html', posts=posts)
+        tags = set(posts.tags)
+
+        if 'user_id' in session:
+            tags.add(f"user:{session['user_id']}")
+        if before is None:
+            tags.add('posts:head')
+
+        return body, sorted(tags)
+
+    return cached_response(render)
+
+# Converte o texto digitado pelo usuário em uma consulta FTS5, cada palavra vira uma frase entre aspas,
+# assim caracteres especiais da sintaxe do FTS5 (AND, OR, *, aspas...) são tratados como texto comum.
+def fts_query(text):
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in text.split())
+
+# Os trechos destacados pelo FTS5 chegam delimitados pelos caracteres de controle \x02 e \x03,
+# o texto é escapado primeiro, e só depois os delimitadores viram as tags <mark>, evitando injeção de HTML.
+@bp.app_template_filter('highlight')
+def highlight(text):
+    return Markup(
+        str(escape(text)).replace('\x02', '<mark>').replace('\x03', '</mark>')
+    )
+
+# A consulta da busca, a relevância ('score') também é retornada, para combinar os resultados dos shards.
+SEARCH_SQL = (
+    "SELECT p.id, created, author_id, author_name AS username,"
+    " highlight(post_fts, 0, char(2), char(3)) AS title,"
+    " snippet(post_fts, 1, char(2), char(3), '…', 32) AS body,"
+    " bm25(post_fts, 10.0, 1.0) AS score"
+    " FROM post_fts JOIN post p ON p.id = post_fts.rowid"
+    " WHERE post_fts MATCH ?"
+    " ORDER BY score, p.id DESC"
+    " LIMIT ? OFFSET ?"
+)
+
+# Busca [limit] resultados a partir de [offset]. Com vários shards, as consultas são aguardadas ao mesmo tempo,
+# cada shard retorna os seus primeiros [offset + limit] resultados, e os resultados são combinados pela relevância.
+# Observação: o bm25 usa as estatísticas de cada shard, então a relevância entre shards é aproximada.
+async def search_shards(query, limit, offset):
+    count = len(get_shards())
+
+    if count == 1:
+        db = await get_async_db()
+        return await db.fetchall(SEARCH_SQL, (query, limit, offset))
+
+    dbs = [await get_async_db(shard) for shard in range(count)]
+    results = await asyncio.gather(*(
+        db.fetchall(SEARCH_SQL, (query, offset + limit, 0)) for db in dbs
+    ))
+    merged = heapq.merge(*results, key=lambda row: (row['score'], -row['id']))
+    return list(islice(merged, offset, offset + limit))
+
+# Nesta visualização de busca, as postagens são encontradas pelo índice FTS5 'post_fts' (search.sql),
+# ordenadas pela relevância bm25 (o título tem peso maior que o corpo), com os termos destacados,
+# e paginadas pelo parâmetro 'page'. A visualização é assíncrona, as consultas são aguardadas pelas conexões
+# assíncronas de leitura (flaskr.aiodb), com vários shards, ao mesmo tempo.
+@bp.route('/search')
+async def search():
+    q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = current_app.config['POSTS_PER_PAGE']
+    results = []
+    has_next = False
+
+    if not 1 <= page <= MAX_INTEGER // per_page:
+        abort(400, "Invalid page.")
+
+    if q:
+        results = await search_shards(fts_query(q), per_page + 1, (page - 1) * per_page)
+        has_next = len(results) > per_page
+        results = results[:per_page]
+
+    return render_template(
+        'blog/search.html', q=q, results=results, page=page, has_next=has_next
+    )
 
 # A visualização da função 'create' é parecida com 'register' do Blueprint de autenticação,
 # se os dados validados para a postagem estão corretos será adicionados ao banco de dados,
 # senão, um erro será apresentado.
 # Agora teremos o decorador login_required usado para exigir autenticação em algumas visualizações.
+# As visualizações que alteram postagens usam a conexão de leitura ('use_reader') para o usuário e a postagem,
+# e a função 'write' (flaskr.db) para a escrita, que com o 'GROUP_COMMIT' ativo é agrupada com as
+# escritas de outras solicitações, a visualização só continua depois do COMMIT.
+# A postagem é gravada no shard do autor ('DATABASE_SHARDS'), já com o nome do autor, pois a tabela user
+# fica somente no 'DATABASE', e com o HTML do corpo (flaskr.render), convertido uma única vez aqui.
 @bp.route('/create', methods=('GET', 'POST'))
+@use_reader
 @login_required
 def create():
     if request.method == 'POST':
@@ -48,13 +294,13 @@ def create():
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                "INSERT INTO post (title, body, author_id)"
-                " VALUES (?, ?, ?)",
-                (title, body, g.user['id'])
+            write(
+                "INSERT INTO post (title, body, body_html, body_version, author_id, author_name)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (title, body, *render_body(body), g.user['id'], g.user['username']),
+                shard=shard_for_author(g.user['id'])
             )
-            db.commit()
+            invalidate_pages('posts:head', f"author:{g.user['id']}")
             return redirect(url_for('blog.index'))
     return render_template('blog/create.html')
 
@@ -62,27 +308,38 @@ def create():
 # é do autor que corresponde ao usuário conectado, e,
 # assim podemos chamar essa função para visualização a função 'update' e 'delete'.
 def get_post(id, check_author=True):
-    post = get_db().execute(
-        "SELECT p.id, title, body, created, author_id, username"
-        " FROM post p JOIN user u ON p.author_id = u.id"
-        " WHERE p.id = ?",
-        (id,)
-    ).fetchone()
+    return locate_post(id, check_author)[1]
 
-    if post is None:
+# Retorna o shard onde a postagem está, e a postagem, procurando primeiro no shard onde ela foi criada.
+# Um id acima de 'MAX_INTEGER' não pode existir no Banco de Dados, e retorna 404 sem consultar os shards.
+def locate_post(id, check_author=True):
+    if id > MAX_INTEGER:
+        abort(404, f"Post id {id} doesn't exist.")
+
+    for shard in shards_for_post(id):
+        post = get_shard_db(shard).execute(
+            "SELECT p.id, title, body, body_html, body_version, created, author_id,"
+            " author_name AS username, views FROM post p WHERE p.id = ?",
+            (id,)
+        ).fetchone()
+
+        if post is not None:
+            break
+    else:
         abort(404, f"Post id {id} doesn't exist.")
 
     if check_author and post['author_id'] != g.user['id']:
         abort(403)
 
-    return post
+    return shard, post
 
 # Nossa próxima visualização a função 'update',
 # o usuário que no caso deve ser o autor conseguirá editar sua postagem no aplicativo flaskr.
 @bp.route('/<int:id>/update', methods=('GET', 'POST'))
+@use_reader
 @login_required
 def update(id):
-    post = get_post(id)
+    shard, post = locate_post(id)
 
     if request.method == 'POST':
         title = request.form['title']
@@ -95,23 +352,123 @@ def update(id):
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                "UPDATE post SET title = ?, body = ?"
+            write(
+                "UPDATE post SET title = ?, body = ?, body_html = ?, body_version = ?"
                 " WHERE id = ?",
-                (title, body, id)
+                (title, body, *render_body(body), id), shard=shard
             )
-            db.commit()
+            invalidate_pages(f'post:{id}')
             return redirect(url_for('blog.index'))
 
     return render_template('blog/update.html', post=post)
 
 # Por fim, temos a última visualização a função 'delete', que permite o usuário a excluir uma postagem.
 @bp.route('/<int:id>/delete', methods=('POST',))
+@use_reader
 @login_required
 def delete(id):
-    get_post(id)
-    db = get_db()
-    db.execute('DELETE FROM post WHERE id = ?', (id,))
-    db.commit()
+    shard, post = locate_post(id)
+    write('DELETE FROM post WHERE id = ?', (id,), shard=shard)
+    invalidate_pages(f'post:{id}', f"author:{post['author_id']}")
     return redirect(url_for('blog.index'))
+
+# Nesta visualização a função 'detail', é apresentada uma única postagem, e a visualização é contada na memória
+# (flaskr.counters), sem escrever no Banco de Dados. O número exibido é o último gravado, atrasado em até
+# 'VIEW_FLUSH_INTERVAL' segundos (e pelo Cache de páginas). A página não é guardada pelos proxies ('edge_private'),
+# pois a visualização precisa ser chamada para cada leitura.
+@bp.route('/<int:id>')
+@edge_private
+def detail(id):
+    post = get_post(id, check_author=False)
+
+    if request.method == 'GET':
+        record_view(id)
+
+    def render():
+        tags = {f'post:{id}', f"user:{post['author_id']}"}
+
+        if 'user_id' in session:
+            tags.add(f"user:{session['user_id']}")
+
+        return render_template('blog/detail.html', post=post), sorted(tags)
+
+    return cached_response(render)
+
+# As postagens mais lidas, a consulta lê as primeiras entradas do índice 'post_views' (migração 0004),
+# em vez de ordenar todas as postagens.
+def get_popular_posts(limit=None):
+    if limit is None:
+        limit = current_app.config['POPULAR_POSTS']
+
+    return list(islice(query_shards(
+        "SELECT p.id, title, body, created, author_id, author_name AS username, views"
+        " FROM post p WHERE views > 0 ORDER BY views DESC, id DESC LIMIT ?",
+        (limit,), key=lambda post: (post['views'], post['id']), reverse=True
+    ), limit))
+
+# Nesta visualização a função 'popular', a listagem das postagens mais lidas ("most read").
+# As contagens mudam a cada lote gravado, então a página guardada no Cache não é invalidada por elas,
+# apenas pelas alterações das postagens exibidas, e é atualizada ao expirar ('PAGE_CACHE_TTL').
+@bp.route('/popular')
+def popular():
+    posts = get_popular_posts()
+
+    def render():
+        tags = set()
+
+        for post in posts:
+            tags.add(f"post:{post['id']}")
+            tags.add(f"user:{post['author_id']}")
+
+        if 'user_id' in session:
+            tags.add(f"user:{session['user_id']}")
+
+        return render_template('blog/popular.html', posts=posts), sorted(tags)
+
+    return cached_response(render)
+
+# O número de postagens do autor, a soma do resumo 'author_stats' (migração 0007) de cada shard, uma leitura pela
+# chave primária em cada arquivo, mantida pelos gatilhos da tabela post, sem contar as postagens.
+def get_author_post_count(author_id):
+    return sum(
+        row[0] for row in (
+            get_shard_db(shard).execute(
+                "SELECT post_count FROM author_stats WHERE author_id = ?", (author_id,)
+            ).fetchone()
+            for shard in range(len(get_shards()))
+        ) if row is not None
+    )
+
+# Nesta visualização a função 'author', a página de um autor, com o número de postagens e as suas postagens
+# paginadas por chave (keyset) como no índice principal. A página recebe a etiqueta 'author:<id>', invalidada
+# quando o autor cria ou exclui uma postagem (o número de postagens e a primeira página mudam).
+@bp.route('/u/<username>')
+def author(username):
+    user = get_db().execute(
+        "SELECT id, username FROM user WHERE username = ?", (username,)
+    ).fetchone()
+
+    if user is None:
+        abort(404, f"User {username} doesn't exist.")
+
+    before = request.args.get('before')
+    after = request.args.get('after')
+    posts = get_posts_page(
+        before=parse_cursor(before) if before else None,
+        after=parse_cursor(after) if after else None,
+        author_id=user['id'],
+    )
+
+    def render():
+        body = render_template(
+            'blog/author.html', author=user, post_count=get_author_post_count(user['id']),
+            posts=posts
+        )
+        tags = set(posts.tags) | {f"user:{user['id']}", f"author:{user['id']}"}
+
+        if 'user_id' in session:
+            tags.add(f"user:{session['user_id']}")
+
+        return body, sorted(tags)
+
+    return cached_response(render)
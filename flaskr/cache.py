@@ -0,0 +1,228 @@
+# 05 - Criando um Cache em memória, com tamanho limitado e tempo de expiração
+'''
+1º - Importando o módulo threading - O Cache é compartilhado entre as threads do servidor, então é protegido por um Lock
+2º - Importando o módulo time - Utilizado para controlar o tempo de expiração (TTL) de cada item
+3º - Importando a classe OrderedDict do módulo collections - Mantém a ordem de uso dos itens, o item usado há mais
+tempo fica no início e é o primeiro a ser descartado (LRU - Least Recently Used)
+4º - Importando o módulo uuid - Gera as versões das etiquetas (tags) do Cache de páginas
+5º - Importando a classe datetime do módulo datetime - Data de criação da página, usada no cabeçalho Last-Modified
+6º - Importando a função generate_etag do módulo werkzeug - Calcula o ETag do conteúdo de uma página
+7º - Importando a função compress_bytes do flaskr.compress - Gera as versões comprimidas das páginas guardadas
+'''
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, current_app, g, request, session
+from werkzeug.http import generate_etag
+
+from flaskr.compress import compress_bytes
+
+# Valor usado para diferenciar "item ausente" de um item armazenado com o valor None.
+MISSING = object()
+
+# A classe 'CacheBackend', define a interface de armazenamento usada pelo Cache de páginas,
+# outros armazenamentos (por exemplo, compartilhados entre processos) podem ser usados implementando esses métodos
+# e definindo uma instância na configuração 'PAGE_CACHE_BACKEND'.
+class CacheBackend(object):
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=MISSING):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+# A classe 'TTLCache', guarda no máximo [maxsize] itens, cada um válido por [ttl] segundos.
+# Quando o Cache está cheio, o item usado há mais tempo é descartado para dar lugar ao novo.
+class TTLCache(CacheBackend):
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+
+            if entry is MISSING:
+                return default
+
+            value, expires = entry
+
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    # O parâmetro [ttl] substitui o tempo de expiração padrão apenas para este item, None não expira.
+    def set(self, key, value, ttl=MISSING):
+        if ttl is MISSING:
+            ttl = self.ttl
+
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, MISSING)
+
+        return default if entry is MISSING else entry[0]
+
+    def delete(self, key):
+        self.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# Uma página renderizada guardada no Cache, com o ETag e a data usados nas solicitações condicionais.
+# As versões comprimidas (flaskr.compress) são geradas na primeira vez que um cliente pede cada codificação,
+# e guardadas junto com a página, as próximas solicitações reaproveitam os mesmos bytes.
+class CachedPage(object):
+    def __init__(self, body, tags, mimetype='text/html'):
+        self.body = body
+        self.tags = tags
+        self.mimetype = mimetype
+        self.etag = generate_etag(body)
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._encoded = {}
+
+    def encoded(self, encoding, level):
+        key = (encoding, level)
+
+        if key not in self._encoded:
+            self._encoded[key] = compress_bytes(self.body, encoding, level)
+
+        return self._encoded[key]
+
+    def to_response(self):
+        response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.cached_page = self
+        return response
+
+# A classe 'PageCache', guarda páginas renderizadas e as invalida por etiquetas (tags), por exemplo
+# 'post:1' para as páginas que exibem a postagem 1. Cada etiqueta tem uma versão guardada no próprio armazenamento,
+# a página registra as versões das suas etiquetas quando é guardada, invalidar uma etiqueta apenas troca sua versão,
+# e as páginas com a versão antiga deixam de ser válidas. Assim não é preciso percorrer as chaves do armazenamento,
+# e a invalidação funciona igual para qualquer 'CacheBackend'.
+class PageCache(object):
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+
+    def _versions(self, tags):
+        return tuple(self.backend.get('tag:' + tag) for tag in tags)
+
+    def get(self, key):
+        entry = self.backend.get('page:' + key)
+
+        if entry is None:
+            return None
+
+        page, versions = entry
+
+        if self._versions(page.tags) != versions:
+            self.backend.delete('page:' + key)
+            return None
+
+        return page
+
+    # A geração muda a cada invalidação, uma página renderizada enquanto uma escrita invalidava o Cache,
+    # pode conter dados antigos, então só é guardada se a geração lida antes de renderizar não mudou.
+    def generation(self):
+        return self.backend.get('generation')
+
+    def set(self, key, page, generation=MISSING):
+        if generation is not MISSING and generation != self.generation():
+            return
+
+        self.backend.set(
+            'page:' + key, (page, self._versions(page.tags)), ttl=self.ttl
+        )
+
+    # As versões das etiquetas não expiram pelo tempo, uma versão descartada pelo LRU torna as páginas
+    # que a registraram inválidas, nunca o contrário.
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.set('tag:' + tag, uuid.uuid4().hex, ttl=None)
+
+        self.backend.set('generation', uuid.uuid4().hex, ttl=None)
+
+# Retorna o Cache de páginas do aplicativo atual, usando o armazenamento da configuração 'PAGE_CACHE_BACKEND',
+# ou um 'TTLCache' em memória com 'PAGE_CACHE_SIZE' itens.
+def get_page_cache():
+    if 'flaskr_page_cache' not in current_app.extensions:
+        backend = current_app.config['PAGE_CACHE_BACKEND']
+
+        if backend is None:
+            backend = TTLCache(maxsize=current_app.config['PAGE_CACHE_SIZE'])
+
+        current_app.extensions['flaskr_page_cache'] = PageCache(
+            backend, ttl=current_app.config['PAGE_CACHE_TTL']
+        )
+
+    return current_app.extensions['flaskr_page_cache']
+
+# Invalida as páginas que exibem os dados alterados, chamada pelas visualizações que escrevem no Banco de Dados.
+# As mesmas etiquetas são repassadas para o evento de remoção dos proxies (flaskr.edge), quando registrado.
+def invalidate_pages(*tags):
+    get_page_cache().invalidate(*tags)
+    listener = current_app.extensions.get('flaskr_purge_listener')
+
+    if listener is not None:
+        listener(tags)
+
+# A chave de uma página combina a visualização, os parâmetros da URL e a variante do visitante,
+# anônimo ou o usuário conectado (a página exibe o nome e os links de edição de quem está conectado).
+def page_cache_key():
+    user_id = session.get('user_id')
+    variant = 'anon' if user_id is None else f'user:{user_id}'
+    return f'{request.endpoint}:{variant}:{request.full_path}'
+
+# Retorna a página guardada no Cache, ou chama [render] que retorna o HTML e as etiquetas da página,
+# e guarda o resultado. A resposta tem ETag e Last-Modified, e responde 304 quando o navegador já tem a página.
+# Solicitações que não são GET, ou com mensagens flash pendentes, não usam o Cache.
+# As etiquetas da página ficam em 'g.page_tags', usadas nos cabeçalhos de Cache HTTP (flaskr.edge).
+def cached_response(render):
+    if (
+        not current_app.config['PAGE_CACHE']
+        or request.method not in ('GET', 'HEAD')
+        or '_flashes' in session
+    ):
+        body, g.page_tags = render()
+        return Response(body, mimetype='text/html')
+
+    cache = get_page_cache()
+    key = page_cache_key()
+    page = cache.get(key)
+
+    if page is None:
+        generation = cache.generation()
+        body, tags = render()
+        page = CachedPage(body.encode('utf-8'), tags)
+        cache.set(key, page, generation)
+
+    g.page_tags = page.tags
+    return page.to_response().make_conditional(request)
@@ -0,0 +1,178 @@
+# 14 - Comprimindo as respostas (gzip, brotli e zstd), conforme o cabeçalho Accept-Encoding do cliente
+'''
+1º - Importando o módulo zlib - Compressão gzip, disponível em qualquer instalação do Python
+2º - Importando os módulos brotli e zstandard (opcionais) - Quando instalados, as codificações 'br' e 'zstd'
+também são oferecidas
+3º - As respostas enviadas em partes (stream) são comprimidas parte por parte, sem juntar o corpo inteiro na memória,
+e as páginas do Cache de páginas guardam os bytes já comprimidos, reaproveitados nas próximas solicitações
+'''
+
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/csv',
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml',
+)
+
+# Cada classe de compressão tem o mesmo formato: 'compress' retorna os bytes comprimidos de uma parte,
+# já liberados (flush) para que o navegador possa exibir a página aos poucos, e 'finish' retorna o final do fluxo.
+class GzipCompressor(object):
+    def __init__(self, level):
+        # O 'wbits' 16 + MAX_WBITS gera o cabeçalho e o rodapé do formato gzip.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class BrotliCompressor(object):
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+class ZstdCompressor(object):
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return (
+            self._compressor.compress(data)
+            + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        )
+
+    def finish(self):
+        return self._compressor.flush()
+
+# As codificações disponíveis nesta instalação, as opcionais só aparecem quando o módulo foi importado.
+COMPRESSORS = {'gzip': GzipCompressor}
+
+if brotli is not None:
+    COMPRESSORS['br'] = BrotliCompressor
+if zstandard is not None:
+    COMPRESSORS['zstd'] = ZstdCompressor
+
+def compress_bytes(data, encoding, level):
+    compressor = COMPRESSORS[encoding](level)
+    return compressor.compress(data) + compressor.finish()
+
+# Comprime as partes de uma resposta em partes à medida que são geradas. O gerador original é fechado no final,
+# assim o 'stream_with_context' libera o Contexto de Solicitação normalmente.
+def compress_stream(chunks, encoding, level, charset='utf-8'):
+    compressor = COMPRESSORS[encoding](level)
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+
+            data = compressor.compress(chunk)
+
+            if data:
+                yield data
+
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+# Escolhe a codificação com maior qualidade (q) no Accept-Encoding, em caso de empate, vale a ordem
+# de preferência da configuração 'COMPRESS_ALGORITHMS'. Retorna None quando nenhuma é aceita.
+def choose_encoding():
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+
+    for encoding in current_app.config['COMPRESS_ALGORITHMS']:
+        if encoding not in COMPRESSORS:
+            continue
+
+        quality = accepted[encoding]
+
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+def should_compress(response):
+    return (
+        current_app.config['COMPRESS']
+        and response.mimetype in current_app.config['COMPRESS_MIMETYPES']
+        and 200 <= response.status_code < 300
+        and response.status_code != 204
+        and 'Content-Encoding' not in response.headers
+        and not response.direct_passthrough
+    )
+
+# Registrada com 'after_request', comprime a resposta quando o tipo é de texto e o cliente aceita uma codificação.
+# - Uma página do Cache de páginas ('response.cached_page') usa os bytes já comprimidos da página;
+# - Uma resposta em partes é comprimida parte por parte, sem 'Content-Length';
+# - As demais respostas são comprimidas de uma vez, se tiverem pelo menos 'COMPRESS_MIN_SIZE' bytes.
+# O ETag passa a ser fraco (W/), a versão comprimida tem o mesmo conteúdo, mas não os mesmos bytes,
+# e as solicitações condicionais (If-None-Match) continuam respondendo 304.
+def compress_response(response):
+    if not should_compress(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+
+    if encoding is None:
+        return response
+
+    level = current_app.config['COMPRESS_LEVELS'][encoding]
+    page = getattr(response, 'cached_page', None)
+
+    if page is not None:
+        if len(page.body) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(page.encoded(encoding, level))
+    elif response.is_streamed:
+        response.response = compress_stream(
+            response.response, encoding, level, response.charset
+        )
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(compress_bytes(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+# Configurações padrão da compressão, o nível de cada codificação pode ser ajustado em 'COMPRESS_LEVELS'
+# (gzip 1-9, brotli 0-11, zstd 1-22), níveis maiores comprimem mais, e gastam mais CPU por solicitação.
+def init_app(app):
+    app.config.setdefault('COMPRESS', True)
+    app.config.setdefault('COMPRESS_ALGORITHMS', ('zstd', 'br', 'gzip'))
+    app.config.setdefault('COMPRESS_LEVELS', {'gzip': 6, 'br': 4, 'zstd': 3})
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+    app.after_request(compress_response)
@@ -0,0 +1,188 @@
+# 20 - Contando as visualizações das postagens na memória, e gravando as contagens em lotes
+'''
+1º - Importando os módulos logging, sqlite3 e threading - Cada thread do servidor soma as suas contagens
+separadamente (threading.local), e uma thread grava a soma de todas periodicamente
+2º - Um 'UPDATE post SET views = views + 1' a cada página lida, transformaria cada leitura em uma escrita, e as
+escritas do SQLite acontecem uma de cada vez. Com os lotes, são no máximo uma transação a cada 'VIEW_FLUSH_INTERVAL'
+segundos, e em caso de queda do processo, são perdidas no máximo as contagens desse intervalo
+'''
+
+import logging
+import sqlite3
+import threading
+
+from flask import current_app
+
+from flaskr.db import get_pool, get_shards
+
+logger = logging.getLogger(__name__)
+
+# A classe 'CounterShard', as contagens de uma única thread. O Lock só é disputado quando a thread que grava
+# as contagens esvazia a parte, as threads das solicitações nunca esperam umas pelas outras.
+class CounterShard(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.thread = threading.current_thread()
+
+# A classe 'ShardedCounter', um contador por chave, dividido em uma parte (shard) por thread.
+class ShardedCounter(object):
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+
+        if shard is None:
+            shard = self._local.shard = CounterShard()
+
+            with self._lock:
+                self._shards.append(shard)
+
+        return shard
+
+    def add(self, key, amount=1):
+        shard = self._shard()
+
+        with shard.lock:
+            shard.counts[key] = shard.counts.get(key, 0) + amount
+
+    # Retorna a soma das contagens de todas as threads, e as zera. As partes das threads já encerradas
+    # são descartadas depois de esvaziadas, pois não recebem mais contagens.
+    def drain(self):
+        totals = {}
+
+        with self._lock:
+            shards = self._shards
+            self._shards = [shard for shard in shards if shard.thread.is_alive()]
+
+        for shard in shards:
+            with shard.lock:
+                counts, shard.counts = shard.counts, {}
+
+            for key, amount in counts.items():
+                totals[key] = totals.get(key, 0) + amount
+
+        return totals
+
+# A classe 'ViewCounter', soma as visualizações das postagens, e a cada [interval] segundos grava as somas
+# em uma única transação do escritor único de cada shard (flaskr.db), a postagem é atualizada no shard onde está.
+# Se a gravação de um shard falhar, as contagens que não foram gravadas voltam para o contador,
+# e são gravadas no próximo lote.
+class ViewCounter(object):
+    def __init__(self, pools, interval=5):
+        self.pools = pools
+        self.interval = interval
+        self.counter = ShardedCounter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, post_id):
+        self.counter.add(post_id)
+
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None and not self._stop.is_set():
+                    self._thread = threading.Thread(
+                        target=self._run, name='flaskr-view-counter', daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    # Grava as contagens pendentes, em ordem de id, retorna quantas postagens foram atualizadas.
+    def flush(self):
+        counts = self.counter.drain()
+
+        if not counts:
+            return 0
+
+        pending = dict(counts)
+        failed = False
+
+        for pool in self.pools:
+            if not pending:
+                break
+
+            try:
+                applied = self._apply(pool, pending)
+            except sqlite3.Error:
+                logger.exception('Could not flush %d view counts.', len(pending))
+                failed = True
+                continue
+
+            for post_id in applied:
+                del pending[post_id]
+
+        # Sem falhas, as contagens restantes são de postagens excluídas, e são descartadas.
+        if failed:
+            self._restore(pending)
+
+        return len(counts) - len(pending)
+
+    # Atualiza as postagens do shard em uma transação, retorna os ids encontrados nele.
+    def _apply(self, pool, counts):
+        db = pool.acquire()
+        applied = []
+
+        try:
+            for post_id, amount in sorted(counts.items()):
+                cursor = db.execute(
+                    'UPDATE post SET views = views + ? WHERE id = ?', (amount, post_id)
+                )
+
+                if cursor.rowcount:
+                    applied.append(post_id)
+
+            db.commit()
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        finally:
+            db.close()
+
+        return applied
+
+    def _restore(self, counts):
+        for post_id, amount in counts.items():
+            self.counter.add(post_id, amount)
+
+    # Encerra a thread e grava as contagens pendentes, chamada ao fechar o Pool e ao final do processo.
+    def close(self):
+        with self._lock:
+            self._stop.set()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+        self.flush()
+
+def get_view_counter():
+    if 'flaskr_view_counter' not in current_app.extensions:
+        counter = ViewCounter(
+            [get_pool(database, writer=True) for database in get_shards()],
+            interval=current_app.config['VIEW_FLUSH_INTERVAL'],
+        )
+        current_app.extensions['flaskr_view_counter'] = counter
+
+    return current_app.extensions['flaskr_view_counter']
+
+# Registra uma visualização da postagem, sem acessar o Banco de Dados.
+def record_view(post_id):
+    if current_app.config['VIEW_COUNTS']:
+        get_view_counter().record(post_id)
+
+# Configurações padrão das visualizações, 'VIEW_COUNTS' ativa a contagem, 'VIEW_FLUSH_INTERVAL' é o intervalo
+# (segundos) entre as gravações, o limite das contagens perdidas em uma queda, e 'POPULAR_POSTS' é o tamanho
+# da listagem das postagens mais lidas.
+def init_app(app):
+    app.config.setdefault('VIEW_COUNTS', True)
+    app.config.setdefault('VIEW_FLUSH_INTERVAL', 5)
+    app.config.setdefault('POPULAR_POSTS', 10)
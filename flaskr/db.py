@@ -10,52 +10,568 @@ sobre o aplicativo em execução, incluindo a configuração | O objeto namespac
 Contexto do Aplicativo durante uma solicitação ou comando CLI
 4º [Linha 19] - Importando o decorador do Flask - Esse decorador, envolve um retorno de chamada para garantir que
 será chamado com um Contexto de Aplicativo
+5º - Importando os módulos os, threading e time - Utilizados pelo Pool de Conexões, para identificar o processo,
+a thread atual e a idade de cada conexão
+6º - Importando o módulo functools - Utilizado pelos decoradores que escolhem a conexão de leitura ou escrita
+7º - Importando os módulos hashlib e heapq - Distribuem os autores entre os arquivos de Banco de Dados
+('DATABASE_SHARDS'), e combinam as linhas ordenadas de cada arquivo
+8º - Importando o módulo pathlib - Converte o caminho do arquivo para a URI das conexões somente leitura
+9º - Importando os módulos atexit e weakref - Ao final do processo, os Pools dos aplicativos ainda existentes
+são fechados pela função 'close_pool', os aplicativos são lembrados por referências fracas, sem mantê-los na memória
 '''
 
+import atexit
+import functools
+import hashlib
+import heapq
+import os
+import pathlib
 import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import TimeoutError
 
 import click
-from flask import current_app, g
+from flask import current_app, g, has_request_context, request
 from flask.cli import with_appcontext
 
+# PRAGMAs aplicados em cada conexão assim que ela é criada pelo Pool, podem ser substituídos pela configuração
+# 'SQLITE_PRAGMAS'. O 'busy_timeout' vem primeiro, para que a troca do 'journal_mode' aguarde outros escritores.
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -16000,
+}
+
+# A classe 'PooledConnection', é o objeto entregue pela função 'get_db', ela repassa todos os atributos
+# para a conexão do sqlite3 (execute, commit, IntegrityError...), mas ao ser fechada,
+# a conexão volta para o Pool, e esse objeto deixa de funcionar, como uma conexão fechada normalmente.
+# Quando o Pool tem um observador ('flaskr.metrics'), as execuções de SQL são cronometradas e repassadas a ele.
+class PooledConnection(object):
+    def __init__(self, pool, conn, created):
+        self._pool = pool
+        self._conn = conn
+        self._created = created
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, name)
+
+    def _observed(self, method, sql, *args):
+        func = self.__getattr__(method)
+        observer = self._pool.observer
+
+        if observer is None:
+            return func(sql, *args)
+
+        start = time.perf_counter()
+        try:
+            return func(sql, *args)
+        finally:
+            observer(sql, time.perf_counter() - start)
+
+    def execute(self, sql, *args):
+        return self._observed('execute', sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._observed('executemany', sql, *args)
+
+    def executescript(self, sql):
+        return self._observed('executescript', sql)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, self._created)
+
+# O Pool de Conexões, guarda no máximo uma conexão ociosa por thread, e no máximo 'size' conexões abertas
+# no total, somando as ociosas e as que estão em uso. Assim, cada solicitação reaproveita uma conexão com o arquivo
+# já aberto, o esquema já carregado, e o cache de páginas do SQLite aquecido, em vez de abrir uma nova conexão.
+# Com o Pool cheio, uma thread sem conexão ociosa usa a conexão ociosa de outra thread, e sem nenhuma ociosa,
+# aguarda a devolução de uma conexão por até [timeout] segundos, como o escritor único.
+class ConnectionPool(object):
+    def __init__(self, database, size=8, pragmas=None, recycle=None, uri=False,
+                 observer=None, timeout=5):
+        self.database = database
+        self.size = size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self.recycle = recycle
+        self.uri = uri
+        self.observer = observer
+        self.timeout = timeout
+        self._idle = {}
+        self._in_use = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._pid = os.getpid()
+        self.closed = False
+
+    # Cria uma nova conexão e aplica os PRAGMAs configurados.
+    # O 'check_same_thread=False' permite que o Pool feche conexões de threads que já terminaram,
+    # o próprio Pool garante que cada conexão seja usada por uma thread de cada vez.
+    def connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            uri=self.uri,
+        )
+        conn.row_factory = sqlite3.Row
+
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+
+        return conn
+
+    # Verificação de saúde antes de reutilizar uma conexão, conexões antigas demais (POOL_RECYCLE)
+    # ou que falham em uma consulta simples são descartadas.
+    def _is_healthy(self, conn, created):
+        if self.recycle is not None and time.monotonic() - created > self.recycle:
+            return False
+        try:
+            conn.execute('SELECT 1')
+        except sqlite3.Error:
+            return False
+        return True
+
+    # Depois de um fork (por exemplo, servidores com vários processos), as conexões herdadas pertencem
+    # ao processo pai, então são esquecidas sem serem fechadas.
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._in_use = 0
+            self._lock = threading.Lock()
+            self._available = threading.Condition(self._lock)
+            self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_pid()
+        ident = threading.get_ident()
+
+        with self._available:
+            entry = self._idle.pop(ident, None)
+
+            if entry is None:
+                if not self._available.wait_for(
+                    lambda: self._idle or self._in_use + len(self._idle) < self.size, self.timeout
+                ):
+                    raise sqlite3.OperationalError('connection pool exhausted')
+
+                if self._in_use + len(self._idle) >= self.size:
+                    entry = self._idle.popitem()[1]
+
+            self._in_use += 1
+
+        try:
+            if entry is not None:
+                conn, created = entry
+                if self._is_healthy(conn, created):
+                    return PooledConnection(self, conn, created)
+                conn.close()
+
+            return PooledConnection(self, self.connect(), time.monotonic())
+        except BaseException:
+            with self._available:
+                self._in_use -= 1
+                self._available.notify()
+            raise
+
+    def release(self, conn, created):
+        # Uma transação esquecida aberta não pode passar para a próxima solicitação.
+        if conn.in_transaction:
+            conn.rollback()
+
+        ident = threading.get_ident()
+        with self._available:
+            self._in_use -= 1
+            if self.closed or ident in self._idle:
+                conn.close()
+            else:
+                self._idle[ident] = (conn, created)
+            self._available.notify()
+
+    # Fecha as conexões ociosas, as conexões ainda em uso serão fechadas quando forem devolvidas.
+    def close_all(self):
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, {}
+        for conn, created in idle.values():
+            conn.close()
+
+# O SQLite permite apenas um escritor por vez, então todas as escritas do processo passam por uma única conexão.
+# A classe 'WriterPool', entrega essa conexão para um Contexto de Aplicativo de cada vez, os demais aguardam
+# na fila do 'threading.Condition', em vez de disputarem o arquivo e receberem SQLITE_BUSY.
+# A mesma thread pode obter a conexão novamente (Contextos aninhados), sem ficar bloqueada por ela mesma.
+class WriterPool(ConnectionPool):
+    def __init__(self, database, timeout=5, **kwargs):
+        super().__init__(database, size=1, **kwargs)
+        self.timeout = timeout
+        self._entry = None
+        self._owner = None
+        self._depth = 0
+        self._available = threading.Condition(self._lock)
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            super()._check_pid()
+            self._entry = None
+            self._owner = None
+            self._depth = 0
+            self._available = threading.Condition(self._lock)
+
+    def acquire(self):
+        self._check_pid()
+        ident = threading.get_ident()
+
+        with self._available:
+            if self._owner != ident:
+                if not self._available.wait_for(
+                    lambda: self._owner is None, self.timeout
+                ):
+                    raise sqlite3.OperationalError('database is locked')
+                self._owner = ident
+            self._depth += 1
+
+            if self._entry is None or not self._is_healthy(*self._entry):
+                if self._entry is not None:
+                    self._entry[0].close()
+                self._entry = (self.connect(), time.monotonic())
+
+        return PooledConnection(self, *self._entry)
+
+    def release(self, conn, created):
+        with self._available:
+            self._depth -= 1
+            if self._depth:
+                return
+
+            # Uma transação esquecida aberta não pode passar para o próximo escritor.
+            if conn.in_transaction:
+                conn.rollback()
+            if self.closed:
+                conn.close()
+                self._entry = None
+
+            self._owner = None
+            self._available.notify()
+
+    def close_all(self):
+        with self._available:
+            self.closed = True
+            if self._owner is None and self._entry is not None:
+                self._entry[0].close()
+                self._entry = None
+
+# Opções comuns dos Pools de Conexões ('SQLITE_PRAGMAS', 'POOL_RECYCLE' e o observador de consultas
+# registrado pelo 'flaskr.metrics'). Com [readonly=True] o arquivo é
+# aberto em modo somente leitura (URI 'file:...?mode=ro', com o caminho absoluto e os caracteres especiais,
+# como '?', '#' e '%', codificados), e o 'journal_mode' não é aplicado, pois
+# uma conexão somente leitura não pode alterá-lo. Retorna o nome a ser conectado e as opções.
+def pool_options(database, readonly=False):
+    pragmas = current_app.config['SQLITE_PRAGMAS']
+    options = dict(
+        recycle=current_app.config['POOL_RECYCLE'],
+        observer=current_app.extensions.get('flaskr_query_observer'),
+    )
+
+    if readonly:
+        pragmas = {k: v for k, v in pragmas.items() if k != 'journal_mode'}
+        database = pathlib.Path(database).resolve().as_uri() + '?mode=ro'
+        options['uri'] = True
+
+    options['pragmas'] = pragmas
+    return database, options
+
+# Retorna o Pool de Conexões do aplicativo atual para o arquivo de Banco de Dados informado,
+# criado na primeira utilização com as configurações 'POOL_SIZE', 'POOL_TIMEOUT', 'POOL_RECYCLE'
+# e 'SQLITE_PRAGMAS'.
+# Com [writer=True] retorna o escritor único desse arquivo, e com [readonly=True] um Pool de conexões
+# abertas em modo somente leitura.
+def get_pool(database=None, writer=False, readonly=False):
+    if database is None:
+        database = current_app.config['DATABASE']
+
+    pools = current_app.extensions.setdefault('flaskr_db', {})
+    key = (database, writer, readonly)
+
+    if key not in pools:
+        name, options = pool_options(database, readonly)
+
+        if writer:
+            pools[key] = WriterPool(
+                name, timeout=current_app.config['WRITER_TIMEOUT'], **options
+            )
+        else:
+            pools[key] = ConnectionPool(
+                name, size=current_app.config['POOL_SIZE'],
+                timeout=current_app.config['POOL_TIMEOUT'], **options
+            )
+
+    return pools[key]
+
+# Fecha todas as conexões ociosas dos Pools do aplicativo atual, por exemplo, antes de remover o arquivo
+# do Banco de Dados nos testes. Antes, as postagens desatualizadas (flaskr.render) são enviadas ao worker,
+# e as escritas pendentes do escritor agrupado (flaskr.groupcommit) e as contagens de visualizações
+# (flaskr.counters) são gravadas.
+def close_pool():
+    renders = current_app.extensions.pop('flaskr_stale_renders', None)
+
+    if renders is not None:
+        renders.close()
+
+    for writer in current_app.extensions.pop('flaskr_group_commit', {}).values():
+        writer.close()
+
+    counter = current_app.extensions.pop('flaskr_view_counter', None)
+
+    if counter is not None:
+        counter.close()
+
+    for pool in current_app.extensions.pop('flaskr_db', {}).values():
+        pool.close_all()
+
+# Os aplicativos criados pelo processo, referências fracas, um aplicativo descartado sai do conjunto.
+_apps = weakref.WeakSet()
+
+# Ao final do processo, as threads dos aplicativos ainda existentes (flaskr.render, flaskr.groupcommit e
+# flaskr.counters) gravam as escritas pendentes e são encerradas, registrada uma única vez, na importação do módulo.
+def close_apps():
+    for app in list(_apps):
+        with app.app_context():
+            close_pool()
+
+atexit.register(close_apps)
+
+# Conexão de leitura, aberta em modo somente leitura ('mode=ro'), a partir do 'DATABASE_REPLICA' quando
+# configurado, ou do próprio 'DATABASE'. No modo WAL os leitores não bloqueiam o escritor, nem são bloqueados por ele.
+# Observação: uma réplica é atualizada por um processo externo, então pode estar atrasada em relação às escritas.
+def get_read_db():
+    if 'read_db' not in g:
+        database = (
+            current_app.config['DATABASE_REPLICA']
+            or current_app.config['DATABASE']
+        )
+        g.read_db = get_pool(database, readonly=True).acquire()
+
+    return g.read_db
+
+# Conexão de escrita, o escritor único do 'DATABASE', mantida até o fim do Contexto de Aplicativo.
+def get_write_db():
+    if 'write_db' not in g:
+        g.write_db = get_pool(writer=True).acquire()
+
+    return g.write_db
+
+# Os decoradores 'use_reader' e 'use_writer', marcam uma visualização para que a função 'get_db' use
+# a conexão de leitura ou de escrita, independente do método HTTP da solicitação.
+def use_reader(view):
+    view.db_mode = 'read'
+    return view
+
+def use_writer(view):
+    view.db_mode = 'write'
+    return view
+
+# Decide qual conexão a solicitação atual deve usar, primeiro pela marcação da visualização,
+# depois pelo método HTTP, os métodos GET, HEAD e OPTIONS não alteram dados e usam a conexão de leitura.
+# Fora de uma solicitação (comandos CLI, 'init_db', testes), a conexão de escrita é usada.
+def wants_writer():
+    if not has_request_context():
+        return True
+
+    view = current_app.view_functions.get(request.endpoint)
+    mode = getattr(view, 'db_mode', None)
+
+    if mode is not None:
+        return mode == 'write'
+
+    return request.method not in ('GET', 'HEAD', 'OPTIONS')
+
 # Estabelecendo a conexão com Banco de Dados, e, armazenando no objeto 'g'.
 def get_db():
-    # Se o atributo 'db' não for encontrado no objeto 'g',
-    # será declarado um armazenamento de dados da conexão deste objeto 'g' com atributo db,
-    # sendo reutilizada nas próximas solicitações.
-    # Com a função '.connect()' do módulo sqlite3, podemos estabelecer a conexão com o arquivo de Banco de Dados SQLite,
-    # no momento, não se encontra disponível, até que seja inicializado o Banco de Dados.
+    # Se o atributo 'db' não for encontrado no objeto 'g', uma conexão é retirada do Pool de Conexões,
+    # de leitura ou de escrita conforme a função 'wants_writer', e armazenada no objeto 'g' com atributo db,
+    # sendo reutilizada durante o restante do Contexto de Aplicativo.
     # O 'current_app', direciona tratando da solicitação atual dada a configuração da aplicação,
     # que foi estabelecida na função 'create_app', quando a função 'get_db' for chamada,
     # o aplicativo estará processando uma solicitação, sendo assim, a função 'current_app' passa a ser usada.
+    # As linhas retornadas se comportam como Dicionário [dict] (sqlite3.Row), permitindo acessar as colunas por nome.
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        # A classe .Row do módulo sqlite3, retorna linhas em comportamento de Estrutura de Dados - Dicionário [dict],
-        # permitindo acessar as colunas por nome.
-        g.db.row_factory = sqlite3.Row
+        g.db = get_write_db() if wants_writer() else get_read_db()
 
     return g.db
 
-# Primeiramente a função 'close_db', irá verificar a conexão e se o atributo db foi estabelecido no objeto 'g'
+# Os arquivos de Banco de Dados das postagens (shards), o 'DATABASE' é o shard 0, e também guarda os usuários,
+# as sessões e as demais tabelas, os arquivos de 'DATABASE_SHARDS' são os shards 1, 2... Cada shard tem uma
+# única conexão de escrita, então N arquivos permitem N escritores ao mesmo tempo. A posição de cada arquivo
+# na lista é a sua identificação, novos arquivos são sempre adicionados ao final (flask shards add).
+def get_shards():
+    return [current_app.config['DATABASE'], *current_app.config['DATABASE_SHARDS']]
+
+# Cada shard reserva um bloco de ids para as suas postagens (shard << SHARD_ID_BITS), assim os ids continuam
+# únicos entre todos os arquivos, e o id indica o shard onde a postagem foi criada.
+SHARD_ID_BITS = 40
+
+def shard_weight(shard, author_id):
+    digest = hashlib.blake2b(f'{shard}:{author_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+# O shard das postagens de um autor, pelo hashing de rendezvous (o shard com o maior peso para o autor),
+# ao adicionar um shard, somente os autores que passam a ter o maior peso no novo shard mudam de arquivo.
+def shard_for_author(author_id, count=None):
+    if count is None:
+        count = len(get_shards())
+
+    if count == 1:
+        return 0
+
+    return max(range(count), key=lambda shard: shard_weight(shard, author_id))
+
+# A ordem de busca de uma postagem pelo id, primeiro o shard onde ela foi criada, depois os demais,
+# onde ela pode estar depois de um rebalanceamento (flask shards rebalance).
+def shards_for_post(post_id):
+    count = len(get_shards())
+    origin = post_id >> SHARD_ID_BITS
+
+    if not 0 <= origin < count:
+        origin = 0
+
+    return [origin] + [shard for shard in range(count) if shard != origin]
+
+# A conexão de um shard, o shard 0 usa as mesmas conexões da função 'get_db' (e o escritor da 'get_write_db'),
+# os demais shards têm as suas conexões de leitura (somente leitura) e de escrita guardadas no objeto 'g'.
+def get_shard_db(shard, write=False):
+    if shard == 0:
+        return get_write_db() if write else get_db()
+
+    if 'shard_dbs' not in g:
+        g.shard_dbs = {}
+
+    key = (shard, write)
+
+    if key not in g.shard_dbs:
+        database = get_shards()[shard]
+        g.shard_dbs[key] = get_pool(database, writer=write, readonly=not write).acquire()
+
+    return g.shard_dbs[key]
+
+# Executa a mesma consulta em cada shard, e combina as linhas já ordenadas de cada um (heapq.merge), pela
+# chave [key] da mesma ordem do ORDER BY da consulta. Com um único shard, o cursor é retornado diretamente.
+def query_shards(sql, parameters=(), key=None, reverse=False):
+    count = len(get_shards())
+
+    if count == 1:
+        return get_db().execute(sql, parameters)
+
+    cursors = [get_shard_db(shard).execute(sql, parameters) for shard in range(count)]
+    return heapq.merge(*cursors, key=key, reverse=reverse)
+
+# Indica se o Contexto de Aplicativo atual já está com o escritor único do shard.
+def holds_writer(shard=0):
+    if shard == 0:
+        return 'write_db' in g
+
+    return (shard, True) in g.get('shard_dbs', {})
+
+# Executa uma escrita no [shard] e faz o COMMIT, retornando o par (lastrowid, rowcount).
+# Com 'GROUP_COMMIT' ativo, a escrita é enviada ao escritor agrupado (flaskr.groupcommit, importado somente
+# nesse caso), e a solicitação aguarda o COMMIT do lote. Quando a solicitação já está com o escritor único
+# do shard, o escritor agrupado ficaria esperando por ela, então a escrita é executada diretamente.
+def write(sql, parameters=(), shard=0):
+    if current_app.config['GROUP_COMMIT'] and not holds_writer(shard):
+        from flaskr.groupcommit import get_group_writer
+
+        return _wait(get_group_writer(shard).submit(sql, parameters))
+
+    db = get_shard_db(shard, write=True)
+    cursor = db.execute(sql, parameters)
+    db.commit()
+    return cursor.lastrowid, cursor.rowcount
+
+# Executa várias escritas [statements], pares (sql, parameters), no [shard] em uma única transação,
+# retornando a lista dos pares (lastrowid, rowcount). Se uma escrita falhar, todas são desfeitas.
+def write_many(statements, shard=0):
+    if current_app.config['GROUP_COMMIT'] and not holds_writer(shard):
+        from flaskr.groupcommit import get_group_writer
+
+        return _wait(get_group_writer(shard).submit_many(statements))
+
+    # O SAVEPOINT desfaz somente estas escritas, e não as anteriores da solicitação que já está com o escritor.
+    db = get_shard_db(shard, write=True)
+    db.execute('SAVEPOINT write_many')
+
+    try:
+        results = []
+
+        for sql, parameters in statements:
+            cursor = db.execute(sql, parameters)
+            results.append((cursor.lastrowid, cursor.rowcount))
+    except sqlite3.Error:
+        db.execute('ROLLBACK TO write_many')
+        raise
+    finally:
+        db.execute('RELEASE write_many')
+
+    db.commit()
+    return results
+
+# Aguarda o COMMIT do escritor agrupado, no máximo o tempo de espera pelo escritor único ('WRITER_TIMEOUT').
+def _wait(future):
+    try:
+        return future.result(timeout=current_app.config['WRITER_TIMEOUT'] + 1)
+    except TimeoutError:
+        raise sqlite3.OperationalError('database is locked')
+
+# Primeiramente a função 'close_db', irá verificar as conexões estabelecidas no objeto 'g'
 def close_db(e=None):
-    # Logo, se a conexão estiver estabelecida, poderá ser desconectada, também podemos usar a função 'close_db',
-    # na nossa Fábrica de Aplicativos, após cada solicitação ao Banco de dados.
-    db = g.pop('db', None)
+    # Logo, se as conexões estiverem estabelecidas, elas são devolvidas para o Pool de Conexões,
+    # a função 'close_db' é chamada na nossa Fábrica de Aplicativos, após cada solicitação ao Banco de dados.
+    g.pop('db', None)
+
+    for name in ('read_db', 'write_db'):
+        db = g.pop(name, None)
+
+        if db is not None:
+            db.close()
 
-    if db is not None:
+    for db in g.pop('shard_dbs', {}).values():
         db.close()
 
-# Inicializando o Banco de Dados
+# Inicializando o Banco de Dados, e os demais shards ('DATABASE_SHARDS').
 def init_db():
-    # Chamando a função 'get_db', sendo aplicada na variável db
-    db = get_db()
+    for shard in range(len(get_shards())):
+        init_shard(shard)
+
+# Cria o esquema de um shard, o índice de busca e aplica as migrações, e nos shards 1, 2..., reserva o bloco de ids.
+def init_shard(shard):
+    db = get_shard_db(shard, write=True)
     # Com a função '.open_resource()', podemos abrir um arquivo relativo ao Pacote flaskr
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf-8'))
 
+    init_search(db)
+
+    # Aplicando todas as migrações, um Banco de Dados novo já começa na última versão do esquema.
+    from flaskr.migrate import upgrade
+    upgrade(db=db)
+
+    if shard:
+        db.execute(
+            "INSERT INTO sqlite_sequence (name, seq) VALUES ('post', ?)",
+            (shard << SHARD_ID_BITS,)
+        )
+        db.commit()
+
+# (Re)criando o índice de busca textual das postagens, a partir das postagens já existentes.
+def init_search(db=None):
+    db = get_db() if db is None else db
+    with current_app.open_resource('search.sql') as f:
+        db.executescript(f.read().decode('utf-8'))
+
 # Utilizando a função 'command' estamos adicionando uma linha de comando chamado 'init-db', que chama a função 'init_db'
 # Depois, temos o decorador que está envolvendo chamada a função 'init_db' garantindo dentro do Contexto de Aplicativo
 @click.command('init-db')
@@ -64,11 +580,39 @@ def init_db_command():
     init_db()
     click.echo('Initialized the database.')
 
+# O comando 'rebuild-search-index', cria ou reconstrói o índice de busca de cada shard, sem apagar as postagens,
+# útil para um Banco de Dados criado antes da busca existir.
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    for shard in range(len(get_shards())):
+        init_search(get_shard_db(shard, write=True))
+    click.echo('Rebuilt the search index.')
+
 # Registrando as seguinte funções 'close_db' e 'init_db_command' para o Aplicativo,
 # o certo seria realizar a instância do aplicativo, como está indisponível, vamos escrever uma função,
 # e definir no parâmetro [app] nossa variável.
 def init_app(app):
+    # Configurações padrão do Pool de Conexões, podem ser substituídas pelo 'config.py' ou pelo [test_config].
+    # 'POOL_SIZE' é o número máximo de conexões de leitura abertas por arquivo, e 'POOL_TIMEOUT' o tempo máximo
+    # (segundos) de espera por uma conexão com todas em uso.
+    app.config.setdefault('POOL_SIZE', 8)
+    app.config.setdefault('POOL_TIMEOUT', 5)
+    app.config.setdefault('POOL_RECYCLE', 3600)
+    app.config.setdefault('SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    # Réplica opcional para as leituras, e o tempo máximo (segundos) de espera pelo escritor único.
+    app.config.setdefault('DATABASE_REPLICA', None)
+    # Os arquivos adicionais das postagens, distribuídas pelo autor (vazio, todas no 'DATABASE').
+    app.config.setdefault('DATABASE_SHARDS', [])
+    app.config.setdefault('WRITER_TIMEOUT', 5)
+    # O escritor agrupado (flaskr.groupcommit), desativado por padrão. 'GROUP_COMMIT_WINDOW' é o tempo máximo
+    # (segundos) que a primeira escrita de um lote espera por outras, e 'GROUP_COMMIT_MAX_OPS' o tamanho do lote.
+    app.config.setdefault('GROUP_COMMIT', False)
+    app.config.setdefault('GROUP_COMMIT_WINDOW', 0.005)
+    app.config.setdefault('GROUP_COMMIT_MAX_OPS', 100)
     # Registrando a função assim que o Contexto de Aplicativo estiver sendo solicitado.
     app.teardown_appcontext(close_db)
+    _apps.add(app)
     # Adicionando um novo comando juntamente com o comando flask.
     app.cli.add_command(init_db_command)
+    app.cli.add_command(rebuild_search_index_command)
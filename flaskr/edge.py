@@ -0,0 +1,138 @@
+# 24 - Cabeçalhos de Cache HTTP para os proxies reversos e CDNs, e a remoção das páginas pelas chaves (surrogate keys)
+'''
+1º - Importando os módulos threading e urllib.request - O destino de teste guarda as remoções recebidas
+(protegido por um Lock), e o destino HTTP envia as remoções para o proxy ou a CDN
+2º - As páginas anônimas do Cache de páginas (flaskr.cache) podem ser guardadas por um proxy ou CDN ('public' e
+'s-maxage'), com as mesmas etiquetas da página no cabeçalho 'Surrogate-Key' (posts:head, user:2), as demais
+respostas, as páginas que contam visualizações (blog.detail), e todas as respostas de um usuário conectado,
+são privadas ('private, no-cache')
+3º - Cada invalidação do Cache de páginas (blog.create, blog.update, blog.delete, a API...) também remove do proxy as
+páginas com as mesmas chaves, enviada pela fila de tarefas (flaskr.jobs), fora da solicitação e com novas tentativas
+'''
+
+import threading
+import urllib.request
+
+from flask import current_app, g, request, session
+
+from flaskr.jobs import enqueue, task
+
+# A classe 'PurgeTarget', define a interface do destino das remoções, como a 'CacheBackend' do flaskr.cache,
+# outro destino (a API de uma CDN) pode ser usado implementando o método 'purge' e definindo uma instância
+# na configuração 'EDGE_PURGE_TARGET'.
+class PurgeTarget(object):
+    def purge(self, keys):
+        raise NotImplementedError
+
+# A classe 'RecordingPurgeTarget', o destino local usado nos testes, apenas guarda as chaves de cada remoção.
+class RecordingPurgeTarget(PurgeTarget):
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def purge(self, keys):
+        with self._lock:
+            self.events.append(tuple(keys))
+
+    # As chaves removidas desde a última chamada.
+    def drain(self):
+        with self._lock:
+            events, self.events = self.events, []
+
+        return events
+
+# A classe 'HTTPPurgeTarget', envia um POST para [url] com as chaves no cabeçalho [header], separadas por espaços,
+# o formato aceito pelo Varnish (xkey) e pela API de remoção por chaves do Fastly. Uma resposta de erro levanta
+# uma exceção, e a tarefa é executada novamente.
+class HTTPPurgeTarget(PurgeTarget):
+    def __init__(self, url, header='Surrogate-Key', headers=None, timeout=5):
+        self.url = url
+        self.header = header
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    def purge(self, keys):
+        purge_request = urllib.request.Request(
+            self.url, method='POST', headers={**self.headers, self.header: ' '.join(keys)}
+        )
+
+        with urllib.request.urlopen(purge_request, timeout=self.timeout):
+            pass
+
+# A tarefa que entrega a remoção ao destino configurado, executada pelo 'flask worker'.
+@task('flaskr.edge.purge')
+def purge_task(keys):
+    target = current_app.config['EDGE_PURGE_TARGET']
+
+    if target is not None:
+        target.purge(keys)
+
+# O evento de remoção, chamado pelo flaskr.cache a cada invalidação das páginas. Com 'EDGE_PURGE_QUEUE' a remoção
+# é enfileirada (o proxy pode estar lento ou fora do ar), sem ele, o destino é chamado durante a solicitação.
+def purge_keys(keys):
+    if current_app.config['EDGE_PURGE_TARGET'] is None:
+        return
+
+    keys = sorted(set(keys))
+
+    if current_app.config['EDGE_PURGE_QUEUE']:
+        enqueue(purge_task, keys=keys)
+    else:
+        current_app.config['EDGE_PURGE_TARGET'].purge(keys)
+
+# Marca uma visualização que deve passar pelo servidor a cada solicitação, mesmo com as páginas no Cache de
+# páginas, como o 'blog.detail', que conta as visualizações (flaskr.counters). Guardada no proxy, a página seria
+# entregue sem chamar a visualização, e a contagem deixaria de aumentar.
+def edge_private(view):
+    view.edge_private = True
+    return view
+
+# A política de Cache de cada resposta, as respostas que já definem o 'Cache-Control' (os arquivos estáticos)
+# não são alteradas. Uma página é pública somente quando passou pelo Cache de páginas (as etiquetas da página
+# estão em 'g.page_tags'), foi pedida por um visitante anônimo sem mensagens flash, não define Cookies,
+# e a visualização não foi marcada com 'edge_private'.
+# O 'Vary: Cookie' separa as páginas anônimas das páginas dos usuários conectados nos proxies que o respeitam.
+def apply_cache_policy(response):
+    config = current_app.config
+
+    if not config['EDGE_CACHE'] or 'Cache-Control' in response.headers:
+        return response
+
+    tags = g.get('page_tags')
+    view = current_app.view_functions.get(request.endpoint)
+
+    if tags is not None:
+        response.vary.add('Cookie')
+
+    if (
+        tags is not None
+        and response.status_code in (200, 304)
+        and session.get('user_id') is None
+        and '_flashes' not in session
+        and 'Set-Cookie' not in response.headers
+        and not getattr(view, 'edge_private', False)
+    ):
+        response.cache_control.public = True
+        response.cache_control.max_age = config['EDGE_MAX_AGE']
+        response.cache_control.s_maxage = config['EDGE_S_MAXAGE']
+
+        if tags:
+            response.headers[config['EDGE_SURROGATE_HEADER']] = ' '.join(tags)
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+    return response
+
+# Configurações padrão, 'EDGE_CACHE' ativa os cabeçalhos, 'EDGE_MAX_AGE' é o tempo (segundos) das páginas anônimas
+# nos navegadores e 'EDGE_S_MAXAGE' nos proxies, que guardam a página até a remoção pelas chaves.
+# 'EDGE_PURGE_TARGET' é o destino das remoções (None não envia), 'EDGE_PURGE_QUEUE' envia pela fila de tarefas.
+def init_app(app):
+    app.config.setdefault('EDGE_CACHE', True)
+    app.config.setdefault('EDGE_MAX_AGE', 0)
+    app.config.setdefault('EDGE_S_MAXAGE', 3600)
+    app.config.setdefault('EDGE_SURROGATE_HEADER', 'Surrogate-Key')
+    app.config.setdefault('EDGE_PURGE_TARGET', None)
+    app.config.setdefault('EDGE_PURGE_QUEUE', True)
+    app.extensions['flaskr_purge_listener'] = purge_keys
+    app.after_request(apply_cache_policy)
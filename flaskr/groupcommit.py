@@ -0,0 +1,166 @@
+# 17 - Agrupando as escritas de várias solicitações em uma única transação (group commit)
+'''
+1º - Importando os módulos queue, sqlite3, threading e time - A fila recebe as escritas das solicitações, uma thread
+as grava em lotes, e as escritas pendentes são gravadas antes de o processo terminar (flaskr.db.close_apps)
+2º - Importando a classe Future do módulo concurrent.futures - Cada solicitação aguarda o resultado da sua escrita
+3º - Cada COMMIT do SQLite espera o disco (fsync), e os escritores são atendidos um de cada vez. Agrupando as escritas
+que chegam ao mesmo tempo, um único COMMIT grava todas, e cada solicitação só continua depois que a sua escrita foi
+gravada, assim o redirecionamento para o blog.index já exibe a postagem (read-your-writes)
+4º - Este módulo é importado pela função 'write' (flaskr.db) somente quando o 'GROUP_COMMIT' está ativo
+'''
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from flask import current_app
+
+from flaskr.db import get_pool, get_shards
+
+# A classe 'GroupCommitWriter', grava as escritas da fila em lotes, cada lote é uma transação com até [max_ops]
+# escritas, reunidas durante no máximo [window] segundos a partir da primeira escrita do lote.
+# Cada escrita (ou grupo de escritas do 'submit_many') é executada em um SAVEPOINT, uma escrita com erro
+# (por exemplo, IntegrityError) é desfeita sozinha, e o erro é entregue apenas para a solicitação que a enviou,
+# as demais escritas do lote são gravadas.
+class GroupCommitWriter(object):
+    def __init__(self, pool, window=0.005, max_ops=100):
+        self.pool = pool
+        self.window = window
+        self.max_ops = max_ops
+        self.closed = False
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # Envia uma escrita, e retorna um Future com o par (lastrowid, rowcount) depois do COMMIT.
+    def submit(self, sql, parameters=()):
+        return self._submit([(sql, parameters)], many=False)
+
+    # Envia várias escritas [statements], pares (sql, parameters), gravadas juntas ou desfeitas juntas,
+    # e retorna um Future com a lista dos pares (lastrowid, rowcount).
+    def submit_many(self, statements):
+        return self._submit(list(statements), many=True)
+
+    def _submit(self, statements, many):
+        future = Future()
+
+        with self._lock:
+            if self.closed:
+                raise RuntimeError('Group commit writer is closed.')
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='flaskr-group-commit', daemon=True
+                )
+                self._thread.start()
+
+            self._queue.put((statements, many, future))
+
+        return future
+
+    def _run(self):
+        running = True
+
+        while running:
+            item = self._queue.get()
+
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_ops:
+                remaining = deadline - time.monotonic()
+
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    running = False
+                    break
+
+                batch.append(item)
+
+            self._commit(batch)
+
+    def _commit(self, batch):
+        results = []
+
+        try:
+            db = self.pool.acquire()
+        except sqlite3.Error as e:
+            for statements, many, future in batch:
+                future.set_exception(e)
+            return
+
+        try:
+            db.execute('BEGIN IMMEDIATE')
+
+            for statements, many, future in batch:
+                db.execute('SAVEPOINT group_commit_op')
+
+                try:
+                    rows = []
+
+                    for sql, parameters in statements:
+                        cursor = db.execute(sql, parameters)
+                        rows.append((cursor.lastrowid, cursor.rowcount))
+                except sqlite3.Error as e:
+                    db.execute('ROLLBACK TO group_commit_op')
+                    results.append((future, None, e))
+                else:
+                    results.append((future, rows if many else rows[0], None))
+
+                db.execute('RELEASE group_commit_op')
+
+            db.commit()
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.rollback()
+
+            for statements, many, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    # Grava as escritas que ainda estão na fila e encerra a thread, chamada ao fechar o Pool e ao final do processo.
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+
+            self.closed = True
+            thread = self._thread
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+# Um escritor agrupado para cada shard (flaskr.db), cada arquivo tem o seu próprio escritor único.
+def get_group_writer(shard=0):
+    writers = current_app.extensions.setdefault('flaskr_group_commit', {})
+
+    if shard not in writers:
+        writer = GroupCommitWriter(
+            get_pool(get_shards()[shard], writer=True),
+            window=current_app.config['GROUP_COMMIT_WINDOW'],
+            max_ops=current_app.config['GROUP_COMMIT_MAX_OPS'],
+        )
+        writers[shard] = writer
+
+    return writers[shard]
@@ -0,0 +1,327 @@
+# 22 - Fila de tarefas em segundo plano, executadas fora das solicitações pelo comando 'flask worker'
+'''
+1º - Importando os módulos json, logging, os, sqlite3, threading e time - As tarefas são guardadas na tabela 'job'
+do Banco de Dados, com os argumentos em JSON, e executadas por várias threads do worker
+2º - Uma visualização chama a função 'enqueue' e responde em seguida, o trabalho demorado (notificações, índices,
+aquecimento de Caches...) é feito pelo worker, que pode rodar em um ou mais processos, cada tarefa é retirada da
+fila por um único worker, dentro de uma transação de escrita (BEGIN IMMEDIATE)
+3º - Uma tarefa com erro é executada novamente depois de uma espera que dobra a cada tentativa (backoff), até
+'JOB_MAX_ATTEMPTS' tentativas, e uma tarefa interrompida (queda do worker) volta para a fila depois de 'JOB_TIMEOUT'
+
+Exemplo: flask worker --threads 4
+'''
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db, get_pool, write
+from flaskr.metrics import get_registry
+
+logger = logging.getLogger(__name__)
+
+# As tarefas registradas pelo decorador 'task', pelo nome.
+TASKS = {}
+
+# O decorador 'task', registra uma função como tarefa, executada pelo worker com os argumentos da 'enqueue',
+# dentro de um Contexto de Aplicativo. O nome padrão é 'módulo.função'.
+def task(name=None):
+    def decorator(func):
+        func.task_name = name or f'{func.__module__}.{func.__name__}'
+        TASKS[func.task_name] = func
+        return func
+
+    return decorator
+
+# Enfileira a tarefa [name] (ou uma função registrada) com os argumentos nomeados [kwargs] (valores JSON),
+# para ser executada depois de [delay] segundos. Com uma chave de idempotência [key], uma segunda chamada com a
+# mesma chave não cria outra tarefa enquanto a primeira existir ('JOB_RETENTION' depois de concluída).
+# Pode ser chamada de qualquer visualização, retorna o id da tarefa (o da tarefa já existente, com a mesma chave).
+def enqueue(name, key=None, delay=0, max_attempts=None, **kwargs):
+    name = getattr(name, 'task_name', name)
+    now = time.time()
+
+    if max_attempts is None:
+        max_attempts = current_app.config['JOB_MAX_ATTEMPTS']
+
+    while True:
+        id, rowcount = write(
+            'INSERT INTO job (task, args, key, max_attempts, created, run_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO NOTHING',
+            (name, json.dumps(kwargs), key, max_attempts, now, now + delay)
+        )
+
+        if rowcount:
+            return id
+
+        # O id da tarefa existente é lido do próprio 'DATABASE' (a réplica pode ainda não ter a tarefa).
+        # Quando ela foi removida entre o INSERT e a leitura ('JOB_RETENTION'), o INSERT é feito novamente.
+        db = get_pool(readonly=True).acquire()
+
+        try:
+            row = db.execute('SELECT id FROM job WHERE key = ?', (key,)).fetchone()
+        finally:
+            db.close()
+
+        if row is not None:
+            return row[0]
+
+# A espera antes da próxima tentativa, 'JOB_BACKOFF' segundos dobrando a cada tentativa, até 'JOB_MAX_BACKOFF'.
+def backoff(attempts, base, limit):
+    return min(base * 2 ** (attempts - 1), limit)
+
+# A classe 'Worker', executa as tarefas da fila em [threads] threads. Cada thread retira uma tarefa de cada vez,
+# e quando a fila está vazia, aguarda [poll_interval] segundos. Com [burst=True] as threads terminam quando
+# não há mais tarefas prontas, útil nos testes e em execuções agendadas (cron).
+class Worker(object):
+    def __init__(self, app, threads=1, poll_interval=1.0, burst=False, metrics_file=None):
+        self.app = app
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.metrics_file = metrics_file
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._run, name=f'flaskr-worker-{i}', daemon=True)
+            for i in range(self.threads)
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            # Termina as tarefas em execução antes de sair.
+            self.stop()
+
+            for thread in threads:
+                thread.join()
+
+        self.write_metrics()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                job = self.claim()
+
+                if job is not None:
+                    self.execute(job)
+                    self.write_metrics()
+                    continue
+
+                self.purge()
+
+            if self.burst:
+                break
+
+            self._stop.wait(self.poll_interval)
+
+    # Retira a próxima tarefa pronta da fila, marcando-a em execução até o fim do prazo ('JOB_TIMEOUT').
+    # Uma tarefa ainda 'running' com o prazo vencido pertencia a um worker interrompido, e é retirada novamente.
+    def claim(self):
+        db = get_pool(writer=True).acquire()
+        now = time.time()
+
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            job = db.execute(
+                "SELECT * FROM job WHERE status IN ('queued', 'running') AND run_at <= ?"
+                ' ORDER BY run_at LIMIT 1',
+                (now,)
+            ).fetchone()
+
+            if job is None:
+                return None
+
+            db.execute(
+                "UPDATE job SET status = 'running', attempts = attempts + 1, started = ?, run_at = ?"
+                ' WHERE id = ?',
+                (now, now + current_app.config['JOB_TIMEOUT'], job['id'])
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        job = dict(job)
+        job['attempts'] += 1
+        job['started'] = now
+        return job
+
+    # Executa a tarefa, e registra o resultado. O tempo de espera na fila é medido a partir do momento em que a
+    # tarefa ficou pronta (run_at), assim a espera entre as tentativas não é contada como atraso da fila.
+    def execute(self, job):
+        registry = get_registry()
+        func = TASKS.get(job['task'])
+        registry['flaskr_job_wait_seconds'].observe(job['started'] - job['run_at'], job['task'])
+        start = time.perf_counter()
+
+        try:
+            if func is None:
+                raise LookupError(f'Unknown task {job["task"]!r}.')
+
+            func(**json.loads(job['args']))
+        except Exception as e:
+            logger.exception('Job %d (%s) failed.', job['id'], job['task'])
+            status = self.fail(job, e)
+        else:
+            status = self.finish(job)
+
+        registry['flaskr_job_duration_seconds'].observe(time.perf_counter() - start, job['task'])
+        registry['flaskr_jobs_total'].inc(job['task'], status)
+        return status
+
+    # As atualizações conferem o número da tentativa, se o prazo venceu e outro worker já retirou a tarefa
+    # novamente, o resultado desta tentativa é ignorado.
+    def finish(self, job):
+        self._update(
+            "UPDATE job SET status = 'done', finished = ?, error = NULL WHERE id = ? AND attempts = ?",
+            (time.time(), job['id'], job['attempts'])
+        )
+        return 'done'
+
+    def fail(self, job, error):
+        config = current_app.config
+        now = time.time()
+        error = f'{type(error).__name__}: {error}'
+
+        if job['attempts'] >= job['max_attempts']:
+            self._update(
+                "UPDATE job SET status = 'failed', finished = ?, error = ? WHERE id = ? AND attempts = ?",
+                (now, error, job['id'], job['attempts'])
+            )
+            return 'failed'
+
+        delay = backoff(job['attempts'], config['JOB_BACKOFF'], config['JOB_MAX_BACKOFF'])
+        self._update(
+            "UPDATE job SET status = 'queued', run_at = ?, error = ? WHERE id = ? AND attempts = ?",
+            (now + delay, error, job['id'], job['attempts'])
+        )
+        return 'retry'
+
+    def _update(self, sql, parameters):
+        db = get_pool(writer=True).acquire()
+
+        try:
+            db.execute(sql, parameters)
+            db.commit()
+        finally:
+            db.close()
+
+    # Remove as tarefas concluídas há mais de 'JOB_RETENTION' segundos, executada quando a fila está vazia.
+    # As tarefas com falha permanecem, para serem examinadas.
+    def purge(self):
+        self._update(
+            "DELETE FROM job WHERE status = 'done' AND finished < ?",
+            (time.time() - current_app.config['JOB_RETENTION'],)
+        )
+
+    # Grava as métricas das tarefas no arquivo [metrics_file], no formato de texto do Prometheus (por exemplo,
+    # para o coletor de arquivos do node_exporter), pois o worker não atende a URL /metrics. O arquivo é
+    # substituído por inteiro (os.replace), assim o coletor nunca lê um arquivo pela metade.
+    def write_metrics(self):
+        if self.metrics_file is None:
+            return
+
+        with self.app.app_context():
+            registry = get_registry()
+            text = registry.expose()
+
+        with self._lock:
+            temp = f'{self.metrics_file}.{os.getpid()}.tmp'
+
+            with open(temp, 'w') as f:
+                f.write(text)
+
+            os.replace(temp, self.metrics_file)
+
+# O tamanho da fila por situação, e a idade da tarefa pronta mais antiga, lidos do Banco de Dados a cada
+# leitura da URL /metrics, assim qualquer processo do servidor informa a fila de todos os workers.
+def queue_depth():
+    try:
+        rows = get_db().execute(
+            "SELECT status, count(*) FROM job WHERE status IN ('queued', 'running') GROUP BY status"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # O Banco de Dados ainda não foi atualizado com a tabela 'job' (flask migrate upgrade).
+        return {}
+
+    depth = {('queued',): 0, ('running',): 0}
+    depth.update({(status,): count for status, count in rows})
+    return depth
+
+def queue_age():
+    try:
+        row = get_db().execute(
+            "SELECT min(run_at) FROM job WHERE status = 'queued' AND run_at <= ?", (time.time(),)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return {}
+
+    return {(): 0 if row[0] is None else time.time() - row[0]}
+
+# A linha de comando 'worker', executa as tarefas da fila até ser interrompida (Ctrl+C).
+@click.command('worker')
+@click.option('--threads', type=click.IntRange(1), default=None,
+              help='Worker threads (default: WORKER_THREADS).')
+@click.option('--burst', is_flag=True, help='Exit when the queue is empty.')
+@click.option('--metrics-file', type=click.Path(dir_okay=False), default=None,
+              help='Write job metrics to this file in Prometheus text format.')
+@with_appcontext
+def worker_command(threads, burst, metrics_file):
+    app = current_app._get_current_object()
+    threads = threads or app.config['WORKER_THREADS']
+    worker = Worker(
+        app, threads=threads, poll_interval=app.config['JOB_POLL_INTERVAL'],
+        burst=burst, metrics_file=metrics_file,
+    )
+
+    click.echo(f'Worker started with {threads} threads, tasks: {", ".join(sorted(TASKS)) or "none"}.')
+    worker.run()
+    click.echo('Worker stopped.')
+
+# Configurações padrão da fila, 'JOB_MAX_ATTEMPTS' tentativas por tarefa, com espera de 'JOB_BACKOFF' segundos
+# dobrando até 'JOB_MAX_BACKOFF', 'JOB_TIMEOUT' o prazo (segundos) de uma execução, 'JOB_RETENTION' por quanto
+# tempo as tarefas concluídas são mantidas, 'WORKER_THREADS' e 'JOB_POLL_INTERVAL' (segundos) do worker.
+def init_app(app):
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_BACKOFF', 2)
+    app.config.setdefault('JOB_MAX_BACKOFF', 3600)
+    app.config.setdefault('JOB_TIMEOUT', 300)
+    app.config.setdefault('JOB_RETENTION', 86400)
+    app.config.setdefault('WORKER_THREADS', 2)
+    app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+
+    registry = app.extensions['flaskr_metrics']
+    registry.gauge(
+        'flaskr_job_queue_depth', 'Jobs waiting or running.', ('status',), callback=queue_depth,
+    )
+    registry.gauge(
+        'flaskr_job_queue_age_seconds', 'Age of the oldest ready job.', callback=queue_age,
+    )
+    registry.counter(
+        'flaskr_jobs_total', 'Jobs executed by this worker.', ('task', 'status'),
+    )
+    registry.histogram(
+        'flaskr_job_wait_seconds', 'Time jobs spent ready in the queue.', ('task',),
+    )
+    registry.histogram(
+        'flaskr_job_duration_seconds', 'Time spent running jobs.', ('task',),
+    )
+
+    app.cli.add_command(worker_command)
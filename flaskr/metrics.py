@@ -0,0 +1,303 @@
+# 10 - Instrumentando as solicitações, consultas SQL e Templates, com métricas no formato Prometheus
+'''
+1º - Importando os módulos re, threading e time - Normalizam o texto das consultas, protegem os contadores
+compartilhados entre as threads, e medem as durações
+2º - Importando a função lru_cache do módulo functools - As consultas do aplicativo são textos fixos,
+então cada texto é normalizado uma única vez
+3º - Importando os sinais do Flask - 'before_render_template' e 'template_rendered' marcam o início e o fim
+da renderização de cada Template (disponíveis quando o pacote blinker está instalado), o Template enviado em partes
+pelo 'blog.index' também envia os dois sinais (blog.stream_template)
+4º - Importando a função compare_digest do módulo hmac - A URL /metrics expõe o texto das consultas SQL e os tempos
+do aplicativo, e só responde com o 'METRICS_TOKEN' no cabeçalho Authorization, comparado em tempo constante
+'''
+
+import re
+import threading
+import time
+from functools import lru_cache
+from hmac import compare_digest
+
+from flask import Response, current_app, g, has_request_context, request
+from werkzeug.exceptions import abort
+from flask.signals import before_render_template, signals_available, template_rendered
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Escapa os valores dos rótulos (labels) conforme o formato de texto do Prometheus.
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+
+    if not pairs:
+        return ''
+
+    return '{' + ','.join(f'{k}="{_label_value(v)}"' for k, v in pairs) + '}'
+
+# A classe 'Counter', um contador que só aumenta, separado pelos valores dos rótulos.
+class Counter(object):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+
+        for labelvalues, value in items:
+            yield f'{self.name}{_labels(self.labelnames, labelvalues)} {value}'
+
+# A classe 'Histogram', conta as observações em faixas (buckets) cumulativas, além da soma e do total,
+# permitindo calcular os percentis de latência no Prometheus.
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            entry = self._values.get(labelvalues)
+
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+
+            entry[1] += value
+            entry[2] += 1
+
+    def get(self, *labelvalues):
+        entry = self._values.get(labelvalues)
+        return 0 if entry is None else entry[2]
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()
+            )
+
+        for labelvalues, (counts, total, count) in items:
+            cumulative = 0
+
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = _labels(self.labelnames, labelvalues, [('le', repr(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+
+            labels = _labels(self.labelnames, labelvalues, [('le', '+Inf')])
+            yield f'{self.name}_bucket{labels} {count}'
+            labels = _labels(self.labelnames, labelvalues)
+            yield f'{self.name}_sum{labels} {total}'
+            yield f'{self.name}_count{labels} {count}'
+
+# A classe 'Gauge', um valor que aumenta e diminui (por exemplo, o tamanho de uma fila). Com [callback], os valores
+# são lidos no momento da exportação, a função retorna um dicionário {(valores dos rótulos): valor}.
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def samples(self):
+        if self.callback is not None:
+            values = self.callback()
+
+            with self._lock:
+                self._values = dict(values)
+
+        return super().samples()
+
+# O Registro guarda as métricas do aplicativo, e as exporta no formato de texto do Prometheus.
+class Registry(object):
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def __getitem__(self, name):
+        return self.metrics[name]
+
+    def expose(self):
+        lines = []
+
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+
+        return '\n'.join(lines) + '\n'
+
+# Normaliza o texto de uma consulta SQL, substituindo os valores literais por '?', e os espaços repetidos
+# por um único espaço, assim consultas iguais com valores diferentes são contadas juntas.
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_spaces = re.compile(r'\s+')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    return _spaces.sub(' ', _literals.sub('?', sql)).strip()
+
+def get_registry():
+    return current_app.extensions['flaskr_metrics']
+
+# Cria as métricas do aplicativo.
+def create_registry():
+    registry = Registry()
+    registry.counter(
+        'flaskr_requests_total', 'HTTP requests handled.',
+        ('endpoint', 'method', 'status'),
+    )
+    registry.histogram(
+        'flaskr_request_duration_seconds', 'Time spent handling requests.',
+        ('endpoint',),
+    )
+    registry.counter(
+        'flaskr_slow_requests_total', 'Requests slower than SLOW_REQUEST_THRESHOLD.',
+        ('endpoint',),
+    )
+    registry.histogram(
+        'flaskr_db_query_duration_seconds', 'Time spent executing SQL queries.',
+        ('query',),
+    )
+    registry.histogram(
+        'flaskr_template_render_seconds', 'Time spent rendering templates.',
+        ('template',),
+    )
+    return registry
+
+# O observador de consultas é chamado pelo Pool de Conexões (flaskr.db) depois de cada execução,
+# registra a duração da consulta normalizada, e acumula o total de consultas e o tempo da solicitação atual.
+# Observação: a duração cobre a execução até a primeira linha, a leitura das demais linhas não é incluída.
+def make_query_observer(registry):
+    histogram = registry['flaskr_db_query_duration_seconds']
+
+    def observe(sql, duration):
+        histogram.observe(duration, normalize_sql(sql))
+
+        if has_request_context():
+            stats = g.get('query_stats')
+            if stats is not None:
+                stats[0] += 1
+                stats[1] += duration
+
+    return observe
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.query_stats = [0, 0.0]
+
+def record_status(response):
+    g.response_status = response.status_code
+    return response
+
+# No fim da solicitação (depois que uma resposta em partes terminou de ser enviada), registra a duração,
+# e as solicitações acima de 'SLOW_REQUEST_THRESHOLD' segundos são registradas no log, com as consultas SQL.
+def finish_request(e=None):
+    started = g.pop('request_started', None)
+
+    if started is None:
+        return
+
+    duration = time.perf_counter() - started
+    registry = get_registry()
+    endpoint = request.endpoint or 'unknown'
+    status = g.pop('response_status', 500)
+    queries, db_time = g.pop('query_stats', (0, 0.0))
+
+    registry['flaskr_requests_total'].inc(endpoint, request.method, str(status))
+    registry['flaskr_request_duration_seconds'].observe(duration, endpoint)
+
+    threshold = current_app.config['SLOW_REQUEST_THRESHOLD']
+
+    if threshold is not None and duration > threshold:
+        registry['flaskr_slow_requests_total'].inc(endpoint)
+        current_app.logger.warning(
+            'Slow request %s %s: %.1fms total, %d queries in %.1fms',
+            request.method, request.full_path, duration * 1000, queries, db_time * 1000,
+        )
+
+# Tempo de renderização de cada Template, pelos sinais do Flask, uma pilha por solicitação,
+# pois um Template pode ser renderizado durante a renderização de outro.
+def template_started(app, template, context, **extra):
+    if has_request_context():
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+def template_finished(app, template, context, **extra):
+    starts = g.get('template_starts') if has_request_context() else None
+
+    if starts:
+        get_registry()['flaskr_template_render_seconds'].observe(
+            time.perf_counter() - starts.pop(), template.name or 'string'
+        )
+
+# A URL /metrics, desativada (404) sem o 'METRICS_TOKEN', e com ele, o coletor envia o cabeçalho
+# 'Authorization: Bearer <token>' (no Prometheus, a opção 'authorization' da configuração do scrape).
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+
+    if not token:
+        abort(404)
+
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+
+    if scheme.lower() != 'bearer' or not compare_digest(credentials.encode(), token.encode()):
+        response = Response('Unauthorized\n', 401, mimetype='text/plain')
+        response.headers['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+
+    return Response(
+        get_registry().expose(), mimetype='text/plain; version=0.0.4'
+    )
+
+# Registrando a instrumentação no aplicativo, deve ser chamada na Fábrica de Aplicativos,
+# antes da primeira conexão com o Banco de Dados, para que os Pools recebam o observador de consultas.
+# 'METRICS_TOKEN' é o segredo exigido pela URL /metrics, sem ele a URL responde 404.
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_THRESHOLD', 0.5)
+    app.config.setdefault('METRICS_TOKEN', None)
+    registry = app.extensions['flaskr_metrics'] = create_registry()
+    app.extensions['flaskr_query_observer'] = make_query_observer(registry)
+
+    app.before_request(start_request)
+    app.after_request(record_status)
+    app.teardown_request(finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    if signals_available:
+        before_render_template.connect(template_started, app)
+        template_rendered.connect(template_finished, app)
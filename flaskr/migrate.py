@@ -0,0 +1,115 @@
+# 12 - Migrações versionadas do esquema do Banco de Dados
+'''
+1º - Importando os módulos os e re - Localizam os arquivos da pasta 'migrations', nomeados como '0001_descricao.sql'
+2º - Importando o módulo sqlite3 - Para desfazer uma migração que falhou no meio
+3º - A versão do esquema fica no próprio arquivo do Banco de Dados, no 'PRAGMA user_version', o 'schema.sql' cria
+a versão 0, e cada migração leva o esquema para a versão do seu número, sem apagar os dados, ao contrário do 'init-db'
+
+Exemplo: flask migrate status
+         flask migrate upgrade
+'''
+
+import os
+import re
+import sqlite3
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db, get_shard_db, get_shards
+
+MIGRATION_NAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Retorna as migrações do pacote em ordem, como tuplas (versão, nome, arquivo).
+# As versões precisam ser sequenciais a partir de 1, uma versão repetida ou faltando é um erro de empacotamento.
+def get_migrations():
+    folder = os.path.join(current_app.root_path, 'migrations')
+    migrations = []
+
+    for filename in os.listdir(folder):
+        match = MIGRATION_NAME.match(filename)
+
+        if match is not None:
+            migrations.append((int(match.group(1)), match.group(2), filename))
+
+    migrations.sort()
+
+    for expected, (version, name, filename) in enumerate(migrations, 1):
+        if version != expected:
+            raise RuntimeError(f'Migration {filename} should be version {expected}.')
+
+    return migrations
+
+def get_version(db=None):
+    db = get_db() if db is None else db
+    return db.execute('PRAGMA user_version').fetchone()[0]
+
+# Aplica uma migração e atualiza o 'user_version' numa única transação, se qualquer comando falhar,
+# nada da migração permanece, e a versão continua a anterior.
+def apply_migration(db, version, filename):
+    with current_app.open_resource(os.path.join('migrations', filename)) as f:
+        script = f.read().decode('utf-8')
+
+    try:
+        db.executescript(
+            f'BEGIN;\n{script}\nPRAGMA user_version = {version};\nCOMMIT;'
+        )
+    except sqlite3.Error:
+        if db.in_transaction:
+            db.rollback()
+        raise
+
+# Aplica as migrações pendentes até a versão [target] (ou a última), e retorna as que foram aplicadas.
+# Não existem migrações para voltar a uma versão anterior. [db] é a conexão de escrita de um shard (flaskr.db).
+def upgrade(target=None, db=None):
+    db = get_db() if db is None else db
+    current = get_version(db)
+    applied = []
+
+    for version, name, filename in get_migrations():
+        if version <= current or (target is not None and version > target):
+            continue
+
+        apply_migration(db, version, filename)
+        applied.append((version, name))
+
+    return applied
+
+# O grupo de linhas de comando 'migrate', com os comandos 'status' e 'upgrade'.
+@click.group('migrate')
+def migrate_command():
+    """Apply versioned schema migrations."""
+
+@migrate_command.command('status')
+@with_appcontext
+def status_command():
+    current = get_version()
+
+    for version, name, filename in get_migrations():
+        mark = 'applied' if version <= current else 'pending'
+        click.echo(f'{version:04d} {name:<30} {mark}')
+
+    click.echo(f'Database is at version {current}.')
+
+    for shard in range(1, len(get_shards())):
+        click.echo(f'Shard {shard} is at version {get_version(get_shard_db(shard))}.')
+
+# Atualiza o 'DATABASE' e os demais shards ('DATABASE_SHARDS'), cada arquivo tem a sua própria versão.
+@migrate_command.command('upgrade')
+@click.option('--target', type=click.IntRange(0), help='Stop at this version.')
+@with_appcontext
+def upgrade_command(target):
+    for shard in range(len(get_shards())):
+        db = get_shard_db(shard, write=True)
+        label = 'Database' if shard == 0 else f'Shard {shard}'
+
+        try:
+            applied = upgrade(target, db=db)
+        except sqlite3.Error as e:
+            raise click.ClickException(f'{label}: migration failed: {e}.')
+
+        for version, name in applied:
+            click.echo(f'Applied {version:04d} {name}.')
+
+        click.echo(f'{label} is at version {get_version(db)}.')
@@ -0,0 +1,11 @@
+-- Índice das postagens de cada autor, na mesma ordem do índice principal (created DESC, id DESC).
+-- Atende as consultas filtradas por autor sem ordenar as postagens, e também a atualização
+-- do nome do autor desnormalizado (0002), que localiza as postagens pelo author_id.
+-- Observação: os índices das listagens não são de cobertura, a página exibe o corpo (body e body_html),
+-- e copiar o corpo para o índice duplicaria a tabela. O índice encontra as postagens da página em ordem,
+-- e somente essas linhas (no máximo 'POSTS_PER_PAGE' + 1) são lidas da tabela, pelo rowid.
+CREATE INDEX IF NOT EXISTS post_author_created ON post (author_id, created DESC, id DESC);
+
+-- Índice da paginação por chave (keyset) do blog.index, criado pelo schema.sql nos Bancos de Dados novos,
+-- e aqui nos Bancos de Dados existentes, criados antes dele.
+CREATE INDEX IF NOT EXISTS post_created_id ON post (created DESC, id DESC);
@@ -0,0 +1,21 @@
+-- Nome do autor copiado (desnormalizado) na tabela post, as listagens deixam de precisar do JOIN com a tabela user.
+ALTER TABLE post ADD COLUMN author_name TEXT;
+
+UPDATE post SET author_name = (SELECT username FROM user WHERE user.id = post.author_id);
+
+-- Os gatilhos (triggers) mantêm a cópia consistente: uma postagem inserida sem o nome recebe o nome do autor,
+-- uma postagem que troca de autor recebe o novo nome, e um usuário renomeado atualiza todas as suas postagens.
+CREATE TRIGGER post_author_name_insert AFTER INSERT ON post
+WHEN NEW.author_name IS NULL BEGIN
+    UPDATE post SET author_name = (SELECT username FROM user WHERE id = NEW.author_id)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER post_author_name_update AFTER UPDATE OF author_id ON post BEGIN
+    UPDATE post SET author_name = (SELECT username FROM user WHERE id = NEW.author_id)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER user_username_update AFTER UPDATE OF username ON user BEGIN
+    UPDATE post SET author_name = NEW.username WHERE author_id = NEW.id;
+END;
@@ -0,0 +1,13 @@
+-- Sessões guardadas no servidor (flaskr.sessions), o Cookie leva apenas o identificador aleatório da sessão.
+-- A coluna user guarda a linha do usuário conectado (id e username), carregada junto com a sessão.
+CREATE TABLE session (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    data TEXT NOT NULL,
+    user TEXT,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+
+-- "Sair de todos os dispositivos" remove as sessões pelo user_id, e a limpeza percorre as sessões expiradas.
+CREATE INDEX session_user_id ON session (user_id);
+CREATE INDEX session_expires ON session (expires);
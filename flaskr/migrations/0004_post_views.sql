@@ -0,0 +1,6 @@
+-- Contador de visualizações de cada postagem (flaskr.counters), somado em lotes periódicos, nunca a cada página.
+ALTER TABLE post ADD COLUMN views INTEGER NOT NULL DEFAULT 0;
+
+-- Índice das postagens mais lidas, a listagem blog.popular lê as primeiras entradas do índice,
+-- sem ordenar a tabela inteira. Cada lote de contagens atualiza somente as entradas das postagens lidas.
+CREATE INDEX post_views ON post (views DESC, id DESC);
@@ -0,0 +1,25 @@
+-- Fila de tarefas em segundo plano (flaskr.jobs), executadas pelo comando 'flask worker' fora das solicitações.
+-- A coluna run_at é o momento em que a tarefa pode ser executada (o fim da espera entre as tentativas), e enquanto
+-- a tarefa está em execução, o fim do prazo ('JOB_TIMEOUT') para que outro worker a execute novamente.
+-- A coluna key é a chave de idempotência opcional, uma tarefa com a mesma chave não é enfileirada duas vezes.
+CREATE TABLE job (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    args TEXT NOT NULL,
+    key TEXT UNIQUE,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created REAL NOT NULL,
+    run_at REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+
+-- Somente as tarefas pendentes ficam no índice, a próxima tarefa é a primeira entrada,
+-- e as tarefas concluídas não aumentam o custo de encontrá-la.
+CREATE INDEX job_ready ON job (run_at) WHERE status IN ('queued', 'running');
+
+-- As tarefas concluídas são removidas depois de 'JOB_RETENTION' segundos.
+CREATE INDEX job_done ON job (finished) WHERE status = 'done';
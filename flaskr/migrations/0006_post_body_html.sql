@@ -0,0 +1,5 @@
+-- O HTML do corpo de cada postagem (flaskr.markdown), convertido do Markdown ao gravar a postagem, e a versão
+-- do conversor que o gerou. As postagens existentes começam na versão 0, e são convertidas na primeira leitura,
+-- ou todas de uma vez com o comando 'flask render-posts'.
+ALTER TABLE post ADD COLUMN body_html TEXT;
+ALTER TABLE post ADD COLUMN body_version INTEGER NOT NULL DEFAULT 0;
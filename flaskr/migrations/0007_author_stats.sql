@@ -0,0 +1,27 @@
+-- Resumo das postagens de cada autor, o número de postagens exibido na página do autor (blog.author),
+-- sem o COUNT(*) sobre a tabela post. Com vários shards, cada arquivo conta as postagens que guarda.
+CREATE TABLE author_stats (
+    author_id INTEGER PRIMARY KEY,
+    post_count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO author_stats (author_id, post_count)
+SELECT author_id, count(*) FROM post GROUP BY author_id;
+
+-- Os gatilhos (triggers) atualizam a contagem a cada postagem inserida, excluída, ou que troca de autor,
+-- na mesma transação da alteração, inclusive nas postagens movidas entre shards (flask shards rebalance).
+CREATE TRIGGER post_count_insert AFTER INSERT ON post BEGIN
+    INSERT INTO author_stats (author_id, post_count) VALUES (NEW.author_id, 1)
+    ON CONFLICT (author_id) DO UPDATE SET post_count = post_count + 1;
+END;
+
+CREATE TRIGGER post_count_delete AFTER DELETE ON post BEGIN
+    UPDATE author_stats SET post_count = post_count - 1 WHERE author_id = OLD.author_id;
+END;
+
+CREATE TRIGGER post_count_update AFTER UPDATE OF author_id ON post
+WHEN NEW.author_id != OLD.author_id BEGIN
+    UPDATE author_stats SET post_count = post_count - 1 WHERE author_id = OLD.author_id;
+    INSERT INTO author_stats (author_id, post_count) VALUES (NEW.author_id, 1)
+    ON CONFLICT (author_id) DO UPDATE SET post_count = post_count + 1;
+END;
@@ -0,0 +1,6 @@
+-- O ponto de retomada de cada importação (flask import), o número de registros do arquivo [source] já gravados.
+-- Antes desta migração a tabela era criada pelo próprio comando, então ela pode já existir.
+CREATE TABLE IF NOT EXISTS import_checkpoint (
+    source TEXT PRIMARY KEY,
+    records INTEGER NOT NULL
+);
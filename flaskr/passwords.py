@@ -0,0 +1,201 @@
+# 06 - Calculando os hashes de senha fora das threads de solicitação
+'''
+1º - Importando os módulos atexit, threading e time - Os processos de hash são encerrados com o interpretador,
+o semáforo limita quantos hashes podem estar em andamento ou na fila, e o tempo marca as tentativas de login com falha
+2º - Importando a classe ProcessPoolExecutor do módulo concurrent.futures - Executa as funções de hash (PBKDF2/scrypt),
+que consomem muita CPU, em processos separados, sem disputar a CPU com as threads que atendem as páginas.
+Importada somente ao criar os processos, o módulo concurrent.futures.process também importa o multiprocessing
+3º - Importando as funções de hash do módulo werkzeug - As mesmas funções usadas antes diretamente nas visualizações
+4º - Importando o módulo asyncio - As versões assíncronas aguardam o resultado do processo de hash, sem bloquear
+o laço de eventos das visualizações 'async def'
+'''
+
+import asyncio
+import atexit
+import threading
+import time
+
+from flask import current_app
+from werkzeug.exceptions import abort
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from flaskr.cache import TTLCache
+
+# Os processos de hash são um recurso do processo inteiro, compartilhados pelos aplicativos com o mesmo
+# número de processos ('PASSWORD_HASH_WORKERS').
+_executors = {}
+_executors_lock = threading.Lock()
+
+def get_executor(workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _executors_lock:
+        if not _executors:
+            atexit.register(shutdown_executors)
+        if workers not in _executors:
+            _executors[workers] = ProcessPoolExecutor(max_workers=workers)
+
+        return _executors[workers]
+
+# Encerra os processos de hash antes de o interpretador terminar, enquanto os módulos ainda estão carregados.
+def shutdown_executors():
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+
+    for executor in executors:
+        executor.shutdown()
+
+# O semáforo permite 'PASSWORD_HASH_WORKERS' hashes em andamento mais 'PASSWORD_HASH_QUEUE' aguardando na fila,
+# uma solicitação que não consegue entrar na fila em 'PASSWORD_HASH_TIMEOUT' segundos recebe o erro 503,
+# em vez de acumular threads bloqueadas durante uma rajada de logins.
+def get_semaphore():
+    if 'flaskr_hash_semaphore' not in current_app.extensions:
+        current_app.extensions['flaskr_hash_semaphore'] = threading.BoundedSemaphore(
+            max(current_app.config['PASSWORD_HASH_WORKERS'], 1)
+            + current_app.config['PASSWORD_HASH_QUEUE']
+        )
+
+    return current_app.extensions['flaskr_hash_semaphore']
+
+# Executa [func] em um dos processos de hash, ou na própria thread quando 'PASSWORD_HASH_WORKERS' é 0.
+def run_hash(func, *args):
+    semaphore = get_semaphore()
+
+    if not semaphore.acquire(timeout=current_app.config['PASSWORD_HASH_TIMEOUT']):
+        abort(503, 'Too many password checks in progress, try again later.')
+
+    try:
+        workers = current_app.config['PASSWORD_HASH_WORKERS']
+
+        if not workers:
+            return func(*args)
+
+        return get_executor(workers).submit(func, *args).result()
+    finally:
+        semaphore.release()
+
+# Versão assíncrona da função 'run_hash', a espera por uma vaga no semáforo acontece numa thread auxiliar,
+# e o resultado do processo de hash é aguardado com 'asyncio.wrap_future'.
+# Se a solicitação for cancelada enquanto a thread auxiliar espera, a thread continua esperando, e a vaga
+# que ela obtiver depois do cancelamento é devolvida, o estado [waiter] é alterado pelas duas com o Lock.
+async def run_hash_async(func, *args):
+    semaphore = get_semaphore()
+
+    if not semaphore.acquire(blocking=False):
+        timeout = current_app.config['PASSWORD_HASH_TIMEOUT']
+        waiter = {'acquired': False, 'cancelled': False}
+        lock = threading.Lock()
+
+        def acquire():
+            acquired = semaphore.acquire(True, timeout)
+
+            with lock:
+                if acquired and waiter['cancelled']:
+                    semaphore.release()
+                    return False
+
+                waiter['acquired'] = acquired
+                return acquired
+
+        try:
+            acquired = await asyncio.get_running_loop().run_in_executor(None, acquire)
+        except asyncio.CancelledError:
+            with lock:
+                waiter['cancelled'] = True
+
+                if waiter['acquired']:
+                    semaphore.release()
+            raise
+
+        if not acquired:
+            abort(503, 'Too many password checks in progress, try again later.')
+
+    try:
+        workers = current_app.config['PASSWORD_HASH_WORKERS']
+
+        if not workers:
+            return func(*args)
+
+        return await asyncio.wrap_future(get_executor(workers).submit(func, *args))
+    finally:
+        semaphore.release()
+
+# Gera o hash da senha com o método ('PASSWORD_HASH_METHOD', por exemplo 'pbkdf2:sha256:260000')
+# e o tamanho do sal ('PASSWORD_SALT_LENGTH') configurados.
+def hash_password(password):
+    return run_hash(
+        generate_password_hash,
+        password,
+        current_app.config['PASSWORD_HASH_METHOD'],
+        current_app.config['PASSWORD_SALT_LENGTH'],
+    )
+
+def verify_password(pwhash, password):
+    return run_hash(check_password_hash, pwhash, password)
+
+async def hash_password_async(password):
+    return await run_hash_async(
+        generate_password_hash,
+        password,
+        current_app.config['PASSWORD_HASH_METHOD'],
+        current_app.config['PASSWORD_SALT_LENGTH'],
+    )
+
+async def verify_password_async(pwhash, password):
+    return await run_hash_async(check_password_hash, pwhash, password)
+
+# O método gravado no hash, o werkzeug completa 'pbkdf2:sha256' com o número padrão de iterações
+# ('pbkdf2:sha256:260000'), sem isso um método configurado sem as iterações nunca seria igual ao gravado.
+def canonical_method(method):
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+
+    return method
+
+# Um hash precisa ser recalculado quando foi gerado com outro método, custo ou tamanho do sal,
+# o formato do werkzeug é 'método$sal$hash'.
+def needs_rehash(pwhash):
+    method, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+
+    return (
+        method != canonical_method(current_app.config['PASSWORD_HASH_METHOD'])
+        or len(salt) != current_app.config['PASSWORD_SALT_LENGTH']
+    )
+
+# A classe 'LoginRateLimiter', conta as tentativas de login com falha de cada endereço IP em uma janela de
+# [window] segundos, depois de [limit] falhas, o endereço é bloqueado até as falhas mais antigas saírem da janela.
+# Assim, um atacante não consegue consumir a CPU dos processos de hash com tentativas repetidas.
+class LoginRateLimiter(object):
+    def __init__(self, limit, window, maxsize=10000):
+        self.limit = limit
+        self.window = window
+        self._failures = TTLCache(maxsize=maxsize, ttl=window)
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        return [t for t in self._failures.get(key, ()) if t > now - self.window]
+
+    def is_blocked(self, key):
+        with self._lock:
+            return len(self._recent(key, time.monotonic())) >= self.limit
+
+    def add_failure(self, key):
+        now = time.monotonic()
+
+        with self._lock:
+            self._failures.set(key, self._recent(key, now) + [now])
+
+    def reset(self, key):
+        with self._lock:
+            self._failures.delete(key)
+
+def get_login_limiter():
+    if 'flaskr_login_limiter' not in current_app.extensions:
+        current_app.extensions['flaskr_login_limiter'] = LoginRateLimiter(
+            current_app.config['LOGIN_RATE_LIMIT'],
+            current_app.config['LOGIN_RATE_WINDOW'],
+        )
+
+    return current_app.extensions['flaskr_login_limiter']
@@ -0,0 +1,368 @@
+# 23 - Convertendo o corpo das postagens de Markdown para HTML, uma única vez, ao gravar a postagem
+'''
+1º - Importando o módulo re - Um conversor pequeno de Markdown, com os blocos (parágrafos, títulos, listas, citações
+e código) e os trechos (negrito, itálico, código e links) mais usados, sem dependências adicionais
+2º - Importando a função escape do módulo markupsafe - Todo o texto digitado é escapado antes da conversão, então o
+HTML gerado contém somente as tags criadas pelo conversor (sanitizado), e os links aceitam apenas http, https,
+mailto e endereços relativos
+3º - O HTML é guardado na coluna 'body_html' junto com a versão do conversor ('RENDERER_VERSION'), as páginas exibem
+o HTML guardado, sem converter o Markdown a cada leitura. Quando o conversor muda, a versão aumenta, as postagens
+antigas são convertidas na leitura, e gravadas novamente por uma tarefa do 'flask worker' (flaskr.jobs)
+4º - Importando os módulos threading e weakref, e a classe OrderedDict do módulo collections - As postagens
+convertidas na leitura são enviadas ao worker por uma thread, como as contagens do flaskr.counters, e o conjunto das
+postagens já enviadas guarda somente as mais recentes
+
+Exemplo: flask render-posts --workers 4
+'''
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+import click
+from flask import current_app, g, has_request_context
+from flask.cli import with_appcontext
+from markupsafe import Markup, escape
+
+from flaskr.db import get_shard_db, get_shards, shards_for_post
+from flaskr.jobs import TASKS, enqueue, task
+
+logger = logging.getLogger(__name__)
+
+# A versão do conversor, deve aumentar a cada alteração que muda o HTML gerado.
+RENDERER_VERSION = 1
+
+_fence = re.compile(r'^\s*```')
+_heading = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_rule = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_quote = re.compile(r'^\s*> ?(.*)$')
+_bullet = re.compile(r'^\s*[-*+]\s+(.*)$')
+_number = re.compile(r'^\s*\d+[.)]\s+(.*)$')
+
+_code = re.compile(r'`([^`]+)`')
+_link = re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)')
+_safe_url = re.compile(r'^(https?://|mailto:|/|#)', re.IGNORECASE)
+_strong = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__')
+_em = re.compile(r'\*(?=\S)(.+?)(?<=\S)\*|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+_placeholder = re.compile('\x00(\\d+)\x00')
+
+# Converte os trechos de uma linha, o texto já escapado. O código e os links são guardados em [stash] e trocados
+# por marcadores, assim o negrito e o itálico não alteram o código, nem os endereços dos links.
+def render_inline(text):
+    stash = []
+
+    def keep(html):
+        stash.append(html)
+        return f'\x00{len(stash) - 1}\x00'
+
+    def link(match):
+        label, url = match.groups()
+
+        if not _safe_url.match(url):
+            return label
+
+        return keep(f'<a href="{url}" rel="nofollow">{emphasis(label)}</a>')
+
+    text = str(escape(text))
+    text = _code.sub(lambda match: keep(f'<code>{match.group(1)}</code>'), text)
+    text = _link.sub(link, text)
+    text = emphasis(text)
+
+    # Os marcadores podem estar dentro de outros guardados depois (o código dentro do texto de um link).
+    while _placeholder.search(text):
+        text = _placeholder.sub(lambda match: stash[int(match.group(1))], text)
+
+    return text
+
+def emphasis(text):
+    text = _strong.sub(lambda match: f'<strong>{match.group(1) or match.group(2)}</strong>', text)
+    return _em.sub(lambda match: f'<em>{match.group(1) or match.group(2)}</em>', text)
+
+# Converte o texto Markdown em HTML, bloco a bloco. Os caracteres nulos são removidos,
+# pois marcam os trechos guardados na conversão das linhas.
+def render_markdown(text):
+    lines = text.replace('\x00', '').replace('\r\n', '\n').split('\n')
+    html = []
+    paragraph = []
+    i = 0
+
+    def close_paragraph():
+        if paragraph:
+            html.append('<p>{}</p>'.format('\n'.join(render_inline(line.strip()) for line in paragraph)))
+            paragraph.clear()
+
+    while i < len(lines):
+        line = lines[i]
+
+        if _fence.match(line):
+            close_paragraph()
+            code = []
+            i += 1
+
+            while i < len(lines) and not _fence.match(lines[i]):
+                code.append(lines[i])
+                i += 1
+
+            html.append('<pre><code>{}</code></pre>'.format(escape('\n'.join(code))))
+            i += 1
+            continue
+
+        if not line.strip():
+            close_paragraph()
+        elif _heading.match(line):
+            close_paragraph()
+            marks, title = _heading.match(line).groups()
+            html.append(f'<h{len(marks)}>{render_inline(title)}</h{len(marks)}>')
+        elif _rule.match(line):
+            close_paragraph()
+            html.append('<hr>')
+        elif _quote.match(line):
+            close_paragraph()
+            quoted = []
+
+            while i < len(lines) and _quote.match(lines[i]):
+                quoted.append(_quote.match(lines[i]).group(1))
+                i += 1
+
+            html.append('<blockquote>{}</blockquote>'.format(render_markdown('\n'.join(quoted))))
+            continue
+        elif _bullet.match(line) or _number.match(line):
+            close_paragraph()
+            pattern, tag = (_bullet, 'ul') if _bullet.match(line) else (_number, 'ol')
+            items = []
+
+            while i < len(lines) and pattern.match(lines[i]):
+                items.append(f'<li>{render_inline(pattern.match(lines[i]).group(1))}</li>')
+                i += 1
+
+            html.append(f'<{tag}>{"".join(items)}</{tag}>')
+            continue
+        else:
+            paragraph.append(line)
+
+        i += 1
+
+    close_paragraph()
+    return '\n'.join(html)
+
+# As colunas gravadas junto com o corpo da postagem, nos INSERT e UPDATE do 'blog' e da API.
+def render_body(body):
+    return render_markdown(body), RENDERER_VERSION
+
+# O filtro 'body_html' dos Templates, o HTML guardado da postagem, ou quando foi gerado por outra versão do
+# conversor (ou ainda não existe), o HTML convertido agora, e a postagem é marcada para ser gravada novamente.
+def body_html(post):
+    if post['body_version'] == RENDERER_VERSION and post['body_html'] is not None:
+        return Markup(post['body_html'])
+
+    if has_request_context():
+        g.setdefault('stale_posts', set()).add(post['id'])
+
+    return Markup(render_markdown(post['body']))
+
+# A classe 'StaleRenders', as postagens convertidas na leitura, enviadas ao worker em uma única tarefa a cada
+# [interval] segundos por uma thread, assim as solicitações (GET) não escrevem no Banco de Dados.
+# As postagens já enviadas ficam em [enqueued] (as [maxsize] mais recentes), assim as próximas leituras da mesma
+# página (até o worker gravar o HTML) não criam outra tarefa, e a chave de idempotência evita tarefas repetidas
+# entre os processos. Quando o envio falha, as postagens voltam para a lista e são enviadas no próximo intervalo.
+# O aplicativo é uma referência fraca, a thread não o mantém na memória, e termina quando ele é descartado.
+class StaleRenders(object):
+    def __init__(self, app, interval=5, maxsize=10000):
+        self._app = weakref.ref(app)
+        self.interval = interval
+        self.maxsize = maxsize
+        self.pending = set()
+        self.enqueued = OrderedDict()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, ids):
+        with self._lock:
+            self.pending.update(id for id in ids if id not in self.enqueued)
+
+            if self.pending and self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(
+                    target=self._run, name='flaskr-stale-renders', daemon=True
+                )
+                self._thread.start()
+
+    # Remove as postagens [ids] já gravadas pelo worker, uma nova versão do conversor as envia novamente.
+    def discard(self, ids):
+        with self._lock:
+            for id in ids:
+                self.enqueued.pop(id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval) and self._app() is not None:
+            self.flush()
+
+    # Envia as postagens pendentes, em ordem de id, retorna quantas foram enviadas.
+    def flush(self):
+        app = self._app()
+
+        with self._lock:
+            ids, self.pending = sorted(self.pending), set()
+
+        if not ids or app is None:
+            return 0
+
+        try:
+            with app.app_context():
+                enqueue(
+                    rerender_posts, key=f"render:{RENDERER_VERSION}:{','.join(map(str, ids))}", ids=ids
+                )
+        except sqlite3.Error:
+            logger.exception('Could not enqueue %d stale posts.', len(ids))
+
+            with self._lock:
+                self.pending.update(ids)
+
+            return 0
+
+        with self._lock:
+            for id in ids:
+                self.enqueued[id] = True
+
+            while len(self.enqueued) > self.maxsize:
+                self.enqueued.popitem(last=False)
+
+        return len(ids)
+
+    # Encerra a thread e envia as postagens pendentes, chamada ao fechar o Pool e ao final do processo.
+    def close(self):
+        with self._lock:
+            self._stop.set()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+        self.flush()
+
+def get_stale_renders():
+    if 'flaskr_stale_renders' not in current_app.extensions:
+        renders = StaleRenders(
+            current_app._get_current_object(),
+            interval=current_app.config['RENDER_ENQUEUE_INTERVAL'],
+            maxsize=current_app.config['RENDER_ENQUEUED_MAX'],
+        )
+        current_app.extensions['flaskr_stale_renders'] = renders
+
+    return current_app.extensions['flaskr_stale_renders']
+
+# No final da solicitação, as postagens convertidas na leitura são entregues ao 'StaleRenders', sem acessar
+# o Banco de Dados.
+def collect_stale_posts(e=None):
+    stale = g.pop('stale_posts', ())
+
+    if stale:
+        get_stale_renders().add(stale)
+
+# Grava o HTML das linhas (id, body) em uma transação. A condição 'body = ?' ignora as postagens alteradas
+# depois da leitura, que já foram gravadas com o HTML do novo corpo. Retorna quantas postagens foram gravadas.
+def store_rendered(db, rows, rendered):
+    updated = 0
+
+    for (id, body), html in zip(rows, rendered):
+        updated += db.execute(
+            'UPDATE post SET body_html = ?, body_version = ? WHERE id = ? AND body = ?',
+            (html, RENDERER_VERSION, id, body)
+        ).rowcount
+
+    db.commit()
+    return updated
+
+# A tarefa do worker, converte e grava as postagens [ids] que ainda estão em outra versão, no shard onde estão.
+@task('flaskr.render.rerender_posts')
+def rerender_posts(ids):
+    for id in ids:
+        for shard in shards_for_post(id):
+            db = get_shard_db(shard, write=True)
+            row = db.execute(
+                'SELECT id, body FROM post WHERE id = ? AND body_version != ?', (id, RENDERER_VERSION)
+            ).fetchone()
+
+            if row is not None:
+                store_rendered(db, [tuple(row)], [render_markdown(row['body'])])
+                break
+
+    # No mesmo processo, as postagens gravadas deixam o conjunto das já enviadas.
+    renders = current_app.extensions.get('flaskr_stale_renders')
+
+    if renders is not None:
+        renders.discard(ids)
+
+# As tarefas enfileiradas antes de o módulo se chamar 'flaskr.render'.
+TASKS['flaskr.markdown.rerender_posts'] = rerender_posts
+
+# Converte novamente as postagens de todos os shards, em lotes de [batch_size] postagens em ordem de id.
+# O Markdown de cada lote é convertido em [workers] processos ao mesmo tempo (0 converte na própria thread),
+# e gravado em uma transação por lote. Sem [everything], somente as postagens de outra versão são convertidas.
+# O ProcessPoolExecutor é importado aqui, usado somente pelo comando 'render-posts'.
+def rerender_all(batch_size=500, workers=None, everything=False, progress=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    processes = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=processes) if workers != 0 else None
+    total = 0
+
+    try:
+        for shard in range(len(get_shards())):
+            db = get_shard_db(shard, write=True)
+            last = -1
+
+            while True:
+                rows = [tuple(row) for row in db.execute(
+                    'SELECT id, body FROM post WHERE id > ? AND (? OR body_version != ?)'
+                    ' ORDER BY id LIMIT ?',
+                    (last, everything, RENDERER_VERSION, batch_size)
+                )]
+
+                if not rows:
+                    break
+
+                bodies = [body for id, body in rows]
+
+                if executor is None:
+                    rendered = [render_markdown(body) for body in bodies]
+                else:
+                    chunksize = max(len(bodies) // (processes * 4), 1)
+                    rendered = list(executor.map(render_markdown, bodies, chunksize=chunksize))
+
+                total += store_rendered(db, rows, rendered)
+                last = rows[-1][0]
+
+                if progress is not None:
+                    progress(shard, total)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return total
+
+# A linha de comando 'render-posts', converte as postagens de versões anteriores do conversor (ou todas, com --all).
+@click.command('render-posts')
+@click.option('--all', 'everything', is_flag=True, help='Render every post, not only outdated ones.')
+@click.option('--batch-size', default=500, show_default=True, type=click.IntRange(1),
+              help='Posts rendered and stored per transaction.')
+@click.option('--workers', type=click.IntRange(0), default=None,
+              help='Rendering processes (default: CPU count, 0 renders in this process).')
+@with_appcontext
+def render_posts_command(everything, batch_size, workers):
+    total = rerender_all(batch_size, workers, everything)
+    click.echo(f'Rendered {total} posts with renderer version {RENDERER_VERSION}.')
+
+# Registrando o filtro dos Templates, o envio das postagens desatualizadas ao worker e a linha de comando.
+# 'RENDER_ENQUEUE_INTERVAL' é o intervalo (segundos) entre os envios, e 'RENDER_ENQUEUED_MAX' o número de postagens
+# já enviadas lembradas pelo processo.
+def init_app(app):
+    app.config.setdefault('RENDER_ENQUEUE_INTERVAL', 5)
+    app.config.setdefault('RENDER_ENQUEUED_MAX', 10000)
+    app.add_template_filter(body_html, 'body_html')
+    app.teardown_request(collect_stale_posts)
+    app.cli.add_command(render_posts_command)
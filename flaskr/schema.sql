@@ -1,5 +1,11 @@
+-- O esquema inicial é a versão 0, as alterações seguintes ficam na pasta 'migrations' (flask migrate upgrade).
+PRAGMA user_version = 0;
+
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS post;
+DROP TABLE IF EXISTS session;
+DROP TABLE IF EXISTS job;
+DROP TABLE IF EXISTS author_stats;
 
 CREATE TABLE user (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -14,4 +20,8 @@ CREATE TABLE post (
     title TEXT NOT NULL,
     body TEXT NOT NULL,
     FOREIGN KEY (author_id) REFERENCES user (id)
-);
\ No newline at end of file
+);
+
+-- Índice composto para a paginação por chave (keyset) do blog.index,
+-- percorre as postagens em ordem (created DESC, id DESC) sem ordenar a tabela inteira.
+CREATE INDEX post_created_id ON post (created DESC, id DESC);
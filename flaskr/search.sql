@@ -0,0 +1,32 @@
+-- Índice de busca textual (FTS5) das postagens, usado pela visualização blog.search.
+-- É uma tabela de conteúdo externo: os textos ficam apenas na tabela post, o índice guarda somente os termos.
+-- Este arquivo pode ser executado novamente para reconstruir o índice de um Banco de Dados existente.
+DROP TRIGGER IF EXISTS post_fts_insert;
+DROP TRIGGER IF EXISTS post_fts_delete;
+DROP TRIGGER IF EXISTS post_fts_update;
+DROP TABLE IF EXISTS post_fts;
+
+CREATE VIRTUAL TABLE post_fts USING fts5(
+    title,
+    body,
+    content='post',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+-- Os gatilhos (triggers) mantêm o índice sincronizado com cada INSERT, UPDATE e DELETE na tabela post.
+CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN
+    INSERT INTO post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+
+CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+
+CREATE TRIGGER post_fts_update AFTER UPDATE OF title, body ON post BEGIN
+    INSERT INTO post_fts (post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO post_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+
+-- Indexa as postagens que já existem na tabela post.
+INSERT INTO post_fts (post_fts) VALUES ('rebuild');
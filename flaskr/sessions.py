@@ -0,0 +1,346 @@
+# 15 - Sessões guardadas no servidor, em vez do Cookie assinado do Flask
+'''
+1º - Importando os módulos json, secrets, threading e time - Serializam os dados da sessão, geram os identificadores
+aleatórios, protegem o armazenamento em memória entre as threads, e controlam a expiração
+2º - Importando as classes SessionInterface e SessionMixin do Flask - A interface de sessão do aplicativo é substituída
+na Fábrica de Aplicativos, as visualizações continuam usando o objeto 'session' normalmente
+3º - Importando a classe CallbackDict do werkzeug - Um dicionário que avisa quando foi modificado, assim a sessão só é
+gravada quando algo mudou
+4º - O Cookie leva apenas um identificador aleatório (secrets.token_urlsafe), impossível de adivinhar, então não precisa
+ser assinado a cada solicitação, e uma sessão pode ser encerrada no servidor ("sair de todos os dispositivos")
+'''
+
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from flask import current_app, g
+from flask.cli import with_appcontext
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from flaskr.db import get_pool
+
+# A classe 'ServerSideSession', é o objeto 'session' das solicitações. Além dos dados, guarda o identificador (sid),
+# a linha do usuário conectado ('user'), e o user_id e a expiração lidos do armazenamento.
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, data=None, sid=None, user=None, expires=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.user = user
+        self.expires = expires
+        self.loaded_user_id = self.get('user_id')
+        self.modified = False
+
+    @property
+    def new(self):
+        return self.sid is None
+
+# A classe 'SessionStore', define a interface dos armazenamentos de sessão, cada registro tem os dados (dict),
+# a linha do usuário (dict ou None) e a expiração (time.time()), o user_id permite encerrar as sessões de um usuário.
+class SessionStore(object):
+    def get(self, sid):
+        raise NotImplementedError
+
+    def save(self, sid, data, user, expires):
+        raise NotImplementedError
+
+    def delete(self, sid):
+        raise NotImplementedError
+
+    # Remove todas as sessões de um usuário ("sair de todos os dispositivos"), retorna quantas foram removidas.
+    def delete_user(self, user_id):
+        raise NotImplementedError
+
+    # Descarta a linha do usuário guardada nas suas sessões, após uma alteração no usuário,
+    # a próxima solicitação de cada sessão carrega a linha atualizada.
+    def forget_user(self, user_id):
+        raise NotImplementedError
+
+    # Remove até [limit] sessões expiradas, retorna quantas foram removidas.
+    def cleanup(self, limit=None):
+        raise NotImplementedError
+
+# A classe 'MemorySessionStore', guarda no máximo [maxsize] sessões em memória, a usada há mais tempo é descartada
+# primeiro (LRU). Serve para um único processo, as sessões são perdidas quando o servidor reinicia.
+class MemorySessionStore(SessionStore):
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+
+            if entry is None:
+                return None
+
+            if entry[2] <= time.time():
+                self._remove(sid)
+                return None
+
+            self._data.move_to_end(sid)
+            return json.loads(entry[0]), entry[1], entry[2]
+
+    def save(self, sid, data, user, expires):
+        # Os dados são guardados serializados, como no SQLite, uma cópia independente do objeto da solicitação.
+        with self._lock:
+            if sid in self._data:
+                self._remove(sid)
+
+            self._data[sid] = (json.dumps(data), user, expires)
+            user_id = data.get('user_id')
+
+            if user_id is not None:
+                self._users.setdefault(user_id, set()).add(sid)
+
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, sid):
+        data, user, expires = self._data.pop(sid)
+        user_id = json.loads(data).get('user_id')
+        sids = self._users.get(user_id)
+
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._users[user_id]
+
+    def delete(self, sid):
+        with self._lock:
+            if sid in self._data:
+                self._remove(sid)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            sids = list(self._users.get(user_id, ()))
+
+            for sid in sids:
+                self._remove(sid)
+
+        return len(sids)
+
+    def forget_user(self, user_id):
+        with self._lock:
+            for sid in self._users.get(user_id, ()):
+                data, user, expires = self._data[sid]
+                self._data[sid] = (data, None, expires)
+
+    def cleanup(self, limit=None):
+        now = time.time()
+
+        with self._lock:
+            expired = [sid for sid, entry in self._data.items() if entry[2] <= now]
+
+            for sid in expired[:limit]:
+                self._remove(sid)
+
+        return len(expired[:limit])
+
+# A classe 'SQLiteSessionStore', guarda as sessões na tabela 'session' (migração 0003), compartilhada entre
+# os processos do servidor. As leituras usam o Pool somente leitura do arquivo principal (nunca a réplica,
+# que pode estar atrasada), e as escritas o escritor único, cada operação devolve a conexão ao terminar.
+class SQLiteSessionStore(SessionStore):
+    def _read(self, sql, parameters):
+        db = get_pool(readonly=True).acquire()
+
+        try:
+            return db.execute(sql, parameters).fetchone()
+        finally:
+            db.close()
+
+    # Quando a solicitação já tem o escritor ('g.write_db'), a mesma conexão é usada, o escritor pode ter sido
+    # obtido por outra thread (visualizações 'async def'), e a thread da solicitação ficaria esperando por ele.
+    # Uma transação deixada aberta pela visualização (um erro antes do COMMIT) seria desfeita ao devolver
+    # o escritor ao Pool, então é desfeita antes, e o COMMIT grava somente a sessão.
+    def _write(self, sql, parameters):
+        db = g.get('write_db')
+        owned = db is None
+
+        if owned:
+            db = get_pool(writer=True).acquire()
+        elif db.in_transaction:
+            db.rollback()
+
+        try:
+            count = db.execute(sql, parameters).rowcount
+            db.commit()
+            return count
+        finally:
+            if owned:
+                db.close()
+
+    def get(self, sid):
+        row = self._read(
+            "SELECT data, user, expires FROM session WHERE id = ? AND expires > ?",
+            (sid, time.time())
+        )
+
+        if row is None:
+            return None
+
+        user = json.loads(row['user']) if row['user'] is not None else None
+        return json.loads(row['data']), user, row['expires']
+
+    def save(self, sid, data, user, expires):
+        self._write(
+            "INSERT INTO session (id, user_id, data, user, expires) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET user_id = excluded.user_id,"
+            " data = excluded.data, user = excluded.user, expires = excluded.expires",
+            (
+                sid, data.get('user_id'), json.dumps(data),
+                json.dumps(user) if user is not None else None, expires,
+            )
+        )
+
+    def delete(self, sid):
+        self._write("DELETE FROM session WHERE id = ?", (sid,))
+
+    def delete_user(self, user_id):
+        return self._write("DELETE FROM session WHERE user_id = ?", (user_id,))
+
+    def forget_user(self, user_id):
+        self._write("UPDATE session SET user = NULL WHERE user_id = ?", (user_id,))
+
+    # Remove as sessões expiradas em um lote limitado, para não prender o escritor único por muito tempo.
+    def cleanup(self, limit=None):
+        return self._write(
+            "DELETE FROM session WHERE id IN"
+            " (SELECT id FROM session WHERE expires <= ? LIMIT ?)",
+            (time.time(), -1 if limit is None else limit)
+        )
+
+def create_store(app):
+    store = app.config['SESSION_STORE']
+
+    if store == 'sqlite':
+        return SQLiteSessionStore()
+    if store == 'memory':
+        return MemorySessionStore(maxsize=app.config['SESSION_MEMORY_SIZE'])
+
+    return store
+
+# A classe 'ServerSideSessionInterface', carrega a sessão pelo identificador do Cookie, e grava no armazenamento
+# somente quando a sessão foi modificada, ou quando falta menos da metade do tempo de vida para expirar
+# (a expiração é renovada enquanto o usuário continua usando o aplicativo, sem uma escrita por solicitação).
+# Quando o usuário conectado muda (login), a sessão recebe um novo identificador, e o anterior é removido,
+# impedindo que um identificador conhecido antes do login seja reaproveitado (fixação de sessão).
+# A cada 'SESSION_CLEANUP_INTERVAL' segundos, uma gravação também remove um lote de sessões expiradas.
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+        self._last_cleanup = time.monotonic()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+
+        if sid:
+            record = self.store.get(sid)
+
+            if record is not None:
+                data, user, expires = record
+                return ServerSideSession(data, sid, user, expires)
+
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = app.session_cookie_name
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        renew = session.expires is None or session.expires - now < lifetime / 2
+
+        if not (session.modified or renew):
+            return
+
+        sid = session.sid
+
+        if sid is None or session.get('user_id') != session.loaded_user_id:
+            if sid is not None:
+                self.store.delete(sid)
+            sid = session.sid = secrets.token_urlsafe(32)
+
+        session.expires = now + lifetime
+        self.store.save(sid, dict(session), session.user, session.expires)
+        self.maybe_cleanup(app)
+
+        response.set_cookie(
+            name, sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def maybe_cleanup(self, app):
+        interval = app.config['SESSION_CLEANUP_INTERVAL']
+
+        if interval is not None and time.monotonic() - self._last_cleanup >= interval:
+            self._last_cleanup = time.monotonic()
+            self.store.cleanup(app.config['SESSION_CLEANUP_BATCH'])
+
+def get_session_store():
+    return current_app.session_interface.store
+
+# Encerra todas as sessões do usuário, em todos os navegadores e dispositivos.
+def logout_everywhere(user_id):
+    return get_session_store().delete_user(user_id)
+
+# Chamada pela função 'invalidate_user' (flaskr.auth), sem efeito com o Cookie assinado padrão do Flask.
+def forget_user(user_id):
+    store = getattr(current_app.session_interface, 'store', None)
+
+    if store is not None:
+        store.forget_user(user_id)
+
+# A linha de comando 'cleanup-sessions', remove todas as sessões expiradas, em lotes de 'SESSION_CLEANUP_BATCH'.
+@click.command('cleanup-sessions')
+@with_appcontext
+def cleanup_sessions_command():
+    store = get_session_store()
+    batch = current_app.config['SESSION_CLEANUP_BATCH']
+    total = 0
+
+    while True:
+        removed = store.cleanup(batch)
+        total += removed
+
+        if removed < batch:
+            break
+
+    click.echo(f'Removed {total} expired sessions.')
+
+# Configurações padrão das sessões, 'SESSION_STORE' pode ser 'sqlite', 'memory', uma instância de 'SessionStore',
+# ou None (padrão) para manter o Cookie assinado padrão do Flask. O tempo de vida é o 'PERMANENT_SESSION_LIFETIME'.
+# Com 'sqlite', cada solicitação com o Cookie da sessão lê a tabela 'session', em troca, as sessões podem ser
+# encerradas no servidor ('logout-everywhere') e o Cookie não carrega os dados. Com 'memory', as sessões não
+# são compartilhadas entre os processos do servidor.
+def init_app(app):
+    app.config.setdefault('SESSION_STORE', None)
+    app.config.setdefault('SESSION_MEMORY_SIZE', 10000)
+    app.config.setdefault('SESSION_CLEANUP_INTERVAL', 300)
+    app.config.setdefault('SESSION_CLEANUP_BATCH', 500)
+
+    store = create_store(app)
+
+    if store is not None:
+        app.session_interface = ServerSideSessionInterface(store)
+        app.cli.add_command(cleanup_sessions_command)
@@ -0,0 +1,144 @@
+# 21 - Linhas de comando dos shards, os arquivos de Banco de Dados que dividem as postagens pelo autor
+'''
+1º - Importando as funções de shards do módulo flaskr.db - O 'DATABASE' é o shard 0, e os arquivos de
+'DATABASE_SHARDS' os shards 1, 2..., cada autor tem as suas postagens em um único shard (hashing de rendezvous)
+2º - Ao adicionar um shard, somente os autores que passam a pertencer ao novo shard mudam de arquivo, o comando
+'rebalance' move as postagens desses autores em lotes, mantendo os ids (os links das postagens continuam válidos)
+
+Exemplo: flask shards add instance/posts-1.sqlite
+         flask shards rebalance
+'''
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_shard_db, get_shards, init_shard, shard_for_author
+
+# Move as postagens de um autor do shard [source] para o shard [target], em lotes de [batch_size] postagens.
+# Cada lote é lido dentro de uma transação de escrita no shard de origem, então a postagem não pode ser alterada
+# entre a cópia e a exclusão. A cópia é gravada primeiro, se o comando for interrompido entre as duas
+# transações, a postagem fica nos dois shards, e é atualizada na cópia ao executar o comando novamente.
+# As postagens só mudam para um shard de número maior (o hashing de rendezvous só move autores para o shard
+# adicionado), pois o AUTOINCREMENT do SQLite continua a partir do maior id da tabela, uma postagem de um bloco
+# de ids maior faria o shard de destino gerar ids do bloco de outro shard.
+def move_author(author_id, source, target, batch_size=500):
+    if target < source:
+        raise ValueError(f'Posts can only move to a later shard, not from {source} to {target}.')
+
+    src = get_shard_db(source, write=True)
+    dst = get_shard_db(target, write=True)
+    moved = 0
+
+    while True:
+        src.execute('BEGIN IMMEDIATE')
+
+        try:
+            rows = src.execute(
+                'SELECT * FROM post WHERE author_id = ? ORDER BY id LIMIT ?',
+                (author_id, batch_size)
+            ).fetchall()
+
+            if not rows:
+                break
+
+            columns = rows[0].keys()
+            dst.executemany(
+                'INSERT INTO post ({}) VALUES ({}) ON CONFLICT (id) DO UPDATE SET {}'.format(
+                    ', '.join(columns),
+                    ', '.join('?' * len(columns)),
+                    ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'id'),
+                ),
+                [tuple(row) for row in rows]
+            )
+
+            dst.commit()
+            src.executemany('DELETE FROM post WHERE id = ?', [(row['id'],) for row in rows])
+            src.commit()
+        finally:
+            if src.in_transaction:
+                src.rollback()
+            if dst.in_transaction:
+                dst.rollback()
+
+        moved += len(rows)
+
+    return moved
+
+# Move as postagens de todos os autores que não estão no seu shard, retorna o total de postagens movidas.
+def rebalance(batch_size=500, progress=None):
+    count = len(get_shards())
+    moved = 0
+
+    for source in range(count):
+        authors = [row[0] for row in get_shard_db(source).execute(
+            'SELECT DISTINCT author_id FROM post'
+        )]
+
+        for author_id in authors:
+            target = shard_for_author(author_id, count)
+
+            if target != source:
+                moved += move_author(author_id, source, target, batch_size)
+
+                if progress is not None:
+                    progress(author_id, source, target, moved)
+
+    return moved
+
+# O grupo de linhas de comando 'shards', com os comandos 'status', 'add' e 'rebalance'.
+@click.group('shards')
+def shards_command():
+    """Inspect, add and rebalance the post shards."""
+
+# Apresenta cada shard, o número de postagens e quantas estão fora do shard do seu autor.
+@shards_command.command('status')
+@with_appcontext
+def status_command():
+    count = len(get_shards())
+
+    for shard, database in enumerate(get_shards()):
+        posts = misplaced = 0
+
+        for author_id, total in get_shard_db(shard).execute(
+            'SELECT author_id, count(*) FROM post GROUP BY author_id'
+        ):
+            posts += total
+
+            if shard_for_author(author_id, count) != shard:
+                misplaced += total
+
+        click.echo(f'{shard:>3} {database} posts={posts} misplaced={misplaced}')
+
+# Cria e inicializa o arquivo do próximo shard, que precisa ser adicionado ao final do 'DATABASE_SHARDS'
+# de todos os servidores, antes do 'rebalance'.
+@shards_command.command('add')
+@click.argument('path', type=click.Path(dir_okay=False))
+@with_appcontext
+def add_command(path):
+    path = os.path.abspath(path)
+
+    if os.path.exists(path):
+        raise click.ClickException(f'{path} already exists.')
+
+    shard = len(get_shards())
+    current_app.config['DATABASE_SHARDS'] = [*current_app.config['DATABASE_SHARDS'], path]
+    init_shard(shard)
+
+    click.echo(f'Initialized shard {shard} at {path}.')
+    click.echo(
+        'Append it to DATABASE_SHARDS on every server, then run "flask shards rebalance".'
+    )
+
+@shards_command.command('rebalance')
+@click.option('--batch-size', default=500, show_default=True, type=click.IntRange(1),
+              help='Posts moved per transaction.')
+@with_appcontext
+def rebalance_command(batch_size):
+    def progress(author_id, source, target, moved):
+        click.echo(f'Moved the posts of author {author_id} from shard {source} to {target}.')
+
+    moved = rebalance(batch_size, progress)
+    click.echo(f'Moved {moved} posts.')
@@ -0,0 +1,120 @@
+# 19 - Medindo o tempo de inicialização do aplicativo, e adiando a importação dos comandos opcionais
+'''
+1º - Importando o módulo importlib - Os comandos usados somente na linha de comando (bench, export, import, migrate,
+shards), são importados quando executados, e não em cada Fábrica de Aplicativos (processos do servidor e testes)
+2º - Importando o módulo sys - O comando 'profile-startup' inicia um novo interpretador Python (sys.executable)
+com a opção '-X importtime', assim as importações são medidas do zero, sem os módulos já carregados pelo 'flask'
+'''
+
+import importlib
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Código executado pelo novo interpretador, o tempo total (segundos) da importação e da Fábrica de Aplicativos
+# é impresso na saída padrão, e o '-X importtime' imprime o tempo de cada importação na saída de erros.
+PROFILE_SCRIPT = '''
+import time
+start = time.perf_counter()
+from flaskr import create_app
+create_app({'TESTING': True})
+print(time.perf_counter() - start)
+'''
+
+# A classe 'LazyCommand', registra um comando pelo nome do módulo e do objeto ('flaskr.bench:bench_command'),
+# o módulo só é importado quando o comando é executado. A ajuda curta ('flask --help') não importa o módulo.
+class LazyCommand(click.Command):
+    def __init__(self, name, import_name, help=None):
+        super().__init__(name, help=help, short_help=help)
+        self.import_name = import_name
+
+    def load(self):
+        module, _, attr = self.import_name.partition(':')
+        return getattr(importlib.import_module(module), attr)
+
+    # O contexto é criado pelo comando verdadeiro, que também pode ser um grupo de comandos (migrate).
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+    def get_params(self, ctx):
+        return self.load().get_params(ctx)
+
+    def invoke(self, ctx):
+        return self.load().invoke(ctx)
+
+# Registra os comandos opcionais sem importá-los, [commands] é uma lista de (nome, 'módulo:objeto', ajuda).
+def add_lazy_commands(app, commands):
+    for name, import_name, help in commands:
+        app.cli.add_command(LazyCommand(name, import_name, help))
+
+# Lê a saída do '-X importtime', linhas no formato 'import time: self | cumulative | name', em microssegundos.
+def parse_importtime(output):
+    imports = []
+
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(own), int(cumulative)))
+
+    return imports
+
+# Executa a importação e a Fábrica de Aplicativos em um novo interpretador, retorna o tempo total (segundos)
+# e a lista (nome, próprio, acumulado) das importações. O módulo subprocess é importado somente aqui,
+# pois este módulo é importado em toda Fábrica de Aplicativos.
+def profile_startup():
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+# A linha de comando 'profile-startup', apresenta o tempo de inicialização, os módulos do flaskr e as [top]
+# importações mais lentas. Termina com falha quando o tempo ultrapassa o 'STARTUP_BUDGET' (segundos),
+# ou o valor de [--budget], podendo ser usado na integração contínua.
+@click.command('profile-startup')
+@click.option('--top', default=15, show_default=True, help='Number of slowest imports to show.')
+@click.option('--budget', type=float, default=None, help='Startup budget in seconds.')
+@with_appcontext
+def profile_startup_command(top, budget):
+    total, imports = profile_startup()
+
+    if budget is None:
+        budget = current_app.config['STARTUP_BUDGET']
+
+    click.echo(f'Startup: {total * 1000:.1f} ms (import flaskr + create_app)')
+    click.echo('\nflaskr modules (cumulative):')
+
+    for name, own, cumulative in imports:
+        if name.startswith('flaskr'):
+            click.echo(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    click.echo('\nSlowest imports (self):')
+
+    for name, own, cumulative in sorted(imports, key=lambda item: item[1], reverse=True)[:top]:
+        click.echo(f'  {own / 1000:8.1f} ms  {name}')
+
+    if budget is not None and total > budget:
+        raise click.ClickException(
+            f'Startup took {total * 1000:.1f} ms, over the budget of {budget * 1000:.1f} ms.'
+        )
+
+# Os comandos usados somente na linha de comando, importados quando executados.
+LAZY_COMMANDS = [
+    ('bench', 'flaskr.bench:bench_command', 'Measure throughput and latency of the main URLs.'),
+    ('export', 'flaskr.transfer:export_command', 'Export users or posts as NDJSON or CSV.'),
+    ('import', 'flaskr.transfer:import_command', 'Import users or posts from NDJSON or CSV.'),
+    ('migrate', 'flaskr.migrate:migrate_command', 'Show or apply schema migrations.'),
+    ('shards', 'flaskr.shards:shards_command', 'Inspect, add and rebalance the post shards.'),
+]
+
+# Configuração padrão do orçamento de inicialização, None apenas apresenta o relatório.
+def init_app(app):
+    app.config.setdefault('STARTUP_BUDGET', None)
+    add_lazy_commands(app, LAZY_COMMANDS)
+    app.cli.add_command(profile_startup_command)
@@ -0,0 +1,83 @@
+# 18 - Compilando os Templates antes das solicitações, com o Cache de bytecode do Jinja
+'''
+1º - Importando a classe FileSystemBytecodeCache do módulo jinja2 - Guarda em arquivos o código Python compilado
+de cada Template, um novo processo (worker) lê o código compilado, em vez de compilar o Template novamente
+2º - Importando a classe TemplateSyntaxError do módulo jinja2 - O comando 'compile-templates' apresenta os Templates
+com erro, e termina com falha, antes de o aplicativo ser implantado
+3º - Por padrão o Jinja compila cada Template na primeira solicitação de cada processo, e a cada renderização confere
+a data de modificação do arquivo. Com o 'TEMPLATE_PRELOAD', todos os Templates são carregados na Fábrica de
+Aplicativos, e ficam congelados na memória, sem conferir os arquivos (o Template alterado exige reiniciar o servidor)
+'''
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache, TemplateSyntaxError
+
+# Retorna os nomes de todos os Templates do aplicativo e dos Blueprints, somente os arquivos HTML.
+def list_templates(env):
+    return sorted(name for name in env.list_templates() if name.endswith('.html'))
+
+# Compila todos os Templates, o código compilado é gravado no Cache de bytecode (quando configurado),
+# e o Template fica no Cache do Jinja. Retorna a lista dos Templates carregados.
+def preload_templates(env):
+    return [env.get_template(name) for name in list_templates(env)]
+
+# Carrega todos os Templates e os mantém na memória, em um dicionário sem limite de tamanho (o LRUCache padrão
+# descarta os Templates usados há mais tempo, a partir de 400), e desativa a conferência das datas de modificação.
+def freeze_templates(app):
+    app.config['TEMPLATES_AUTO_RELOAD'] = False
+    env = app.jinja_env
+    env.auto_reload = False
+    env.cache = {}
+    return preload_templates(env)
+
+# A linha de comando 'compile-templates', compila todos os Templates para o Cache de bytecode ('TEMPLATE_CACHE_DIR'),
+# executada na implantação, antes de iniciar os processos do servidor.
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    env = current_app.jinja_env
+    names = list_templates(env)
+    errors = 0
+
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not configured.')
+
+    for name in names:
+        try:
+            env.get_template(name)
+        except TemplateSyntaxError as e:
+            errors += 1
+            click.echo(f'{name}:{e.lineno}: {e.message}', err=True)
+
+    if errors:
+        raise click.ClickException(f'{errors} templates failed to compile.')
+
+    click.echo(
+        f'Compiled {len(names)} templates into '
+        f'{current_app.config["TEMPLATE_CACHE_DIR"]}.'
+    )
+
+# Configurações padrão dos Templates, 'TEMPLATE_CACHE_DIR' é a pasta do Cache de bytecode (None, o padrão,
+# desativa), e o 'TEMPLATE_PRELOAD' carrega e congela todos os Templates na Fábrica de Aplicativos.
+# Em produção, os dois são ativados no 'config.py' da pasta de instância, por exemplo:
+#     TEMPLATE_CACHE_DIR = '/var/cache/flaskr/jinja'
+#     TEMPLATE_PRELOAD = True
+# Registrada depois dos Blueprints, para que os Templates deles também sejam carregados.
+def init_app(app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', None)
+    app.config.setdefault('TEMPLATE_PRELOAD', False)
+
+    directory = app.config['TEMPLATE_CACHE_DIR']
+
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    if app.config['TEMPLATE_PRELOAD']:
+        freeze_templates(app)
+
+    app.cli.add_command(compile_templates_command)
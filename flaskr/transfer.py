@@ -0,0 +1,280 @@
+# 11 - Importando e exportando usuários e postagens em massa, pela linha de comando
+'''
+1º - Importando os módulos csv e json - Os formatos aceitos, CSV com cabeçalho, e NDJSON (um objeto JSON por linha)
+2º - Importando a função islice do módulo itertools - Divide as linhas em lotes, e pula as linhas já importadas
+3º - Importando os módulos os e time - Identificam o arquivo de origem de uma importação, e limitam a frequência
+das mensagens de progresso
+4º - Todas as etapas usam geradores, cada linha é lida, convertida e escrita uma de cada vez, então a memória usada
+não depende do tamanho do arquivo, ou da tabela
+
+Exemplo: flask export posts --output posts.ndjson
+         flask import posts posts.ndjson --batch-size 5000
+'''
+
+import csv
+import heapq
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+
+from flaskr.db import get_db, get_read_db, get_shard_db, get_shards
+
+# As colunas de cada tabela, na ordem usada pelo CSV. Na importação, o 'id' é opcional (gerado pelo AUTOINCREMENT),
+# e o 'created' também (a data atual), as demais colunas são obrigatórias.
+TABLES = {
+    'users': {
+        'table': 'user',
+        'columns': ('id', 'username', 'password'),
+        'optional': ('id',),
+    },
+    'posts': {
+        'table': 'post',
+        'columns': ('id', 'author_id', 'created', 'title', 'body'),
+        'optional': ('id', 'created'),
+    },
+}
+
+FORMATS = ('ndjson', 'csv')
+
+# O formato é escolhido pela opção '--format', ou pela extensão do arquivo ('.csv'), o padrão é NDJSON.
+def detect_format(path, fmt=None):
+    if fmt is not None:
+        return fmt
+
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+# Percorre as linhas de uma tabela em ordem de 'id', diretamente do cursor do sqlite3, sem carregar a tabela
+# na memória. A conexão de leitura (somente leitura, no modo WAL) não bloqueia o escritor durante a exportação.
+# As postagens de todos os shards ('DATABASE_SHARDS') são combinadas na ordem de 'id'.
+def iter_rows(name):
+    spec = TABLES[name]
+    sql = 'SELECT {} FROM {} ORDER BY id'.format(', '.join(spec['columns']), spec['table'])
+    cursor = get_read_db().execute(sql)
+
+    if spec['table'] == 'post' and len(get_shards()) > 1:
+        cursor = heapq.merge(
+            cursor,
+            *(get_shard_db(shard).execute(sql) for shard in range(1, len(get_shards()))),
+            key=lambda row: row['id']
+        )
+
+    for row in cursor:
+        yield {
+            column: str(value) if column == 'created' else value
+            for column, value in zip(spec['columns'], row)
+        }
+
+# Escreve as linhas em [stream], no formato NDJSON ou CSV, e retorna quantas linhas foram escritas.
+def write_rows(rows, stream, fmt, columns):
+    count = 0
+
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False))
+            stream.write('\n')
+            count += 1
+
+    return count
+
+# Lê os registros de [stream] como pares (número, dicionário), pulando os [skip] primeiros (já importados).
+# No NDJSON as linhas puladas nem são decodificadas, as linhas em branco são ignoradas e não contam como registros.
+def read_rows(stream, fmt, skip=0):
+    if fmt == 'csv':
+        yield from islice(enumerate(csv.DictReader(stream), 1), skip, None)
+        return
+
+    lines = (line for line in stream if line.strip())
+
+    for number, line in islice(enumerate(lines, 1), skip, None):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise click.ClickException(f'Record {number}: invalid JSON ({e.msg}).')
+
+        if not isinstance(record, dict):
+            raise click.ClickException(f'Record {number}: expected a JSON object.')
+
+        yield number, record
+
+# Os limites de um INTEGER do SQLite, números maiores não podem ser gravados.
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+# Converte um registro lido para a tupla de valores do INSERT, verificando as colunas obrigatórias e os tipos,
+# somente textos e números podem ser gravados (um objeto ou lista do JSON não). Colunas vazias do CSV,
+# ou ausentes, viram NULL.
+def to_values(record, spec, number):
+    values = []
+
+    for column in spec['columns']:
+        value = record.get(column)
+
+        if value == '':
+            value = None
+        if value is None and column not in spec['optional']:
+            raise click.ClickException(f"Record {number}: missing '{column}'.")
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (str, int, float))
+            or isinstance(value, int) and not MIN_INTEGER <= value <= MAX_INTEGER
+        ):
+            raise click.ClickException(f"Record {number}: invalid value for '{column}'.")
+
+        values.append(value)
+
+    return tuple(values)
+
+# O ponto de retomada de cada importação, guardado no próprio Banco de Dados (tabela 'import_checkpoint',
+# criada pela migração 0008), e atualizado na mesma transação que insere o lote, assim depois de uma interrupção,
+# a importação recomeça exatamente após o último lote gravado.
+def get_checkpoint(db, source):
+    row = db.execute(
+        'SELECT records FROM import_checkpoint WHERE source = ?', (source,)
+    ).fetchone()
+    return 0 if row is None else row['records']
+
+# Importa os registros de [stream] na tabela [name], em lotes de [batch_size] linhas, cada lote é uma transação
+# com um único 'executemany'. Com [source] (o caminho do arquivo), a importação pode ser retomada, e [progress]
+# recebe o total de registros importados após cada lote. Retorna o total de registros importados.
+def import_rows(name, stream, fmt, batch_size=1000, source=None, progress=None):
+    spec = TABLES[name]
+    db = get_db()
+
+    # O ponto de retomada fica no 'DATABASE', e não pode ser gravado na mesma transação de outro shard.
+    if spec['table'] == 'post' and len(get_shards()) > 1:
+        raise click.ClickException('Importing posts is not supported with DATABASE_SHARDS.')
+    columns = spec['columns']
+    placeholders = ['?'] * len(columns)
+
+    # Sem data, a postagem recebe a data atual, como na criação pelo formulário.
+    if 'created' in columns:
+        placeholders[columns.index('created')] = 'COALESCE(?, CURRENT_TIMESTAMP)'
+
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        spec['table'], ', '.join(columns), ', '.join(placeholders)
+    )
+
+    done = 0
+    if source is not None:
+        done = get_checkpoint(db, source)
+
+    records = read_rows(stream, fmt, skip=done)
+
+    while True:
+        batch = [
+            to_values(record, spec, number)
+            for number, record in islice(records, batch_size)
+        ]
+
+        if not batch:
+            break
+
+        # Além das duplicatas (IntegrityError), qualquer erro do lote é informado da mesma forma,
+        # e o ponto de retomada continua no último lote gravado.
+        try:
+            db.executemany(sql, batch)
+        except db.Error as e:
+            db.rollback()
+            raise click.ClickException(
+                f'Records {done + 1}-{done + len(batch)}: {e}.'
+            )
+
+        done += len(batch)
+
+        if source is not None:
+            db.execute(
+                'INSERT INTO import_checkpoint (source, records) VALUES (?, ?)'
+                ' ON CONFLICT (source) DO UPDATE SET records = excluded.records',
+                (source, done),
+            )
+
+        db.commit()
+
+        if progress is not None:
+            progress(done)
+
+    # A importação terminou, o ponto de retomada é removido, e o mesmo arquivo pode ser importado de novo.
+    if source is not None:
+        db.execute('DELETE FROM import_checkpoint WHERE source = ?', (source,))
+        db.commit()
+
+    return done
+
+# Exibe o progresso no terminal (stderr), no máximo uma vez por segundo.
+def progress_reporter(label):
+    last = time.monotonic()
+
+    def report(count):
+        nonlocal last
+        now = time.monotonic()
+
+        if now - last >= 1:
+            last = now
+            click.echo(f'{label} {count} records...', err=True)
+
+    return report
+
+# Utilizando a função 'command' estamos adicionando a linha de comando 'export', que escreve a tabela
+# informada (users ou posts) no arquivo '--output', ou na saída padrão.
+@click.command('export')
+@click.argument('name', type=click.Choice(sorted(TABLES)))
+@click.option('--output', '-o', default='-', type=click.Path(dir_okay=False, allow_dash=True),
+              help='Destination file, "-" for stdout.')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@with_appcontext
+def export_command(name, output, fmt):
+    fmt = detect_format(output, fmt)
+    columns = TABLES[name]['columns']
+
+    if output == '-':
+        count = write_rows(iter_rows(name), sys.stdout, fmt, columns)
+    else:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            count = write_rows(iter_rows(name), f, fmt, columns)
+
+    click.echo(f'Exported {count} {name}.', err=True)
+
+# A linha de comando 'import', lê o arquivo informado (ou "-" para a entrada padrão), e insere os registros.
+# Executada novamente depois de uma interrupção, continua do último lote gravado, '--restart' ignora
+# o ponto de retomada. A entrada padrão não pode ser retomada.
+@click.command('import')
+@click.argument('name', type=click.Choice(sorted(TABLES)))
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True, type=click.IntRange(1),
+              help='Records per transaction.')
+@click.option('--restart', is_flag=True, help='Ignore the saved position of an interrupted import.')
+@with_appcontext
+def import_command(name, path, fmt, batch_size, restart):
+    fmt = detect_format(path, fmt)
+    source = None
+
+    if path != '-':
+        source = f'{name}:{os.path.abspath(path)}'
+
+        if restart:
+            db = get_db()
+            db.execute('DELETE FROM import_checkpoint WHERE source = ?', (source,))
+            db.commit()
+
+    if path == '-':
+        count = import_rows(
+            name, sys.stdin, fmt, batch_size, progress=progress_reporter('Imported')
+        )
+    else:
+        with open(path, encoding='utf-8', newline='') as f:
+            count = import_rows(
+                name, f, fmt, batch_size, source, progress_reporter('Imported')
+            )
+
+    click.echo(f'Imported {count} {name}.', err=True)
@@ -13,6 +13,7 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=[
-        'flask',
+        'flask[async]',
+        'aiosqlite',
     ],
 )
@@ -1,30 +1,69 @@
 import os
+import shutil
+import sqlite3
 import tempfile
 
 import pytest
 from flaskr import create_app
-from flaskr.db import get_db, init_db
+from flaskr.db import close_pool, get_db, init_db
 
 with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
     _data_sql = f.read().decode('utf8')
 
+# O Banco de Dados de modelo, criado uma única vez por execução dos testes com o 'schema.sql', as migrações
+# e o 'data.sql', cada teste recebe uma cópia do arquivo, em vez de executar os scripts novamente.
+@pytest.fixture(scope='session')
+def template_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('template') / 'flaskr.sqlite')
+    app = create_app({'TESTING': True, 'DATABASE': path})
+
+    with app.app_context():
+        init_db()
+        get_db().executescript(_data_sql)
+
+    with app.app_context():
+        close_pool()
+
+    # Grava o conteúdo do arquivo WAL no arquivo principal, para que a cópia esteja completa.
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    db.close()
+    return path
+
+# O Cache de bytecode dos Templates, compartilhado pelos aplicativos da mesma execução dos testes,
+# em uma pasta temporária, fora da pasta do projeto.
+@pytest.fixture(scope='session')
+def template_cache(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('jinja'))
+
+# Configurações adicionais do aplicativo dos testes, um módulo de testes pode substituir esta fixture.
 @pytest.fixture
-def app():
+def app_config():
+    return {}
+
+@pytest.fixture
+def app(template_db, template_cache, app_config):
     db_fd, db_path = tempfile.mkstemp()
+    shutil.copyfile(template_db, db_path)
 
     app = create_app({
         'TESTING': True,
         'DATABASE': db_path,
+        'TEMPLATE_CACHE_DIR': template_cache,
+        **app_config,
     })
 
-    with app.app_context():
-        init_db()
-        get_db().executescript(_data_sql)
-
     yield app
 
+    with app.app_context():
+        close_pool()
+
     os.close(db_fd)
     os.unlink(db_path)
+    # Arquivos auxiliares do modo WAL, deixados por conexões que ainda não foram devolvidas ao Pool.
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
 
 @pytest.fixture
 def client(app):
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+from flaskr.aiodb import get_async_db
+from flaskr.asgi import create_asgi_app
+from flaskr.auth import login_required
+
+def test_async_db(app):
+    @app.route('/async-count')
+    async def count():
+        db = await get_async_db()
+        assert db is await get_async_db()
+        row = await db.fetchone('SELECT COUNT(*) FROM post')
+        return str(row[0])
+
+    client = app.test_client()
+    assert client.get('/async-count').data == b'1'
+
+    # A conexão volta para o Pool, e é reutilizada na próxima solicitação
+    pool = app.extensions['flaskr_db'][(app.config['DATABASE'], 'async')]
+    conn = pool._free[0][0]
+    assert client.get('/async-count').data == b'1'
+    assert len(pool._free) == 1 and pool._free[0][0] is conn
+
+def test_async_pool_after_fork(app):
+    @app.route('/async-one')
+    async def one():
+        db = await get_async_db()
+        return str((await db.fetchone('SELECT 1'))[0])
+
+    client = app.test_client()
+    client.get('/async-one')
+    pool = app.extensions['flaskr_db'][(app.config['DATABASE'], 'async')]
+    inherited = pool._free[0][0]
+
+    # Simula um processo filho, as conexões herdadas são esquecidas.
+    pool._pid = -1
+    assert client.get('/async-one').data == b'1'
+    assert pool._free[0][0] is not inherited
+    inherited.stop()
+
+def test_login_required_async(app, client, auth):
+    @app.route('/async-secret')
+    @login_required
+    async def secret():
+        return 'secret'
+
+    response = client.get('/async-secret')
+    assert response.headers['Location'] == 'http://localhost/auth/login'
+
+    auth.login()
+    assert client.get('/async-secret').data == b'secret'
+
+async def asgi_get(asgi_app, path):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'headers': [],
+        'client': ('127.0.0.1', 1234), 'server': ('localhost', 80),
+    }
+    await asgi_app(scope, receive, send)
+    return messages[0]['status'], b''.join(m.get('body', b'') for m in messages[1:])
+
+def test_asgi_app(app):
+    asgi_app = create_asgi_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+    assert asyncio.run(asgi_get(asgi_app, '/hello')) == (200, b'Hello, World!')
+
+def test_asgi_requests_run_concurrently(app):
+    asgi_app = create_asgi_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+
+    @asgi_app.wsgi_application.route('/slow')
+    def slow():
+        time.sleep(0.5)
+        return threading.current_thread().name
+
+    async def run():
+        return await asyncio.gather(*(asgi_get(asgi_app, '/slow') for i in range(4)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(run())
+
+    # Uma solicitação de cada vez levaria 2 segundos.
+    assert time.perf_counter() - start < 1.5
+    assert len({body for status, body in responses}) == 4
@@ -0,0 +1,166 @@
+import pytest
+from flaskr.db import get_db
+
+def test_list_posts(client):
+    response = client.get('/api/v1/posts')
+
+    assert response.status_code == 200
+    assert response.json == {
+        'posts': [{
+            'id': 1, 'title': 'test title', 'body': 'test\nbody',
+            'created': '2018-01-01T00:00:00', 'author_id': 1, 'author': 'test',
+        }],
+        'next': None,
+        'prev': None,
+    }
+
+def test_list_pagination(app, client):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created) VALUES (?, '', 1, ?)",
+            [(f'post {i}', f'2018-01-0{i} 00:00:00') for i in range(2, 6)]
+        )
+        db.commit()
+
+    first = client.get('/api/v1/posts?per_page=2&fields=title').json
+    assert first['posts'] == [{'title': 'post 5'}, {'title': 'post 4'}]
+    assert first['prev'] is None
+
+    second = client.get('/api/v1/posts', query_string={
+        'per_page': 2, 'fields': 'title', 'before': first['next']
+    }).json
+    assert second['posts'] == [{'title': 'post 3'}, {'title': 'post 2'}]
+
+    back = client.get('/api/v1/posts', query_string={
+        'per_page': 2, 'fields': 'title', 'after': second['prev']
+    }).json
+    assert back['posts'] == first['posts']
+
+@pytest.mark.parametrize('query', (
+    'fields=id,password', 'per_page=0', 'per_page=1000', 'before=bad',
+    'before=2018-01-01,9223372036854775808',
+))
+def test_list_invalid(client, query):
+    response = client.get(f'/api/v1/posts?{query}')
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Bad Request'
+
+def test_get_post(client):
+    response = client.get('/api/v1/posts/1?fields=id,author')
+    assert response.json == {'id': 1, 'author': 'test'}
+
+    response = client.get('/api/v1/posts/2')
+    assert response.status_code == 404
+    assert "doesn't exist" in response.json['message']
+
+    assert client.get('/api/v1/posts/9223372036854775808').status_code == 404
+
+def test_conditional_get(client):
+    response = client.get('/api/v1/posts/1')
+    etag = response.headers['ETag']
+
+    response = client.get('/api/v1/posts/1', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    response = client.get('/api/v1/posts', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+def test_login_required(client):
+    response = client.post('/api/v1/posts', json={'title': 'x', 'body': 'y'})
+
+    assert response.status_code == 401
+    assert response.json['message'] == 'Authentication required.'
+
+# As escritas da API passam pela mesma função 'write' das páginas HTML, também com o 'GROUP_COMMIT' ativo.
+@pytest.mark.parametrize('app_config', ({}, {'GROUP_COMMIT': True}))
+def test_create_update_delete(client, auth, app):
+    auth.login()
+
+    response = client.post('/api/v1/posts', json={'title': 'created', 'body': 'b'})
+    assert response.status_code == 201
+    assert response.headers['Location'].endswith('/api/v1/posts/2')
+    assert response.json['title'] == 'created'
+
+    response = client.patch('/api/v1/posts/2', json={'body': 'patched'})
+    assert response.json['title'] == 'created'
+    assert response.json['body'] == 'patched'
+
+    response = client.put('/api/v1/posts/2', json={'title': 'replaced'})
+    assert response.json['body'] == ''
+
+    assert client.delete('/api/v1/posts/2').status_code == 204
+    assert client.get('/api/v1/posts/2').status_code == 404
+
+    # As páginas HTML guardadas no Cache também são invalidadas.
+    assert b'created' not in client.get('/').data
+    assert ('flaskr_group_commit' in app.extensions) == app.config['GROUP_COMMIT']
+
+@pytest.mark.parametrize(('method', 'path', 'data', 'message'), (
+    ('post', '/api/v1/posts', {'body': 'b'}, 'Title is required.'),
+    ('post', '/api/v1/posts', ['x'], 'Expected a JSON object.'),
+    ('patch', '/api/v1/posts/1', {'title': ''}, 'Title is required.'),
+    ('patch', '/api/v1/posts/1', {'body': 1}, "'body' must be a string."),
+    ('post', '/api/v1/posts/batch', {'posts': []}, "'posts' must be a non-empty list."),
+    ('post', '/api/v1/posts/batch-delete', {'ids': ['1']}, "'ids' must be a list of integers."),
+    ('post', '/api/v1/posts/batch-delete', {'ids': [True]}, "'ids' must be a list of integers."),
+))
+def test_validation(client, auth, method, path, data, message):
+    auth.login()
+    response = getattr(client, method)(path, json=data)
+
+    assert response.status_code == 400
+    assert response.json['message'] == message
+
+def test_author_required(app, client, auth):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE post SET author_id = 2 WHERE id = 1')
+        db.commit()
+
+    auth.login()
+    assert client.patch('/api/v1/posts/1', json={'title': 'x'}).status_code == 403
+    assert client.delete('/api/v1/posts/1').status_code == 403
+
+@pytest.mark.parametrize('app_config', ({}, {'GROUP_COMMIT': True}))
+def test_batch_create(app, client, auth):
+    auth.login()
+    response = client.post('/api/v1/posts/batch', json={'posts': [
+        {'title': 'one', 'body': '1'}, {'title': 'two', 'body': '2'},
+    ]})
+
+    assert response.status_code == 201
+    assert response.json == {'ids': [2, 3]}
+
+    # Uma postagem inválida cancela o lote inteiro.
+    response = client.post('/api/v1/posts/batch', json={'posts': [
+        {'title': 'three', 'body': '3'}, {'title': '', 'body': '4'},
+    ]})
+    assert response.status_code == 400
+
+    app.config['API_BATCH_LIMIT'] = 1
+    response = client.post('/api/v1/posts/batch', json={'posts': [{'title': 'a'}] * 2})
+    assert response.json['message'] == 'At most 1 items per batch.'
+
+    with app.app_context():
+        assert get_db().execute('SELECT count(*) FROM post').fetchone()[0] == 3
+
+@pytest.mark.parametrize('app_config', ({}, {'GROUP_COMMIT': True}))
+def test_batch_delete(app, client, auth):
+    auth.login()
+    client.post('/api/v1/posts/batch', json={'posts': [{'title': 'a'}, {'title': 'b'}]})
+
+    assert client.post(
+        '/api/v1/posts/batch-delete', json={'ids': [2, 99]}
+    ).status_code == 404
+
+    with app.app_context():
+        assert get_db().execute('SELECT count(*) FROM post').fetchone()[0] == 3
+
+    assert client.post(
+        '/api/v1/posts/batch-delete', json={'ids': [1, 2, 3]}
+    ).status_code == 204
+
+    with app.app_context():
+        assert get_db().execute('SELECT count(*) FROM post').fetchone()[0] == 0
@@ -0,0 +1,69 @@
+import gzip
+import json
+
+import pytest
+from flaskr.assets import build_assets, load_manifest
+
+@pytest.fixture
+def static_app(app, tmp_path):
+    (tmp_path / 'style.css').write_text('body { color: black; }\n' * 20)
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'img' / 'logo.png').write_bytes(b'\x89PNG fake')
+    app.static_folder = str(tmp_path)
+    return app
+
+def test_build_assets(static_app, tmp_path):
+    manifest = build_assets(str(tmp_path))
+
+    path = manifest['style.css']['path']
+    assert path.startswith('dist/style.') and path.endswith('.css')
+    assert 'gzip' in manifest['style.css']['encodings']
+    assert manifest['img/logo.png']['encodings'] == []
+    assert gzip.decompress((tmp_path / (path + '.gz')).read_bytes()) == \
+        (tmp_path / 'style.css').read_bytes()
+    assert json.loads((tmp_path / 'dist' / 'manifest.json').read_text()) == manifest
+
+    # O mesmo conteúdo gera o mesmo nome, um novo conteúdo gera outro nome.
+    assert build_assets(str(tmp_path))['style.css']['path'] == path
+    (tmp_path / 'style.css').write_text('body { color: red; }')
+    assert build_assets(str(tmp_path))['style.css']['path'] != path
+
+def test_url_for_uses_manifest(static_app, client, tmp_path):
+    assert 'href="/static/style.css"' in client.get('/auth/login').get_data(as_text=True)
+
+    path = build_assets(str(tmp_path))['style.css']['path']
+    load_manifest(static_app)
+
+    assert f'href="/static/{path}"' in client.get('/auth/login').get_data(as_text=True)
+
+def test_serve_hashed_asset(static_app, client, tmp_path):
+    path = build_assets(str(tmp_path))['style.css']['path']
+    load_manifest(static_app)
+
+    response = client.get(f'/static/{path}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).startswith(b'body')
+    response.close()
+
+    response = client.get(f'/static/{path}')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'body')
+    response.close()
+
+def test_serve_unhashed_asset(static_app, client):
+    load_manifest(static_app)
+    response = client.get('/static/style.css')
+
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    response.close()
+
+def test_build_assets_command(static_app, runner):
+    result = runner.invoke(args=['build-assets'])
+
+    assert 'Built 2 assets.' in result.output
+    assert 'style.css' in static_app.extensions['flaskr_assets'].urls
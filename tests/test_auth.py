@@ -1,6 +1,8 @@
 import pytest
 from flask import g, session
+from flaskr.auth import invalidate_user
 from flaskr.db import get_db
+from flaskr.sessions import forget_user
 
 def test_register(client, app):
     assert client.get('/auth/register').status_code == 200
@@ -14,6 +16,24 @@ def test_register(client, app):
             "SELECT * FROM user WHERE username = 'a'",
         ).fetchone() is not None
 
+def test_writer_not_held_while_hashing(client, app, monkeypatch):
+    import flaskr.auth
+    from flaskr.passwords import hash_password_async
+
+    held = []
+
+    async def hash_and_check(password):
+        held.append('write_db' in g)
+        return await hash_password_async(password)
+
+    monkeypatch.setattr(flaskr.auth, 'hash_password_async', hash_and_check)
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    client.post('/auth/register', data={'username': 'a', 'password': 'a'})
+    # O hash do data.sql usa outro custo, então o login também recalcula o hash.
+    client.post('/auth/login', data={'username': 'test', 'password': 'test'})
+
+    assert held == [False, False]
+
 @pytest.mark.parametrize(('username', 'password', 'message'), (
         ('', '', b'Username is required.'),
         ('a', '', b'Password is required.'),
@@ -52,3 +72,39 @@ def test_logout(client, auth):
     with client:
         auth.logout()
         assert 'user_id' not in session
+
+def test_user_cache(app, client, auth):
+    auth.login()
+    client.get('/').data
+
+    # O usuário vem do Cache, mesmo depois de a linha ser alterada diretamente no Banco de Dados.
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE user SET username = 'renamed' WHERE id = 1")
+        db.commit()
+
+    assert b'<span>renamed</span>' not in client.get('/').data
+
+    with app.app_context():
+        invalidate_user(1)
+
+    assert b'<span>renamed</span>' in client.get('/').data
+
+@pytest.mark.parametrize('app_config', ({'SESSION_STORE': 'sqlite'},))
+def test_user_loaded_lazily(app, client, auth, monkeypatch):
+    auth.login()
+    calls = []
+    monkeypatch.setattr('flaskr.auth.get_user', lambda id: calls.append(id))
+
+    client.get('/hello')
+    assert calls == []
+
+    # A linha do usuário chega junto com a sessão guardada no servidor, sem consultar o usuário.
+    assert b'<span>test</span>' in client.get('/').data
+    assert calls == []
+
+    with app.app_context():
+        forget_user(1)
+
+    client.get('/create')
+    assert calls == [1]
@@ -0,0 +1,41 @@
+import json
+
+from flaskr.bench import compare, percentile
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+def test_compare():
+    baseline = {'endpoints': {'index': {'requests': 10, 'p95': 10.0, 'throughput': 100.0}}}
+    same = {'endpoints': {'index': {'requests': 10, 'p95': 11.0, 'throughput': 90.0}}}
+    slower = {'endpoints': {'index': {'requests': 10, 'p95': 13.0, 'throughput': 70.0}}}
+    assert compare(same, baseline, 0.2) == []
+    assert len(compare(slower, baseline, 0.2)) == 2
+
+def test_bench_command(runner, tmp_path):
+    output = tmp_path / 'bench.json'
+    result = runner.invoke(args=[
+        'bench', '--users', '2', '--posts', '3', '--requests', '3',
+        '--concurrency', '1', '--endpoint', 'index', '--endpoint', 'delete',
+        '--output', str(output),
+    ])
+    assert result.exit_code == 0, result.output
+    results = json.loads(output.read_text())
+    assert set(results['endpoints']) == {'index', 'delete'}
+    assert results['endpoints']['index']['errors'] == 0
+    assert results['endpoints']['delete']['requests'] == 3
+
+    # Uma execução mais lenta do que o limite termina com erro
+    results['endpoints']['index']['p95'] = 0.000001
+    output.write_text(json.dumps(results))
+    result = runner.invoke(args=[
+        'bench', '--users', '2', '--posts', '3', '--requests', '3',
+        '--endpoint', 'index', '--baseline', str(output),
+    ])
+    assert result.exit_code == 1
+    assert 'Regression: index' in result.output
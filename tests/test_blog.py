@@ -40,6 +40,7 @@ def test_author_required(app, client, auth):
 @pytest.mark.parametrize('path', (
     '/2/update',
     '/2/delete',
+    '/9223372036854775808/delete',
 ))
 
 def test_exists_required(client, auth, path):
@@ -85,3 +86,166 @@ def test_delete(client, auth, app):
         db = get_db()
         post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
         assert post is None
+
+def test_index_pagination(client, app):
+    app.config['POSTS_PER_PAGE'] = 2
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, '', 1, ?)",
+            [(f'post {i}', f'2018-01-0{i} 00:00:00') for i in range(2, 6)]
+        )
+        db.commit()
+
+    response = client.get('/')
+    assert b'post 5' in response.data and b'post 4' in response.data
+    assert b'post 3' not in response.data
+    assert b'Newer' not in response.data
+    assert b'before=2018-01-04+00%3A00%3A00%2C4' in response.data
+
+    response = client.get('/?before=2018-01-04 00:00:00,4')
+    assert b'post 3' in response.data and b'post 2' in response.data
+    assert b'post 4' not in response.data
+    assert b'after=2018-01-03+00%3A00%3A00%2C3' in response.data
+
+    response = client.get('/?before=2018-01-02 00:00:00,2')
+    assert b'test title' in response.data
+    assert b'Older' not in response.data
+
+    response = client.get('/?after=2018-01-03 00:00:00,3')
+    assert b'post 5' in response.data and b'post 4' in response.data
+    assert b'Newer' not in response.data
+
+def test_index_invalid_cursor(client):
+    assert client.get('/?before=nope').status_code == 400
+    assert client.get('/?before=2018-01-01,9223372036854775808').status_code == 400
+    assert client.get('/?after=2018-01-01,99999999999999999999999').status_code == 400
+
+def test_huge_ids_are_rejected(client):
+    assert client.get('/9223372036854775808').status_code == 404
+    assert client.get('/search?q=body&page=9223372036854775807').status_code == 400
+
+def test_search(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id)"
+            " VALUES ('<b>Flask</b> pagination', 'keyset pages', 1)"
+        )
+        db.commit()
+
+    response = client.get('/search?q=flask')
+    assert b'<mark>Flask</mark>' in response.data
+    assert b'&lt;b&gt;' in response.data
+    assert b'test title' not in response.data
+
+    response = client.get('/search?q=body')
+    assert b'test title' in response.data
+
+    assert b'No posts found.' in client.get('/search?q=%22nothing').data
+
+def test_search_follows_updates(client, auth, app):
+    auth.login()
+    client.post('/1/update', data={'title': 'renamed', 'body': 'fresh words'})
+    assert b'renamed' in client.get('/search?q=fresh').data
+    assert b'renamed' not in client.get('/search?q=body').data
+
+    client.post('/1/delete')
+    assert b'No posts found.' in client.get('/search?q=fresh').data
+
+def test_search_pagination(client, app):
+    app.config['POSTS_PER_PAGE'] = 1
+
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('more', 'body', 1)"
+        )
+        db.commit()
+
+    response = client.get('/search?q=body')
+    assert b'page=2' in response.data
+    response = client.get('/search?q=body&page=2')
+    assert b'page=1' in response.data
+    assert b'page=3' not in response.data
+
+def test_rebuild_search_index(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.executescript("DROP TRIGGER post_fts_insert; DROP TABLE post_fts;")
+
+    result = runner.invoke(args=['rebuild-search-index'])
+    assert 'Rebuilt' in result.output
+
+    with app.app_context():
+        assert get_db().execute(
+            "SELECT COUNT(*) FROM post_fts WHERE post_fts MATCH 'body'"
+        ).fetchone()[0] == 1
+
+def test_author_page(client, app):
+    app.config['POSTS_PER_PAGE'] = 2
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES (?, '', ?, ?)",
+            [(f'post {i}', 1 + i % 2, f'2018-01-0{i} 00:00:00') for i in range(2, 8)]
+        )
+        db.commit()
+
+    response = client.get('/u/test')
+    assert b'4 posts' in response.data
+    assert b'post 6' in response.data and b'post 4' in response.data
+    assert b'post 7' not in response.data
+    assert b'before=2018-01-04+00%3A00%3A00%2C4' in response.data
+
+    response = client.get('/u/test?before=2018-01-04 00:00:00,4')
+    assert b'post 2' in response.data and b'test title' in response.data
+    assert b'Older' not in response.data
+
+    response = client.get('/u/other')
+    assert b'3 posts' in response.data
+    assert b'test title' not in response.data
+
+    assert client.get('/u/nobody').status_code == 404
+    assert client.get('/u/test?after=nope').status_code == 400
+
+def test_author_post_count_triggers(app):
+    with app.app_context():
+        db = get_db()
+        count = lambda author_id: db.execute(
+            "SELECT post_count FROM author_stats WHERE author_id = ?", (author_id,)
+        ).fetchone()[0]
+        assert count(1) == 1
+
+        id = db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('x', '', 2)"
+        ).lastrowid
+        assert count(2) == 1
+
+        db.execute("UPDATE post SET author_id = 1 WHERE id = ?", (id,))
+        assert (count(1), count(2)) == (2, 0)
+
+        db.execute("DELETE FROM post WHERE author_id = 1")
+        assert count(1) == 0
+        db.rollback()
+
+def test_author_page_follows_writes(client, auth):
+    assert b'1 post<' in client.get('/u/test').data
+
+    auth.login()
+    client.post('/create', data={'title': 'another', 'body': ''})
+    auth.logout()
+    response = client.get('/u/test')
+    assert b'2 posts' in response.data
+    assert b'another' in response.data
+
+    auth.login()
+    client.post('/1/delete')
+    auth.logout()
+    response = client.get('/u/test')
+    assert b'1 post<' in response.data
+    assert b'test title' not in response.data
@@ -0,0 +1,88 @@
+import time
+
+from flaskr.cache import PageCache, TTLCache
+from flaskr.db import get_db
+
+def test_ttl_cache_lru():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # 'b' foi usado há mais tempo, então foi descartado
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+def test_ttl_cache_expires():
+    cache = TTLCache(ttl=0.01)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=None)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+def test_page_cache_tags():
+    class Page(object):
+        tags = ('post:1', 'posts:head')
+
+    cache = PageCache(TTLCache())
+    cache.set('index', Page())
+    cache.invalidate('post:2')
+    assert cache.get('index') is not None
+    cache.invalidate('post:1')
+    assert cache.get('index') is None
+
+    generation = cache.generation()
+    cache.invalidate('post:3')
+    cache.set('index', Page(), generation)
+    assert cache.get('index') is None
+
+def change_title(app, id, title):
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE post SET title = ? WHERE id = ?', (title, id))
+        db.commit()
+
+def test_index_cached(client, app):
+    assert b'test title' in client.get('/').data
+    change_title(app, 1, 'changed')
+    # A página vem do Cache, a alteração direta no Banco de Dados não invalida a página
+    assert b'test title' in client.get('/').data
+
+    app.config['PAGE_CACHE'] = False
+    response = client.get('/')
+    assert response.is_streamed
+    assert b'changed' in response.data
+
+def test_index_conditional(client):
+    response = client.get('/')
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    response = client.get('/', headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_writes_invalidate(client, auth, app):
+    app.config['POSTS_PER_PAGE'] = 1
+    auth.login()
+    client.post('/create', data={'title': 'created', 'body': ''})
+    assert b'created' in client.get('/').data
+    assert b'test title' in client.get('/?before=2019-01-01 00:00:00,1').data
+
+    client.post('/2/update', data={'title': 'updated', 'body': ''})
+    assert b'updated' in client.get('/').data
+
+    # Páginas que não exibem a postagem alterada permanecem no Cache
+    change_title(app, 1, 'changed')
+    assert b'test title' in client.get('/?before=2019-01-01 00:00:00,1').data
+
+    client.post('/1/delete')
+    assert b'test title' not in client.get('/?before=2019-01-01 00:00:00,1').data
+
+def test_flashes_bypass_cache(client, auth):
+    auth.login()
+    client.get('/').data
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'flashed')]
+    assert b'flashed' in client.get('/').data
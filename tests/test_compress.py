@@ -0,0 +1,76 @@
+import gzip
+
+import pytest
+from flaskr.cache import get_page_cache
+from flaskr.compress import compress_stream
+
+@pytest.fixture
+def compressed(app):
+    app.config['COMPRESS_MIN_SIZE'] = 1
+    return app
+
+def test_gzip_cached_page(compressed, client):
+    plain = client.get('/')
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert response.get_etag() == (plain.get_etag()[0], True)
+
+    # Os bytes comprimidos ficam guardados na página, e são reaproveitados.
+    with compressed.test_request_context('/'):
+        pages = [
+            entry[0][0] for key, entry in get_page_cache().backend._data.items()
+            if key.startswith('page:')
+        ]
+    assert pages[0].encoded('gzip', 6) is pages[0].encoded('gzip', 6)
+    assert client.get('/', headers={'Accept-Encoding': 'gzip'}).data == response.data
+
+def test_conditional_request(compressed, client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    response = client.get(
+        '/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}
+    )
+    assert response.status_code == 304
+
+def test_streamed_response(compressed, client):
+    compressed.config['PAGE_CACHE'] = False
+    plain = client.get('/').data
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.data) == plain
+
+def test_compress_stream():
+    chunks = iter(['a' * 100, 'b' * 100, 'c' * 100])
+    parts = list(compress_stream(chunks, 'gzip', 6))
+
+    assert len(parts) == 4
+    assert gzip.decompress(b''.join(parts)) == b'a' * 100 + b'b' * 100 + b'c' * 100
+
+@pytest.mark.parametrize(('headers', 'config'), (
+    ({}, {}),
+    ({'Accept-Encoding': 'gzip;q=0'}, {}),
+    ({'Accept-Encoding': 'gzip'}, {'COMPRESS': False}),
+    ({'Accept-Encoding': 'gzip'}, {'COMPRESS_MIN_SIZE': 10 ** 6}),
+))
+def test_not_compressed(compressed, client, headers, config):
+    compressed.config.update(config)
+    response = client.get('/', headers=headers)
+
+    assert 'Content-Encoding' not in response.headers
+    assert b'test title' in response.data
+
+def test_other_mimetypes_not_compressed(compressed, client):
+    compressed.add_url_rule(
+        '/binary', 'binary', lambda: ('x' * 100, {'Content-Type': 'image/png'})
+    )
+    response = client.get('/binary', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
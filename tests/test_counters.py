@@ -0,0 +1,83 @@
+import sqlite3
+import threading
+
+from flaskr.counters import ShardedCounter, get_view_counter
+from flaskr.db import close_pool, get_db
+
+def test_sharded_counter():
+    counter = ShardedCounter()
+
+    def work():
+        for i in range(1000):
+            counter.add(i % 3)
+
+    threads = [threading.Thread(target=work) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.drain() == {0: 1336, 1: 1332, 2: 1332}
+    assert counter.drain() == {}
+    # As partes das threads encerradas são descartadas.
+    assert counter._shards == []
+
+def test_detail_counts_views(app, client):
+    app.config['PAGE_CACHE'] = False
+    response = client.get('/1')
+    assert b'test title' in response.data
+    assert b'0 views' in response.data
+    client.get('/1')
+
+    with app.app_context():
+        assert get_db().execute('SELECT views FROM post WHERE id = 1').fetchone()[0] == 0
+        assert get_view_counter().flush() == 1
+        assert get_db().execute('SELECT views FROM post WHERE id = 1').fetchone()[0] == 2
+
+    assert b'2 views' in client.get('/1').data
+    assert client.get('/2').status_code == 404
+
+def test_close_flushes_views(app, client):
+    client.get('/1')
+
+    with app.app_context():
+        close_pool()
+        assert get_db().execute('SELECT views FROM post WHERE id = 1').fetchone()[0] == 1
+
+def test_failed_flush_keeps_counts(app, monkeypatch):
+    with app.app_context():
+        counter = get_view_counter()
+        counter.counter.add(1, 5)
+
+        def fail():
+            raise sqlite3.OperationalError('database is locked')
+
+        monkeypatch.setattr(counter.pools[0], 'acquire', fail)
+        assert counter.flush() == 0
+        monkeypatch.undo()
+
+        assert counter.flush() == 1
+        assert get_db().execute('SELECT views FROM post WHERE id = 1').fetchone()[0] == 5
+
+def test_popular(app, client):
+    app.config['PAGE_CACHE'] = False
+    assert b'No posts have been read yet.' in client.get('/popular').data
+
+    with app.app_context():
+        db = get_db()
+        db.executescript(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES ('second', '', 1, '2018-01-02 00:00:00');"
+            "UPDATE post SET views = 3 WHERE id = 1;"
+            "UPDATE post SET views = 7 WHERE id = 2;"
+        )
+        plan = ' '.join(row[3] for row in db.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM post WHERE views > 0'
+            ' ORDER BY views DESC, id DESC LIMIT 10'
+        ))
+        assert 'post_views' in plan
+        assert 'TEMP B-TREE' not in plan
+
+    data = client.get('/popular').data
+    assert data.index(b'second') < data.index(b'test title')
+    assert b'7 views' in data
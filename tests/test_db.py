@@ -1,7 +1,17 @@
+import gc
 import sqlite3
+import threading
+import time
+import weakref
 
 import pytest
-from flaskr.db import get_db
+from flaskr import create_app
+from flaskr.counters import get_view_counter
+from flaskr.db import (
+    close_apps, get_db, get_pool, get_read_db, get_write_db, use_reader, use_writer
+)
+from flaskr.groupcommit import get_group_writer
+from flaskr.render import get_stale_renders
 
 def test_get_close_db(app):
     with app.app_context():
@@ -24,3 +34,172 @@ def test_init_db_command(runner, monkeypatch):
     result = runner.invoke(args=['init-db'])
     assert 'Initialized' in result.output
     assert Recorder.called
+
+def test_pool_reuses_connection(app):
+    with app.app_context():
+        conn = get_db()._conn
+
+    with app.app_context():
+        assert get_db()._conn is conn
+
+def test_pool_pragmas(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert db.execute('PRAGMA synchronous').fetchone()[0] == 1
+        assert db.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+
+def test_pool_rolls_back_open_transaction(app):
+    with app.app_context():
+        get_db().execute("DELETE FROM post")
+
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+
+def test_pool_replaces_unhealthy_connection(app):
+    with app.app_context():
+        conn = get_db()._conn
+
+    conn.close()
+
+    with app.app_context():
+        db = get_db()
+        assert db._conn is not conn
+        assert db.execute('SELECT 1').fetchone()[0] == 1
+
+def test_pool_size_limit(app):
+    with app.app_context():
+        pool = get_pool()
+        pool.size, pool.timeout = 2, 0.1
+        held = [pool.acquire() for i in range(2)]
+        conns = [db._conn for db in held]
+
+        with pytest.raises(sqlite3.OperationalError, match='exhausted'):
+            pool.acquire()
+
+        # A thread que aguarda recebe a conexão devolvida, mesmo ociosa em outra thread.
+        pool.timeout = 5
+        waiting = []
+        thread = threading.Thread(target=lambda: waiting.append(pool.acquire()))
+        thread.start()
+        time.sleep(0.1)
+        held[0].close()
+        thread.join()
+        assert waiting[0]._conn is conns[0]
+
+        # A thread já tem uma conexão ociosa, então a segunda é fechada.
+        waiting[0].close()
+        held[1].close()
+        assert list(pool._idle) == [threading.get_ident()]
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[1].execute('SELECT 1')
+
+def test_get_db_read_write_split(app):
+    with app.test_request_context('/', method='GET'):
+        db = get_db()
+        assert db is get_read_db()
+        assert db.execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+
+        with pytest.raises(sqlite3.OperationalError) as e:
+            db.execute('DELETE FROM post')
+
+        assert 'readonly' in str(e.value)
+
+    with app.test_request_context('/', method='POST'):
+        assert get_db() is get_write_db()
+
+    with app.app_context():
+        assert get_db() is get_write_db()
+
+def test_view_decorators(app):
+    @app.route('/reader', methods=('POST',))
+    @use_reader
+    def reader():
+        return 'write' if get_db() is get_write_db() else 'read'
+
+    @app.route('/writer')
+    @use_writer
+    def writer():
+        return 'write' if get_db() is get_write_db() else 'read'
+
+    client = app.test_client()
+    assert client.post('/reader').data == b'read'
+    assert client.get('/writer').data == b'write'
+
+def test_read_replica(app, tmp_path):
+    replica = str(tmp_path / 'replica.sqlite')
+    conn = sqlite3.connect(replica)
+    conn.executescript("CREATE TABLE post (id INTEGER); INSERT INTO post VALUES (7);")
+    conn.close()
+    app.config['DATABASE_REPLICA'] = replica
+
+    with app.test_request_context('/'):
+        assert get_db().execute('SELECT id FROM post').fetchone()[0] == 7
+
+def test_read_replica_path_with_special_characters(app, tmp_path):
+    replica = str(tmp_path / 'replica #1?100%.sqlite')
+    conn = sqlite3.connect(replica)
+    conn.executescript("CREATE TABLE post (id INTEGER); INSERT INTO post VALUES (8);")
+    conn.close()
+    app.config['DATABASE_REPLICA'] = replica
+
+    with app.test_request_context('/'):
+        assert get_db().execute('SELECT id FROM post').fetchone()[0] == 8
+
+def test_single_writer(app):
+    with app.app_context():
+        get_pool(writer=True).timeout = 0.1
+        db = get_write_db()
+        errors = []
+
+        def write():
+            with app.app_context():
+                try:
+                    get_write_db()
+                except sqlite3.OperationalError as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        assert 'locked' in str(errors[0])
+
+        # A mesma thread pode obter o escritor novamente, num Contexto aninhado.
+        with app.app_context():
+            assert get_write_db()._conn is db._conn
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join()
+    assert len(errors) == 1
+
+# As threads do aplicativo não o mantêm na memória, e ao final do processo ('close_apps'), as contagens
+# pendentes dos aplicativos ainda existentes são gravadas.
+def test_apps_closed_at_exit(app):
+    other = create_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+
+    with other.app_context():
+        get_view_counter().record(1)
+        get_stale_renders().add([1])
+        writer = get_group_writer()
+        writer.submit("UPDATE post SET title = 'group' WHERE id = 1").result(timeout=5)
+        counter = get_view_counter()
+
+    close_apps()
+
+    with app.app_context():
+        assert tuple(get_db().execute('SELECT title, views FROM post WHERE id = 1').fetchone()) == ('group', 1)
+
+    assert writer.closed and counter._stop.is_set()
+
+    with other.app_context():
+        get_view_counter().record(1)
+        get_stale_renders().add([1])
+        counter = get_view_counter()
+
+    ref = weakref.ref(other)
+    del other
+    gc.collect()
+    assert ref() is None
+    counter.close()
@@ -0,0 +1,90 @@
+import pytest
+from flaskr.edge import HTTPPurgeTarget, RecordingPurgeTarget
+from flaskr.jobs import Worker
+
+@pytest.fixture
+def purges(app):
+    target = app.config['EDGE_PURGE_TARGET'] = RecordingPurgeTarget()
+    app.config['EDGE_PURGE_QUEUE'] = False
+    return target
+
+@pytest.mark.parametrize('page_cache', (True, False))
+def test_anonymous_pages_are_public(client, app, page_cache):
+    app.config['PAGE_CACHE'] = page_cache
+    response = client.get('/u/test')
+
+    assert response.headers['Cache-Control'] == 'public, max-age=0, s-maxage=3600'
+    assert 'Cookie' in response.vary
+    assert response.headers['Surrogate-Key'] == 'author:1 post:1 user:1'
+
+    response = client.get('/')
+    assert response.cache_control.public == page_cache
+    if page_cache:
+        assert 'posts:head' in response.headers['Surrogate-Key'].split()
+
+@pytest.mark.parametrize('page_cache', (True, False))
+def test_detail_is_not_public(client, app, page_cache):
+    # A página conta as visualizações, então cada leitura precisa chegar ao servidor.
+    app.config['PAGE_CACHE'] = page_cache
+    response = client.get('/1')
+
+    assert response.cache_control.private
+    assert 'Surrogate-Key' not in response.headers
+
+def test_authenticated_pages_are_private(client, auth):
+    auth.login()
+
+    for path in ('/', '/1', '/create', '/auth/login'):
+        response = client.get(path)
+        assert response.cache_control.private
+        assert response.cache_control.no_cache
+        assert 'Surrogate-Key' not in response.headers
+
+def test_other_responses_are_private(client):
+    response = client.get('/auth/login')
+    assert response.cache_control.private
+
+    response = client.post('/auth/login', data={'username': 'a', 'password': 'a'})
+    assert response.cache_control.private
+    assert 'Surrogate-Key' not in response.headers
+
+def test_policy_can_be_disabled(client, app):
+    app.config['EDGE_CACHE'] = False
+    assert 'Cache-Control' not in client.get('/1').headers
+
+def test_purge_events(client, auth, purges):
+    auth.login()
+    purges.drain()
+    client.post('/create', data={'title': 'new', 'body': ''})
+    client.post('/1/update', data={'title': 'changed', 'body': ''})
+    client.post('/1/delete')
+
+    assert purges.drain() == [('author:1', 'posts:head'), ('post:1',), ('author:1', 'post:1')]
+
+def test_purge_through_the_queue(client, auth, app, purges):
+    app.config['EDGE_PURGE_QUEUE'] = True
+    auth.login()
+    client.post('/1/update', data={'title': 'changed', 'body': ''})
+    assert purges.events == []
+
+    Worker(app, burst=True).run()
+    # O login também invalida as páginas do usuário (o hash da senha é atualizado).
+    assert purges.drain() == [('user:1',), ('post:1',)]
+
+def test_http_purge_target(monkeypatch):
+    sent = []
+
+    class Response(object):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+    def urlopen(request, timeout):
+        sent.append((request.full_url, request.get_method(), request.get_header('Surrogate-key')))
+        return Response()
+
+    monkeypatch.setattr('urllib.request.urlopen', urlopen)
+    HTTPPurgeTarget('http://cdn.test/purge').purge(['post:1', 'user:2'])
+    assert sent == [('http://cdn.test/purge', 'POST', 'post:1 user:2')]
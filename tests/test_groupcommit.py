@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+
+import pytest
+from flaskr.db import close_pool, get_db, get_pool, get_write_db, write, write_many
+from flaskr.groupcommit import GroupCommitWriter, get_group_writer
+
+def test_batch_commits_together(app, monkeypatch):
+    commits = []
+
+    with app.app_context():
+        writer = GroupCommitWriter(get_pool(writer=True), window=0.2, max_ops=3)
+        original = writer._commit
+        monkeypatch.setattr(
+            writer, '_commit', lambda batch: (commits.append(len(batch)), original(batch))
+        )
+        futures = [
+            writer.submit(
+                "INSERT INTO post (title, body, author_id) VALUES (?, '', 1)", (f'p{i}',)
+            )
+            for i in range(4)
+        ]
+        results = [future.result(timeout=5) for future in futures]
+        writer.close()
+
+        assert commits == [3, 1]
+        assert all(rowcount == 1 for lastrowid, rowcount in results)
+        assert get_db().execute(
+            "SELECT count(*) FROM post WHERE title LIKE 'p%'"
+        ).fetchone()[0] == 4
+
+def test_error_isolated_to_operation(app):
+    with app.app_context():
+        writer = GroupCommitWriter(get_pool(writer=True), window=0.2)
+        good = writer.submit("UPDATE post SET title = 'changed' WHERE id = 1")
+        bad = writer.submit("INSERT INTO user (username, password) VALUES ('test', 'x')")
+        writer.close()
+
+        assert good.result()[1] == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            bad.result()
+        assert get_db().execute('SELECT title FROM post WHERE id = 1').fetchone()[0] == 'changed'
+
+def test_submit_many_is_atomic(app):
+    with app.app_context():
+        writer = GroupCommitWriter(get_pool(writer=True), window=0.2)
+        good = writer.submit_many([
+            ("INSERT INTO post (title, body, author_id) VALUES ('many', '', 1)", ()),
+            ("UPDATE post SET title = 'many' WHERE id = 1", ()),
+        ])
+        bad = writer.submit_many([
+            ("DELETE FROM post", ()),
+            ("INSERT INTO user (username, password) VALUES ('test', 'x')", ()),
+        ])
+        writer.close()
+
+        assert good.result() == [(2, 1), (2, 1)]
+        with pytest.raises(sqlite3.IntegrityError):
+            bad.result()
+        # O DELETE do grupo com erro também foi desfeito.
+        assert get_db().execute(
+            "SELECT count(*) FROM post WHERE title = 'many'"
+        ).fetchone()[0] == 2
+
+def test_close_flushes_pending_writes(app):
+    app.config.update(GROUP_COMMIT=True, GROUP_COMMIT_WINDOW=10)
+
+    with app.app_context():
+        writer = get_group_writer()
+        future = writer.submit("DELETE FROM post WHERE id = 1")
+        close_pool()
+        assert future.result(timeout=0)[1] == 1
+
+        with pytest.raises(RuntimeError):
+            writer.submit("DELETE FROM post")
+        assert get_db().execute('SELECT count(*) FROM post').fetchone()[0] == 0
+
+def test_concurrent_requests(app):
+    app.config['GROUP_COMMIT'] = True
+    app.config['GROUP_COMMIT_WINDOW'] = 0.05
+    clients = [app.test_client() for i in range(5)]
+    responses = []
+
+    for client in clients:
+        client.post('/auth/login', data={'username': 'test', 'password': 'test'})
+
+    def post(client, i):
+        responses.append(client.post('/create', data={'title': f'burst {i}', 'body': ''}))
+
+    threads = [threading.Thread(target=post, args=(c, i)) for i, c in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [302] * 5
+    # A postagem já aparece no redirecionamento (read-your-writes).
+    assert b'burst 0' in clients[0].get('/').data
+
+def test_write_uses_held_writer(app):
+    app.config['GROUP_COMMIT'] = True
+
+    with app.test_request_context('/', method='POST'):
+        get_write_db()
+        assert write("UPDATE post SET title = 'direct' WHERE id = 1")[1] == 1
+        assert 'flaskr_group_commit' not in app.extensions
+
+def test_write_many_rolls_back_only_its_statements(app):
+    with app.test_request_context('/', method='POST'):
+        db = get_write_db()
+        db.execute("UPDATE post SET title = 'kept' WHERE id = 1")
+
+        with pytest.raises(sqlite3.IntegrityError):
+            write_many([
+                ("DELETE FROM post", ()),
+                ("INSERT INTO user (username, password) VALUES ('test', 'x')", ()),
+            ])
+
+        assert db.in_transaction
+        db.commit()
+        assert get_db().execute('SELECT title FROM post').fetchall()[0][0] == 'kept'
@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+
+import pytest
+from flaskr.db import get_db
+from flaskr.jobs import Worker, backoff, enqueue, task
+from flaskr.metrics import get_registry
+
+calls = []
+
+@task('test.record')
+def record(value):
+    calls.append((value, threading.current_thread().name))
+
+@task('test.flaky')
+def flaky(fails):
+    calls.append(fails)
+
+    if len(calls) <= fails:
+        raise RuntimeError('try again')
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+def job_row(app, id):
+    with app.app_context():
+        return get_db().execute('SELECT * FROM job WHERE id = ?', (id,)).fetchone()
+
+def run_worker(app, threads=1):
+    Worker(app, threads=threads, burst=True).run()
+
+def test_enqueue_and_run(app):
+    with app.app_context():
+        ids = [enqueue(record, value=i) for i in range(10)]
+
+    run_worker(app, threads=3)
+
+    assert sorted(value for value, thread in calls) == list(range(10))
+    assert all(job_row(app, id)['status'] == 'done' for id in ids)
+
+    with app.app_context():
+        registry = get_registry()
+        assert registry['flaskr_jobs_total'].get('test.record', 'done') == 10
+        assert registry['flaskr_job_wait_seconds'].get('test.record') == 10
+
+def test_idempotency_key(app):
+    with app.app_context():
+        first = enqueue('test.record', key='welcome:1', value='a')
+        assert enqueue('test.record', key='welcome:1', value='b') == first
+
+    run_worker(app)
+    assert [value for value, thread in calls] == ['a']
+
+def test_idempotency_key_with_lagging_replica(app, tmp_path):
+    # A réplica ainda não tem a tarefa, o id é lido do próprio Banco de Dados.
+    replica = str(tmp_path / 'replica.sqlite')
+    conn = sqlite3.connect(replica)
+    conn.executescript('CREATE TABLE job (id INTEGER, key TEXT);')
+    conn.close()
+    app.config['DATABASE_REPLICA'] = replica
+
+    with app.test_request_context('/'):
+        first = enqueue('test.record', key='welcome:1', value='a')
+        assert enqueue('test.record', key='welcome:1', value='b') == first
+
+def test_retry_with_backoff(app):
+    app.config['JOB_BACKOFF'] = 0
+
+    with app.app_context():
+        id = enqueue(flaky, fails=2)
+
+    run_worker(app)
+    row = job_row(app, id)
+    assert row['status'] == 'done'
+    assert row['attempts'] == 3
+    assert calls == [2, 2, 2]
+
+    assert [backoff(attempt, 2, 10) for attempt in range(1, 6)] == [2, 4, 8, 10, 10]
+
+def test_failed_after_max_attempts(app):
+    with app.app_context():
+        id = enqueue(flaky, fails=5, max_attempts=1)
+        unknown = enqueue('test.missing')
+
+    run_worker(app)
+
+    row = job_row(app, id)
+    assert row['status'] == 'failed'
+    assert row['error'] == 'RuntimeError: try again'
+
+    # A espera padrão (JOB_BACKOFF) mantém a tarefa desconhecida na fila, para a próxima tentativa.
+    row = job_row(app, unknown)
+    assert row['status'] == 'queued'
+    assert row['run_at'] > row['started']
+    assert 'Unknown task' in row['error']
+
+def test_delayed_and_expired_jobs(app):
+    with app.app_context():
+        later = enqueue(record, delay=60, value='later')
+        stuck = enqueue(record, value='stuck')
+        # Uma tarefa retirada por um worker que parou, com o prazo já vencido.
+        db = get_db()
+        db.execute(
+            "UPDATE job SET status = 'running', attempts = 1, run_at = 0 WHERE id = ?", (stuck,)
+        )
+        db.commit()
+
+    run_worker(app)
+
+    assert [value for value, thread in calls] == ['stuck']
+    assert job_row(app, later)['status'] == 'queued'
+    assert job_row(app, stuck)['attempts'] == 2
+
+def test_purge_done_jobs(app):
+    app.config['JOB_RETENTION'] = -1
+
+    with app.app_context():
+        id = enqueue(record, value=1)
+
+    run_worker(app)
+    run_worker(app)
+    assert job_row(app, id) is None
+
+def test_queue_metrics(client, app):
+    app.config['METRICS_TOKEN'] = 'secret'
+
+    with app.app_context():
+        enqueue(record, value=1)
+        enqueue(record, value=2)
+
+    text = client.get(
+        '/metrics', headers={'Authorization': 'Bearer secret'}
+    ).get_data(as_text=True)
+    assert 'flaskr_job_queue_depth{status="queued"} 2' in text
+    assert 'flaskr_job_queue_age_seconds ' in text
+
+def test_worker_command(app, runner, tmp_path):
+    with app.app_context():
+        enqueue(record, value='cli')
+
+    metrics = tmp_path / 'jobs.prom'
+    result = runner.invoke(args=['worker', '--burst', '--metrics-file', str(metrics)])
+
+    assert 'test.record' in result.output
+    assert [value for value, thread in calls] == ['cli']
+    assert 'flaskr_jobs_total{task="test.record",status="done"} 1' in metrics.read_text()
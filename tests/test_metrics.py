@@ -0,0 +1,94 @@
+import logging
+
+import pytest
+from flaskr.metrics import Histogram, Registry, get_registry, normalize_sql
+
+@pytest.fixture
+def app_config():
+    return {'METRICS_TOKEN': 'secret'}
+
+def get_metrics(client, token='secret'):
+    return client.get('/metrics', headers={'Authorization': f'Bearer {token}'})
+
+def test_normalize_sql():
+    assert normalize_sql(
+        "SELECT *  FROM post\n WHERE id = 12 AND title = 'it''s'"
+    ) == 'SELECT * FROM post WHERE id = ? AND title = ?'
+    assert normalize_sql('SELECT * FROM post WHERE id = ?') == \
+        'SELECT * FROM post WHERE id = ?'
+
+def test_histogram_exposition():
+    registry = Registry()
+    histogram = registry.register(
+        Histogram('latency_seconds', 'Latency.', ('path',), buckets=(0.1, 1.0))
+    )
+    histogram.observe(0.05, '/')
+    histogram.observe(0.5, '/')
+    histogram.observe(5, '/')
+    text = registry.expose()
+
+    assert '# TYPE latency_seconds histogram' in text
+    assert 'latency_seconds_bucket{path="/",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{path="/",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{path="/",le="+Inf"} 3' in text
+    assert 'latency_seconds_sum{path="/"} 5.55' in text
+    assert 'latency_seconds_count{path="/"} 3' in text
+
+def test_metrics_endpoint(client):
+    client.get('/').data
+    client.get('/').data
+    response = get_metrics(client)
+
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'flaskr_requests_total{endpoint="blog.index",method="GET",status="200"} 2' in text
+    assert 'flaskr_request_duration_seconds_count{endpoint="blog.index"} 2' in text
+    assert 'flaskr_template_render_seconds_count{template="blog/index.html"}' in text
+    assert 'flaskr_db_query_duration_seconds_count{query="SELECT p.id' in text
+
+def test_metrics_require_token(app, client):
+    assert client.get('/metrics').status_code == 401
+    response = get_metrics(client, 'wrong')
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer realm="metrics"'
+
+    # Sem o 'METRICS_TOKEN', a URL não existe.
+    app.config['METRICS_TOKEN'] = None
+    assert get_metrics(client).status_code == 404
+
+def test_streamed_template_timed(app, client):
+    app.config['PAGE_CACHE'] = False
+    client.get('/').data
+
+    with app.app_context():
+        histogram = get_registry()['flaskr_template_render_seconds']
+        assert histogram.get('blog/index.html') == 1
+
+def test_queries_recorded(app, client):
+    client.get('/search?q=test').data
+
+    with app.app_context():
+        histogram = get_registry()['flaskr_db_query_duration_seconds']
+        queries = [labels[0] for labels in histogram._values]
+
+    assert any('post_fts MATCH ?' in q for q in queries)
+
+def test_slow_request_logged(app, client, caplog):
+    app.config['SLOW_REQUEST_THRESHOLD'] = 0
+
+    with caplog.at_level(logging.WARNING):
+        client.get('/').data
+
+    assert 'Slow request GET /?' in caplog.text
+    assert 'queries in' in caplog.text
+
+    with app.app_context():
+        assert get_registry()['flaskr_slow_requests_total'].get('blog.index') == 1
+
+def test_slow_request_disabled(app, client, caplog):
+    app.config['SLOW_REQUEST_THRESHOLD'] = None
+
+    with caplog.at_level(logging.WARNING):
+        client.get('/').data
+
+    assert 'Slow request' not in caplog.text
@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+from flask import current_app
+from flaskr.db import get_db
+from flaskr.migrate import get_migrations, get_version, upgrade
+
+def reset_to_schema():
+    db = get_db()
+    with current_app.open_resource('schema.sql') as f:
+        db.executescript(f.read().decode('utf-8'))
+    db.executescript(
+        "INSERT INTO user (username, password) VALUES ('a', 'x'), ('b', 'x');"
+        "INSERT INTO post (title, body, author_id) VALUES ('t', 'b', 1), ('u', 'c', 2);"
+    )
+    return db
+
+def test_init_db_is_latest(app):
+    with app.app_context():
+        assert get_version() == len(get_migrations())
+        assert upgrade() == []
+
+def test_upgrade_existing_database(app):
+    with app.app_context():
+        db = reset_to_schema()
+        assert get_version() == 0
+
+        assert upgrade(target=1) == [(1, 'post_author_index')]
+        assert get_version() == 1
+
+        assert upgrade() == [(2, 'post_author_name'), (3, 'sessions'), (4, 'post_views'),
+                             (5, 'jobs'), (6, 'post_body_html'),
+                             (7, 'author_stats'), (8, 'import_checkpoint')]
+        names = [row[0] for row in db.execute(
+            'SELECT author_name FROM post ORDER BY id'
+        )]
+        assert names == ['a', 'b']
+
+def test_upgrade_adds_keyset_index(app):
+    with app.app_context():
+        db = reset_to_schema()
+        # Os Bancos de Dados criados antes da paginação por chave não têm o índice.
+        db.execute('DROP INDEX post_created_id')
+        upgrade(target=1)
+
+        assert db.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'post_created_id'"
+        ).fetchone() is not None
+
+def test_failed_migration_rolls_back(app):
+    with app.app_context():
+        db = reset_to_schema()
+        upgrade(target=1)
+        # Uma coluna com o mesmo nome faz o ALTER TABLE da migração 0002 falhar.
+        db.executescript('ALTER TABLE post ADD COLUMN author_name TEXT;')
+
+        with pytest.raises(sqlite3.OperationalError):
+            upgrade()
+
+        assert get_version() == 1
+        assert not db.in_transaction
+        assert db.execute(
+            "SELECT name FROM sqlite_master WHERE name = 'user_username_update'"
+        ).fetchone() is None
+
+def test_author_name_triggers(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT author_name FROM post WHERE id = 1').fetchone()[0] == 'test'
+
+        db.execute("UPDATE user SET username = 'renamed' WHERE id = 1")
+        assert db.execute('SELECT author_name FROM post WHERE id = 1').fetchone()[0] == 'renamed'
+
+        db.execute('UPDATE post SET author_id = 2 WHERE id = 1')
+        assert db.execute('SELECT author_name FROM post WHERE id = 1').fetchone()[0] == 'other'
+        db.commit()
+
+# As consultas do 'get_posts_page', o índice encontra as postagens na ordem da página (sem TEMP B-TREE),
+# e cada postagem é lida da tabela pelo rowid, pois o índice não tem o corpo (não é COVERING INDEX).
+@pytest.mark.parametrize(('where', 'parameters', 'expected'), (
+    ('', (), 'SCAN p USING INDEX post_created_id'),
+    ('WHERE (p.created, p.id) < (?, ?)', ('2020-01-01', 1),
+     'SEARCH p USING INDEX post_created_id (created<?)'),
+    ('WHERE p.author_id = ?', (1,), 'SEARCH p USING INDEX post_author_created (author_id=?)'),
+    ('WHERE p.author_id = ? AND (p.created, p.id) < (?, ?)', (1, '2020-01-01', 1),
+     'SEARCH p USING INDEX post_author_created (author_id=? AND created<?)'),
+))
+def test_listing_query_plans(app, where, parameters, expected):
+    with app.app_context():
+        plan = [row[3] for row in get_db().execute(
+            'EXPLAIN QUERY PLAN SELECT p.id, title, body, body_html, body_version, created,'
+            f' author_id, author_name AS username FROM post p {where}'
+            ' ORDER BY p.created DESC, p.id DESC LIMIT ?',
+            (*parameters, 6)
+        )]
+
+        assert plan == [expected]
+
+def test_migrate_commands(runner, app):
+    with app.app_context():
+        reset_to_schema()
+
+    result = runner.invoke(args=['migrate', 'status'])
+    assert '0001 post_author_index' in result.output
+    assert 'pending' in result.output
+    assert 'version 0' in result.output
+
+    result = runner.invoke(args=['migrate', 'upgrade'])
+    assert 'Applied 0002 post_author_name.' in result.output
+    with app.app_context():
+        assert f'version {len(get_migrations())}' in result.output
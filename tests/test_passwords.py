@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+from flaskr.db import get_db
+from flaskr.passwords import get_semaphore, hash_password, needs_rehash, run_hash_async
+
+def stored_password(app):
+    with app.app_context():
+        return get_db().execute("SELECT password FROM user WHERE id = 1").fetchone()[0]
+
+def test_needs_rehash(app):
+    with app.app_context():
+        current = hash_password('a')
+        assert not needs_rehash(current)
+        assert needs_rehash('pbkdf2:sha256:50000$TCI4GzcX$0de1')
+
+        app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:300000'
+        assert needs_rehash(current)
+
+# Sem as iterações no método configurado, o werkzeug usa o número padrão, e o hash não é recalculado a cada login.
+def test_method_without_iterations(app, auth):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+
+    with app.app_context():
+        assert not needs_rehash(hash_password('a'))
+
+    auth.login()
+    password = stored_password(app)
+    auth.login()
+    assert stored_password(app) == password
+
+def test_rehash_on_login(app, auth):
+    auth.login()
+
+    with app.app_context():
+        password = get_db().execute(
+            "SELECT password FROM user WHERE id = 1"
+        ).fetchone()[0]
+
+    assert password.startswith('pbkdf2:sha256:260000$')
+    # O novo hash continua válido para a mesma senha
+    assert auth.login().headers['Location'] == 'http://localhost/'
+
+def test_inline_hashing(app, auth):
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    assert auth.login().headers['Location'] == 'http://localhost/'
+
+def test_hash_queue_full(app, auth):
+    app.config['PASSWORD_HASH_TIMEOUT'] = 0
+
+    with app.app_context():
+        semaphore = get_semaphore()
+        while semaphore.acquire(blocking=False):
+            pass
+
+    assert auth.login().status_code == 503
+
+def test_failed_login_rate_limit(app, auth):
+    app.config['LOGIN_RATE_LIMIT'] = 2
+    assert auth.login('test', 'a').status_code == 200
+    assert auth.login('nobody', 'a').status_code == 200
+    assert auth.login().status_code == 429
+
+# Cancelada enquanto espera uma vaga, a vaga obtida depois pela thread auxiliar é devolvida.
+def test_cancelled_hash_releases_slot(app):
+    app.config.update(PASSWORD_HASH_WORKERS=0, PASSWORD_HASH_TIMEOUT=5)
+
+    with app.app_context():
+        semaphore = get_semaphore()
+        slots = 0
+        while semaphore.acquire(blocking=False):
+            slots += 1
+
+        async def cancel():
+            task = asyncio.ensure_future(run_hash_async(len, 'x'))
+            await asyncio.sleep(0.1)
+            task.cancel()
+
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            # A thread auxiliar ainda espera, e obtém a vaga liberada agora.
+            threading.Timer(0.1, semaphore.release).start()
+
+        # O 'asyncio.run' aguarda a thread auxiliar terminar.
+        asyncio.run(cancel())
+
+        assert sum(semaphore.acquire(blocking=False) for i in range(slots)) == 1
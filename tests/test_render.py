@@ -0,0 +1,150 @@
+import sqlite3
+
+import pytest
+from flaskr.db import get_db
+from flaskr.jobs import TASKS, Worker
+from flaskr.render import (
+    RENDERER_VERSION, StaleRenders, get_stale_renders, render_markdown, rerender_all, rerender_posts
+)
+
+@pytest.mark.parametrize(('text', 'html'), (
+    ('plain', '<p>plain</p>'),
+    ('# Title', '<h1>Title</h1>'),
+    ('**bold** and *em* and _em_', '<p><strong>bold</strong> and <em>em</em> and <em>em</em></p>'),
+    ('snake_case_name', '<p>snake_case_name</p>'),
+    ('`a * b * c`', '<p><code>a * b * c</code></p>'),
+    ('- one\n- two', '<ul><li>one</li><li>two</li></ul>'),
+    ('1. one\n2. two', '<ol><li>one</li><li>two</li></ol>'),
+    ('> quoted', '<blockquote><p>quoted</p></blockquote>'),
+    ('```\n<b>x</b>\n```', '<pre><code>&lt;b&gt;x&lt;/b&gt;</code></pre>'),
+    ('first\n\nsecond', '<p>first</p>\n<p>second</p>'),
+    ('---', '<hr>'),
+    ('[site](https://example.com/a_b_c)',
+     '<p><a href="https://example.com/a_b_c" rel="nofollow">site</a></p>'),
+))
+def test_render_markdown(text, html):
+    assert render_markdown(text) == html
+
+@pytest.mark.parametrize('text', (
+    '<script>alert(1)</script>',
+    '[x](javascript:alert(1))',
+    '[x](https://example.com/"onmouseover="alert(1))',
+    '<img src=x onerror=alert(1)>',
+))
+def test_render_markdown_is_sanitized(text):
+    html = render_markdown(text)
+
+    assert '<script' not in html
+    assert '<img' not in html
+    assert 'javascript:' not in html
+    assert '"onmouseover' not in html
+
+def test_create_stores_html(client, auth, app):
+    auth.login()
+    client.post('/create', data={'title': 'md', 'body': 'some **bold** text'})
+
+    with app.app_context():
+        post = get_db().execute("SELECT * FROM post WHERE title = 'md'").fetchone()
+
+    assert post['body_html'] == '<p>some <strong>bold</strong> text</p>'
+    assert post['body_version'] == RENDERER_VERSION
+
+    client.post(f"/{post['id']}/update", data={'title': 'md', 'body': '*changed*'})
+    assert b'<em>changed</em>' in client.get(f"/{post['id']}").data
+
+def test_api_stores_html(client, auth, app):
+    auth.login()
+    id = client.post('/api/v1/posts', json={'title': 'api', 'body': '# head'}).get_json()['id']
+    client.patch(f'/api/v1/posts/{id}', json={'body': '## smaller'})
+
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post WHERE id = ?', (id,)).fetchone()
+
+    assert post['body_html'] == '<h2>smaller</h2>'
+
+def test_outdated_post_rendered_on_read(client, app):
+    app.config['PAGE_CACHE'] = False
+
+    # A postagem do data.sql nunca foi convertida (versão 0).
+    assert b'<p class="body">' not in client.get('/').data
+    assert b'<p>test\nbody</p>' in client.get('/1').data
+
+    with app.app_context():
+        db = get_db()
+        # As leituras não escrevem no Banco de Dados, a tarefa é enviada pela thread do 'StaleRenders'.
+        assert db.execute('SELECT count(*) FROM job').fetchone()[0] == 0
+        assert get_stale_renders().flush() == 1
+        job = db.execute('SELECT * FROM job').fetchone()
+        assert job['task'] == 'flaskr.render.rerender_posts'
+        assert db.execute('SELECT count(*) FROM job').fetchone()[0] == 1
+
+    Worker(app, burst=True).run()
+
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post WHERE id = 1').fetchone()
+        # Gravada pelo worker do mesmo processo, a postagem deixa o conjunto das já enviadas.
+        assert get_stale_renders().enqueued == {}
+
+    assert post['body_version'] == RENDERER_VERSION
+    assert post['body_html'] == '<p>test\nbody</p>'
+
+def test_stale_post_enqueued_once_per_process(client, app):
+    app.config['PAGE_CACHE'] = False
+    client.get('/1')
+
+    with app.app_context():
+        get_stale_renders().flush()
+        db = get_db()
+        db.execute('DELETE FROM job')
+        db.commit()
+
+    # Até o worker gravar o HTML, as próximas leituras não enviam outra tarefa.
+    client.get('/1')
+    client.get('/')
+
+    with app.app_context():
+        assert get_stale_renders().flush() == 0
+        assert get_db().execute('SELECT count(*) FROM job').fetchone()[0] == 0
+
+def test_stale_renders_bounded(app, monkeypatch):
+    renders = StaleRenders(app, maxsize=2)
+    renders.add([1, 2, 3])
+    assert renders.flush() == 3
+    renders.close()
+
+    # Somente as postagens enviadas mais recentemente são lembradas.
+    assert list(renders.enqueued) == [2, 3]
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError('database is locked')
+
+    # Quando o envio falha, as postagens são enviadas no próximo intervalo.
+    monkeypatch.setattr('flaskr.render.enqueue', locked)
+    renders.add([1, 4])
+    assert renders.flush() == 0
+    assert renders.pending == {1, 4}
+
+def test_old_task_name(app):
+    assert TASKS['flaskr.markdown.rerender_posts'] is rerender_posts
+
+def test_render_posts_command(app, runner):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [(f'post {i}', f'*{i}*') for i in range(10)]
+        )
+        db.commit()
+
+        assert rerender_all(batch_size=3, workers=0) == 11
+        assert rerender_all(batch_size=3, workers=0) == 0
+
+    result = runner.invoke(args=['render-posts', '--all', '--workers', '2', '--batch-size', '4'])
+    assert 'Rendered 11 posts' in result.output
+
+    with app.app_context():
+        html = [row[0] for row in get_db().execute(
+            "SELECT body_html FROM post WHERE title LIKE 'post %' ORDER BY id"
+        )]
+
+    assert html == [f'<p><em>{i}</em></p>' for i in range(10)]
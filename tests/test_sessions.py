@@ -0,0 +1,151 @@
+import time
+
+import pytest
+from flask import flash, session
+from flaskr import create_app
+from flaskr.db import close_pool, get_db, get_write_db
+from flaskr.sessions import MemorySessionStore, SQLiteSessionStore
+
+@pytest.fixture
+def app_config():
+    return {'SESSION_STORE': 'sqlite'}
+
+def session_cookie(client):
+    return next(c.value for c in client.cookie_jar if c.name == 'session')
+
+def test_cookie_holds_session_id(app, client, auth):
+    auth.login()
+    sid = session_cookie(client)
+
+    assert '.' not in sid
+    with app.app_context():
+        row = get_db().execute('SELECT * FROM session WHERE id = ?', (sid,)).fetchone()
+        assert row['user_id'] == 1
+        assert '"username": "test"' in row['user']
+        assert 'password' not in row['user']
+
+def test_login_rotates_session_id(app, client, auth):
+    with client.session_transaction() as anonymous_session:
+        anonymous_session['theme'] = 'dark'
+
+    anonymous = session_cookie(client)
+    auth.login()
+
+    assert session_cookie(client) != anonymous
+    with app.app_context():
+        assert get_db().execute(
+            'SELECT 1 FROM session WHERE id = ?', (anonymous,)
+        ).fetchone() is None
+
+def test_logout_removes_session(app, client, auth):
+    auth.login()
+    auth.logout()
+
+    with app.app_context():
+        assert get_db().execute('SELECT count(*) FROM session').fetchone()[0] == 0
+
+def test_logout_everywhere(app, auth):
+    first, second = app.test_client(), app.test_client()
+
+    for client in (first, second):
+        client.post('/auth/login', data={'username': 'test', 'password': 'test'})
+        assert client.get('/create').status_code == 200
+
+    first.get('/auth/logout-everywhere')
+
+    assert second.get('/create').headers['Location'].endswith('/auth/login')
+
+def test_session_write_does_not_commit_the_view(app, client):
+    @app.route('/half-done')
+    def half_done():
+        # A visualização escreve sem o COMMIT, e termina com uma mensagem flash (gravada na sessão).
+        get_write_db().execute("INSERT INTO user (username, password) VALUES ('half', 'x')")
+        flash('Something went wrong.')
+        return 'error'
+
+    client.get('/half-done')
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute("SELECT 1 FROM user WHERE username = 'half'").fetchone() is None
+        assert db.execute('SELECT count(*) FROM session').fetchone()[0] == 1
+
+def test_session_not_written_without_changes(app, client, auth, monkeypatch):
+    auth.login()
+    calls = []
+    monkeypatch.setattr(
+        SQLiteSessionStore, 'save', lambda self, *args: calls.append(args)
+    )
+    client.get('/create')
+    assert calls == []
+
+    # Faltando menos da metade do tempo de vida, a expiração é renovada.
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE session SET expires = ?', (time.time() + 60,))
+        db.commit()
+
+    client.get('/create')
+    assert len(calls) == 1
+
+def test_expired_session(app, client, auth):
+    auth.login()
+
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE session SET expires = ?', (time.time() - 1,))
+        db.commit()
+
+    assert client.get('/create').status_code == 302
+
+def test_cleanup_command(app, runner):
+    app.config['SESSION_CLEANUP_BATCH'] = 2
+
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            "INSERT INTO session (id, data, expires) VALUES (?, '{}', ?)",
+            [(str(i), time.time() - 1) for i in range(5)] + [('live', time.time() + 60)]
+        )
+        db.commit()
+
+    result = runner.invoke(args=['cleanup-sessions'])
+    assert 'Removed 5 expired sessions.' in result.output
+
+    with app.app_context():
+        assert [row[0] for row in get_db().execute('SELECT id FROM session')] == ['live']
+
+def test_memory_store():
+    store = MemorySessionStore(maxsize=2)
+    now = time.time()
+    store.save('a', {'user_id': 1}, {'id': 1}, now + 60)
+    store.save('b', {'user_id': 1}, None, now + 60)
+    assert store.get('a') == ({'user_id': 1}, {'id': 1}, now + 60)
+
+    store.forget_user(1)
+    assert store.get('a')[1] is None
+
+    # 'b' foi usada há mais tempo, e é descartada quando a terceira sessão entra.
+    store.save('c', {}, None, now - 1)
+    assert store.get('b') is None
+    assert store.get('c') is None
+
+    store.save('c', {'user_id': 2}, None, now - 1)
+    assert store.cleanup() == 1
+    assert store.delete_user(1) == 1
+    assert store.get('a') is None
+
+@pytest.mark.parametrize('store', ('memory', None))
+def test_other_stores(store, app):
+    other = create_app({
+        'TESTING': True, 'DATABASE': app.config['DATABASE'], 'SESSION_STORE': store,
+    })
+    client = other.test_client()
+
+    with client:
+        client.post('/auth/login', data={'username': 'test', 'password': 'test'})
+        assert session['user_id'] == 1
+        assert b'<span>test</span>' in client.get('/create').data
+
+    with other.app_context():
+        close_pool()
@@ -0,0 +1,186 @@
+import os
+
+import pytest
+from flaskr import create_app
+from flaskr.db import (
+    SHARD_ID_BITS, close_pool, get_db, get_shard_db, init_db, shard_for_author
+)
+from flaskr.shards import move_author
+
+with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
+    _data_sql = f.read().decode('utf8')
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': str(tmp_path / 'main.sqlite'),
+        'DATABASE_SHARDS': [str(tmp_path / 'shard-1.sqlite'), str(tmp_path / 'shard-2.sqlite')],
+        'PAGE_CACHE': False,
+    })
+
+    with app.app_context():
+        init_db()
+        get_db().executescript(_data_sql)
+
+    yield app
+
+    with app.app_context():
+        close_pool()
+
+def login(client, username):
+    client.post('/auth/login', data={'username': username, 'password': username})
+
+def post_shards(app):
+    with app.app_context():
+        return {
+            row['id']: shard
+            for shard in range(3)
+            for row in get_shard_db(shard).execute('SELECT id FROM post')
+        }
+
+def test_rendezvous_moves_only_to_new_shard():
+    before = {author: shard_for_author(author, 3) for author in range(1000)}
+    after = {author: shard_for_author(author, 4) for author in range(1000)}
+    moved = [author for author in before if before[author] != after[author]]
+
+    assert all(after[author] == 3 for author in moved)
+    assert 150 < len(moved) < 350
+    assert set(before.values()) == {0, 1, 2}
+
+def test_posts_routed_by_author(sharded_app):
+    client = sharded_app.test_client()
+
+    for username in ('test', 'other'):
+        login(client, username)
+        client.post('/create', data={'title': f'by {username}', 'body': ''})
+
+    shards = post_shards(sharded_app)
+
+    for id, shard in shards.items():
+        assert id >> SHARD_ID_BITS == shard
+
+    with sharded_app.app_context():
+        for author_id, username in ((1, 'test'), (2, 'other')):
+            shard = shard_for_author(author_id)
+            row = get_shard_db(shard).execute(
+                'SELECT author_name FROM post WHERE title = ?', (f'by {username}',)
+            ).fetchone()
+            assert row['author_name'] == username
+
+def test_index_merges_shards(sharded_app):
+    client = sharded_app.test_client()
+
+    for username in ('test', 'other', 'test'):
+        login(client, username)
+        client.post('/create', data={'title': f'post by {username}', 'body': ''})
+
+    data = client.get('/').data
+    # As mais recentes primeiro, a postagem do data.sql (2018) por último.
+    assert data.count(b'post by') == 3
+    assert data.index(b'post by') < data.index(b'test title')
+
+    sharded_app.config['POSTS_PER_PAGE'] = 2
+    first = client.get('/').data
+    assert b'Older' in first
+    assert b'test title' not in first
+
+def test_update_delete_across_shards(sharded_app):
+    client = sharded_app.test_client()
+    login(client, 'other')
+    client.post('/create', data={'title': 'mine', 'body': ''})
+    id = next(id for id, shard in post_shards(sharded_app).items() if id != 1)
+
+    assert b'mine' in client.get(f'/{id}').data
+    client.post(f'/{id}/update', data={'title': 'changed', 'body': ''})
+    assert b'changed' in client.get(f'/{id}').data
+    assert client.post(f'/{id}/update', data={'title': '', 'body': ''}).status_code == 200
+
+    login(client, 'test')
+    assert client.post(f'/{id}/delete').status_code == 403
+
+    login(client, 'other')
+    client.post(f'/{id}/delete')
+    assert client.get(f'/{id}').status_code == 404
+
+def test_search_and_api_across_shards(sharded_app):
+    client = sharded_app.test_client()
+
+    for username in ('test', 'other'):
+        login(client, username)
+        response = client.post('/api/v1/posts', json={'title': f'needle {username}', 'body': ''})
+        assert response.status_code == 201
+
+    data = client.get('/search?q=needle').data
+    assert b'<mark>needle</mark> test' in data
+    assert b'<mark>needle</mark> other' in data
+
+    posts = client.get('/api/v1/posts').get_json()['posts']
+    assert [post['title'] for post in posts][:2] == ['needle other', 'needle test']
+
+def test_batch_delete_refuses_several_shards(sharded_app):
+    with sharded_app.app_context():
+        db = get_shard_db(1, write=True)
+        id = db.execute(
+            "INSERT INTO post (title, body, author_id) VALUES ('moved', '', 1)"
+        ).lastrowid
+        db.commit()
+
+    client = sharded_app.test_client()
+    login(client, 'test')
+    response = client.post('/api/v1/posts/batch-delete', json={'ids': [1, id]})
+
+    assert response.status_code == 400
+    assert post_shards(sharded_app) == {1: 0, id: 1}
+
+def test_add_and_rebalance(app, runner, tmp_path):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO user (username, password) VALUES (?, ?)',
+            [(f'user{i}', 'x') for i in range(3, 21)]
+        )
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, ?)',
+            [(f'post {i}', '', i) for i in range(1, 21)]
+        )
+        db.commit()
+
+    result = runner.invoke(args=['shards', 'add', str(tmp_path / 'shard-1.sqlite')])
+    assert 'Initialized shard 1' in result.output
+
+    result = runner.invoke(args=['shards', 'status'])
+    assert 'misplaced=0' not in result.output.splitlines()[0]
+
+    result = runner.invoke(args=['shards', 'rebalance', '--batch-size', '1'])
+    moved = int(result.output.splitlines()[-1].split()[1])
+    assert moved > 0
+
+    result = runner.invoke(args=['shards', 'status'])
+    assert all('misplaced=0' in line for line in result.output.splitlines())
+
+    app.config['PAGE_CACHE'] = False
+    client = app.test_client()
+    assert len(client.get('/api/v1/posts?per_page=100').get_json()['posts']) == 21
+    assert client.get('/1').status_code == 200
+
+    with app.app_context():
+        shard_1 = get_shard_db(1, write=True)
+        assert shard_1.execute('SELECT count(*) FROM post').fetchone()[0] == moved
+
+        # Uma postagem do shard 1 no shard 0 faria o AUTOINCREMENT do shard 0 gerar ids do bloco 1.
+        with pytest.raises(ValueError):
+            move_author(1, 1, 0)
+
+def test_author_page_across_shards(sharded_app):
+    client = sharded_app.test_client()
+    login(client, 'other')
+
+    for i in range(3):
+        client.post('/create', data={'title': f'other {i}', 'body': ''})
+
+    client.get('/auth/logout')
+    data = client.get('/u/other').data
+    assert b'3 posts' in data
+    assert data.count(b'other ') >= 3
+    assert b'1 post<' in client.get('/u/test').data
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import click
+from flaskr import startup
+from flaskr.startup import LazyCommand, add_lazy_commands, parse_importtime
+
+def test_lazy_command_imports_on_invoke(app):
+    add_lazy_commands(app, [
+        ('missing', 'flaskr.does_not_exist:command', 'Never imported.'),
+        ('echo-lazy', 'tests.test_startup:echo_command', 'Echo a value.'),
+    ])
+    runner = app.test_cli_runner()
+
+    assert 'Never imported.' in runner.invoke(args=['--help']).output
+    assert runner.invoke(args=['echo-lazy', '--value', '7']).output == '7\n'
+
+@click.command('echo-lazy')
+@click.option('--value')
+def echo_command(value):
+    click.echo(value)
+
+def test_lazy_group(runner):
+    result = runner.invoke(args=['migrate', 'status'])
+    assert 'Database is at version' in result.output
+
+def test_parse_importtime():
+    output = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:       120 |        120 |   _csv\n'
+        'import time:       300 |        420 | csv\n'
+    )
+    assert parse_importtime(output) == [('_csv', 120, 120), ('csv', 300, 420)]
+
+def test_profile_startup_budget(app, runner, monkeypatch):
+    monkeypatch.setattr(
+        startup, 'profile_startup',
+        lambda: (0.2, [('flaskr', 1000, 150000), ('flaskr.db', 5000, 8000)])
+    )
+    result = runner.invoke(args=['profile-startup'])
+    assert result.exit_code == 0
+    assert 'Startup: 200.0 ms' in result.output
+    assert '8.0 ms  flaskr.db' in result.output
+
+    app.config['STARTUP_BUDGET'] = 0.1
+    result = runner.invoke(args=['profile-startup'])
+    assert result.exit_code != 0
+    assert 'over the budget of 100.0 ms' in result.output
+
+# Os módulos opcionais só são importados quando usados, a Fábrica de Aplicativos é executada em um novo
+# interpretador, sem os módulos já importados pelos testes.
+def test_create_app_defers_optional_modules(tmp_path):
+    script = (
+        'import sys\n'
+        'from flaskr import create_app\n'
+        f"create_app({{'TESTING': True, 'DATABASE': {str(tmp_path / 'x.sqlite')!r}}})\n"
+        'print(" ".join(sorted(sys.modules)))\n'
+    )
+    modules = subprocess.run(
+        [sys.executable, '-c', script], capture_output=True, text=True, check=True
+    ).stdout.split()
+
+    for name in ('aiosqlite', 'concurrent.futures.process', 'flaskr.groupcommit',
+                 'flaskr.bench', 'flaskr.migrate', 'flaskr.shards', 'flaskr.transfer'):
+        assert name not in modules
@@ -0,0 +1,54 @@
+import os
+
+from flaskr import create_app
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'flaskr', 'templates')
+TEMPLATES = sum(
+    name.endswith('.html') for root, dirs, files in os.walk(TEMPLATE_FOLDER) for name in files
+)
+
+def test_compile_templates(app, tmp_path):
+    cache_dir = tmp_path / 'jinja'
+    other = create_app({
+        'TESTING': True, 'DATABASE': app.config['DATABASE'], 'TEMPLATE_CACHE_DIR': str(cache_dir),
+    })
+    result = other.test_cli_runner().invoke(args=['compile-templates'])
+
+    assert f'Compiled {TEMPLATES} templates' in result.output
+    assert len(os.listdir(cache_dir)) == TEMPLATES
+
+def test_compile_templates_without_cache(app):
+    other = create_app({'TESTING': True, 'DATABASE': app.config['DATABASE']})
+    result = other.test_cli_runner().invoke(args=['compile-templates'])
+    assert other.jinja_env.bytecode_cache is None
+    assert result.exit_code != 0
+    assert 'TEMPLATE_CACHE_DIR is not configured.' in result.output
+
+def test_compile_templates_reports_errors(app, tmp_path):
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'broken.html').write_text('{% if %}')
+    other = create_app({
+        'TESTING': True, 'DATABASE': app.config['DATABASE'],
+        'TEMPLATE_CACHE_DIR': str(tmp_path / 'jinja'),
+    })
+    other.template_folder = str(templates)
+    result = other.test_cli_runner().invoke(args=['compile-templates'])
+
+    assert result.exit_code != 0
+    assert 'broken.html:1:' in result.output
+
+def test_preload_freezes_templates(app, monkeypatch):
+    other = create_app({
+        'TESTING': True, 'DATABASE': app.config['DATABASE'],
+        'TEMPLATE_CACHE_DIR': None, 'TEMPLATE_PRELOAD': True,
+    })
+    env = other.jinja_env
+
+    assert not env.auto_reload
+    assert len(env.cache) == TEMPLATES
+
+    # Com os Templates congelados, os arquivos não são lidos novamente.
+    monkeypatch.setattr(env.loader, 'get_source', None)
+    response = other.test_client().get('/auth/login')
+    assert response.status_code == 200
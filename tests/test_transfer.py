@@ -0,0 +1,131 @@
+import io
+import json
+
+import pytest
+from click import ClickException
+from flaskr.db import get_db
+from flaskr.transfer import import_rows
+
+def test_export_ndjson(runner, tmp_path):
+    path = tmp_path / 'posts.ndjson'
+    result = runner.invoke(args=['export', 'posts', '--output', str(path)])
+
+    assert 'Exported 1 posts.' in result.output
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert rows == [{
+        'id': 1, 'author_id': 1, 'created': '2018-01-01 00:00:00',
+        'title': 'test title', 'body': 'test\nbody',
+    }]
+
+def test_export_csv(runner, tmp_path):
+    path = tmp_path / 'users.csv'
+    runner.invoke(args=['export', 'users', '--output', str(path)])
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == 'id,username,password'
+    assert lines[1].startswith('1,test,pbkdf2:')
+    assert len(lines) == 3
+
+def test_import(app, runner, tmp_path):
+    path = tmp_path / 'posts.csv'
+    path.write_text(
+        'author_id,title,body,created\n'
+        '2,first,one,2019-01-01 00:00:00\n'
+        '2,second,two,\n'
+        '1,third,three,2019-01-03 00:00:00\n'
+    )
+    result = runner.invoke(args=['import', 'posts', str(path), '--batch-size', '2'])
+
+    assert 'Imported 3 posts.' in result.output
+
+    with app.app_context():
+        db = get_db()
+        rows = db.execute(
+            'SELECT author_id, title, created FROM post WHERE id > 1 ORDER BY id'
+        ).fetchall()
+        assert [(r['author_id'], r['title']) for r in rows] == [
+            (2, 'first'), (2, 'second'), (1, 'third')
+        ]
+        assert rows[1]['created'] is not None
+        assert db.execute('SELECT * FROM import_checkpoint').fetchall() == []
+
+def test_round_trip(app, runner, tmp_path):
+    path = tmp_path / 'posts.ndjson'
+    runner.invoke(args=['export', 'posts', '--output', str(path)])
+
+    with app.app_context():
+        db = get_db()
+        db.execute('DELETE FROM post')
+        db.commit()
+
+    runner.invoke(args=['import', 'posts', str(path)])
+
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post').fetchone()
+        assert post['id'] == 1
+        assert post['body'] == 'test\nbody'
+
+def test_import_resumes(app, tmp_path):
+    records = [
+        {'author_id': 1, 'title': f'post {i}', 'body': 'body'} for i in range(5)
+    ]
+    records[3] = {'author_id': 1, 'title': 'broken'}
+    path = tmp_path / 'posts.ndjson'
+    path.write_text('\n'.join(json.dumps(r) for r in records) + '\n')
+
+    with app.app_context():
+        with pytest.raises(ClickException) as e:
+            with open(path) as f:
+                import_rows('posts', f, 'ndjson', 2, source='posts')
+
+        assert "Record 4: missing 'body'" in e.value.message
+        assert get_db().execute('SELECT count(*) FROM post').fetchone()[0] == 3
+
+        # O registro corrigido, a importação continua do terceiro lote, sem duplicar os dois primeiros.
+        records[3]['body'] = 'fixed'
+        path.write_text('\n'.join(json.dumps(r) for r in records) + '\n')
+
+        with open(path) as f:
+            assert import_rows('posts', f, 'ndjson', 2, source='posts') == 5
+
+        titles = [row[0] for row in get_db().execute(
+            'SELECT title FROM post WHERE id > 1 ORDER BY id'
+        )]
+        assert titles == ['post 0', 'post 1', 'post 2', 'broken', 'post 4']
+
+def test_import_integrity_error(app):
+    stream = io.StringIO(json.dumps({'username': 'test', 'password': 'x'}) + '\n')
+
+    with app.app_context():
+        with pytest.raises(ClickException) as e:
+            import_rows('users', stream, 'ndjson')
+
+        assert 'UNIQUE' in e.value.message
+
+# Os valores que o sqlite3 não grava (objetos e listas do JSON, inteiros grandes demais) são informados pelo
+# número do registro, e o ponto de retomada continua no último lote gravado.
+@pytest.mark.parametrize('value', ({'a': 1}, ['x'], True, 2 ** 64))
+def test_import_invalid_value(app, value):
+    records = [{'username': 'first', 'password': 'x'}, {'username': value, 'password': 'x'}]
+    stream = io.StringIO('\n'.join(json.dumps(r) for r in records) + '\n')
+
+    with app.app_context():
+        with pytest.raises(ClickException) as e:
+            import_rows('users', stream, 'ndjson', 1, source='users')
+
+        assert e.value.message == "Record 2: invalid value for 'username'."
+        db = get_db()
+        assert db.execute("SELECT 1 FROM user WHERE username = 'first'").fetchone() is not None
+        assert db.execute('SELECT records FROM import_checkpoint').fetchone()[0] == 1
+
+@pytest.mark.parametrize(('line', 'message'), (
+    ('{', 'Record 1: invalid JSON'),
+    ('[1, 2]', 'Record 1: expected a JSON object.'),
+))
+def test_import_invalid_json(runner, tmp_path, line, message):
+    path = tmp_path / 'users.ndjson'
+    path.write_text(line + '\n')
+    result = runner.invoke(args=['import', 'users', str(path)])
+
+    assert result.exit_code == 1
+    assert message in result.output